@@ -0,0 +1,72 @@
+"""
+Compare the line diff algorithms on inputs that are pathological for difflib.
+
+Usage:
+    python benchmarks/bench_diff_algorithms.py [--scale N]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from diff_algorithms import ALGORITHMS, unified_diff
+
+
+def json_fixture(rng: random.Random, records: int):
+    """A JSON array of small records: a handful of distinct lines repeated many times."""
+    original = []
+    for i in range(records):
+        original += ['  {\n', f'    "id": {i % 50},\n', '    "ok": true\n', '  },\n']
+    modified = list(original)
+    for _ in range(max(1, records // 60)):
+        modified[rng.randrange(len(modified))] = f'    "id": {rng.randrange(1000)},\n'
+    return original, modified
+
+
+def csv_table(rng: random.Random, rows: int):
+    """A CSV with low-cardinality columns and a few edited and inserted rows."""
+    values = ["0", "1", "N/A", "true", "false"]
+    original = [",".join(rng.choice(values) for _ in range(4)) + "\n" for _ in range(rows)]
+    modified = list(original)
+    for _ in range(max(1, rows // 100)):
+        modified.insert(rng.randrange(len(modified)), "inserted,row,0,0\n")
+    return original, modified
+
+
+def minified_bundle(rng: random.Random, lines: int):
+    """A minified bundle split on statement boundaries, with repeated boilerplate."""
+    boilerplate = ["}", "return e;", "var e=t(n);", "function(n){", "})();"]
+    original = [rng.choice(boilerplate) + "\n" for _ in range(lines)]
+    modified = list(original)
+    for _ in range(max(1, lines // 200)):
+        modified[rng.randrange(len(modified))] = "console.log(1);\n"
+    return original, modified
+
+
+CASES = {
+    "json-fixture": json_fixture,
+    "csv-table": csv_table,
+    "minified-bundle": minified_bundle,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark line diff algorithms on pathological inputs.")
+    parser.add_argument("--scale", type=int, default=4000, help="Size parameter for each generated input.")
+    args = parser.parse_args()
+
+    print(f"{'case':<18}{'algorithm':<12}{'seconds':>10}{'diff lines':>12}")
+    for name, make_case in CASES.items():
+        original, modified = make_case(random.Random(0), args.scale)
+        for algorithm in ALGORITHMS:
+            start = time.perf_counter()
+            lines = sum(1 for _ in unified_diff(original, modified, lineterm="", algorithm=algorithm))
+            elapsed = time.perf_counter() - start
+            print(f"{name:<18}{algorithm:<12}{elapsed:>10.3f}{lines:>12}")
+
+
+if __name__ == "__main__":
+    main()
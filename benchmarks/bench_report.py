@@ -0,0 +1,135 @@
+"""
+Benchmark the report generators phase by phase on a synthetic repository pair.
+
+Usage:
+    python benchmarks/bench_report.py [--files N] [--methods general unified] [--json results.json] ...
+
+Each method runs in a fresh process so peak RSS is its own. Time is split
+into the phases the generators record (walk, compare, diff, write; see
+src/metrics.py), with whatever is left as "other". Phase times are
+exclusive, so they add up to the wall time.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import subprocess
+import importlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCH_DIR, '..', 'src'))
+
+from synthetic_repo import add_spec_arguments, spec_from_args, write_pair
+from metrics import RunStats, collect
+
+METHODS = ("general", "unified", "includes")
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process and its finished children, in KiB."""
+    scale = 1024 if sys.platform == "darwin" else 1
+    return max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    ) // scale
+
+
+def run_method(method: str, original_dir: str, modified_dir: str, output_file: str, jobs: int) -> dict:
+    """Run one generator with run statistics collected and return its measurements."""
+    module = importlib.import_module(f"repo_diff_{method}")
+    kwargs = {"jobs": jobs} if method != "general" else {}
+
+    stats = RunStats()
+    with collect(stats):
+        getattr(module, f"run_{method}")(original_dir, modified_dir, output_file, **kwargs)
+    result = stats.to_dict()
+    wall = result["wall_seconds"]
+    phases = result["phases"]
+    phases["other"] = round(max(wall - sum(phases.values()), 0.0), 6)
+
+    files = result["counters"].get("files_scanned", 0)
+    return {
+        "method": method,
+        "wall_seconds": wall,
+        "phases": phases,
+        "counters": result["counters"],
+        "slowest_files": result["slowest_files"][:5],
+        "peak_rss_kb": peak_rss_kb(),
+        "files": files,
+        "files_per_second": round(files / wall, 1) if wall else None,
+        "report_bytes": os.path.getsize(output_file),
+    }
+
+
+def run_in_subprocess(method: str, original_dir: str, modified_dir: str, output_file: str, jobs: int) -> dict:
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", method,
+         original_dir, modified_dir, output_file, "--jobs", str(jobs)],
+        capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        return {"method": method, "error": completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report generators on a synthetic repository pair.")
+    parser.add_argument("--methods", nargs="*", choices=METHODS, default=list(METHODS))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per method; the fastest is kept.")
+    parser.add_argument("--jobs", type=int, default=1, help="--jobs for unified and includes.")
+    parser.add_argument("--json", default=None, help="Also write the results to this file.")
+    parser.add_argument("--keep", default=None, help="Generate the repositories here and keep them.")
+    parser.add_argument("--worker", nargs=4, metavar=("METHOD", "ORIGINAL", "MODIFIED", "OUTPUT"), help=argparse.SUPPRESS)
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_method(*args.worker, jobs=args.jobs)))
+        return
+
+    spec = spec_from_args(args)
+    work_dir = args.keep or tempfile.mkdtemp(prefix="repo-diff-bench-")
+    try:
+        start = time.perf_counter()
+        original_dir, modified_dir = write_pair(work_dir, spec)
+        results = {
+            "spec": spec._asdict(),
+            "jobs": args.jobs,
+            "generate_seconds": round(time.perf_counter() - start, 4),
+            "runs": [],
+        }
+        output_file = os.path.join(work_dir, "report.txt")
+        for method in args.methods:
+            runs = [
+                run_in_subprocess(method, original_dir, modified_dir, output_file, args.jobs)
+                for _ in range(args.repeat)
+            ]
+            results["runs"].append(min(runs, key=lambda run: run.get("wall_seconds", float("inf"))))
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir)
+
+    print(f"{'method':<10}{'wall s':>9}{'walk':>8}{'compare':>9}{'diff':>8}{'write':>8}{'other':>8}{'RSS MiB':>9}{'files/s':>10}")
+    for run in results["runs"]:
+        if "error" in run:
+            print(f"{run['method']:<10} failed: {' '.join(run['error'])}")
+            continue
+        phases = run["phases"]
+        print(
+            f"{run['method']:<10}{run['wall_seconds']:>9.3f}"
+            + "".join(f"{phases.get(name, 0.0):>{width}.3f}" for name, width in
+                      (("walk", 8), ("compare", 9), ("diff", 8), ("write", 8), ("other", 8)))
+            + f"{run['peak_rss_kb'] / 1024:>9.1f}{run['files_per_second']:>10.0f}"
+        )
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Deterministic generator for pairs of synthetic repositories to benchmark against.
+
+Usage:
+    python benchmarks/synthetic_repo.py OUTPUT_DIR [--files N] [--depth N] [--seed N] ...
+
+Writes OUTPUT_DIR/original and OUTPUT_DIR/modified. The same arguments always
+produce byte-identical trees.
+"""
+import os
+import sys
+import random
+import argparse
+from typing import Dict, List, NamedTuple, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_diff_algorithms import CASES
+
+WORDS = [
+    "self", "return", "value", "index", "result", "config", "items", "path",
+    "data", "count", "name", "None", "True", "False", "for", "in", "if", "else",
+]
+EXTENSIONS = [".py", ".js", ".md", ".json", ".txt", ".css"]
+
+
+class RepoSpec(NamedTuple):
+    """Shape of a generated repository pair."""
+    files: int = 1000
+    depth: int = 4
+    median_size: int = 4096
+    size_sigma: float = 1.0
+    change_ratio: float = 0.1
+    add_ratio: float = 0.02
+    delete_ratio: float = 0.02
+    binary_fraction: float = 0.0
+    pathological: int = 0
+    pathological_scale: int = 4000
+    seed: int = 0
+
+
+def _random_path(rng: random.Random, spec: RepoSpec, fanout: int, index: int, extension: str) -> str:
+    depth = rng.randint(0, spec.depth)
+    parts = [f"dir{rng.randrange(fanout)}" for _ in range(depth)]
+    return "/".join(parts + [f"file{index}{extension}"])
+
+
+def _text_lines(rng: random.Random, size: int) -> List[str]:
+    lines = []
+    total = 0
+    while total < size:
+        indent = "    " * rng.randrange(4)
+        line = indent + " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 10))) + "\n"
+        lines.append(line)
+        total += len(line)
+    return lines
+
+
+def _edit_lines(rng: random.Random, lines: List[str]) -> List[str]:
+    """Replace, insert and delete about 2% of the lines (at least one edit)."""
+    edited = list(lines)
+    for _ in range(max(1, len(lines) // 50)):
+        position = rng.randrange(len(edited) + 1)
+        action = rng.random()
+        if action < 0.5 and position < len(edited):
+            edited[position] = f"changed {rng.randrange(10 ** 6)}\n"
+        elif action < 0.8 or not edited:
+            edited.insert(position, f"inserted {rng.randrange(10 ** 6)}\n")
+        elif position < len(edited):
+            del edited[position]
+    return edited
+
+
+def generate_pair(spec: RepoSpec) -> Tuple[Dict[str, bytes], Dict[str, bytes]]:
+    """
+    Build the original and modified trees in memory as {relative path: content}.
+
+    Args:
+        spec (RepoSpec): Number of files, directory depth, log-normal size
+            distribution, fraction of files changed, added and deleted, fraction
+            of binary files, and number of files that are pathological for
+            line diffs (see bench_diff_algorithms.CASES).
+
+    Returns:
+        Tuple[Dict[str, bytes], Dict[str, bytes]]: Original and modified contents.
+    """
+    rng = random.Random(spec.seed)
+    fanout = max(2, round(spec.files ** (1 / (spec.depth + 1)))) if spec.depth else 1
+    original: Dict[str, bytes] = {}
+    modified: Dict[str, bytes] = {}
+
+    for index in range(spec.files):
+        size = max(1, int(rng.lognormvariate(0, spec.size_sigma) * spec.median_size))
+        binary = rng.random() < spec.binary_fraction
+        path = _random_path(rng, spec, fanout, index, ".bin" if binary else rng.choice(EXTENSIONS))
+        if binary:
+            content = rng.randbytes(size)
+            changed = content[:size // 2] + rng.randbytes(size - size // 2)
+            original[path] = content
+            if rng.random() >= spec.change_ratio:
+                modified[path] = content
+            else:
+                modified[path] = changed
+            continue
+
+        lines = _text_lines(rng, size)
+        original[path] = "".join(lines).encode()
+        roll = rng.random()
+        if roll < spec.delete_ratio:
+            continue
+        if roll < spec.delete_ratio + spec.change_ratio:
+            modified[path] = "".join(_edit_lines(rng, lines)).encode()
+        else:
+            modified[path] = original[path]
+
+    for index in range(int(spec.files * spec.add_ratio)):
+        path = _random_path(rng, spec, fanout, spec.files + index, rng.choice(EXTENSIONS))
+        modified[path] = "".join(_text_lines(rng, spec.median_size)).encode()
+
+    cases = sorted(CASES.items())
+    for index in range(spec.pathological):
+        name, make_case = cases[index % len(cases)]
+        before, after = make_case(rng, spec.pathological_scale)
+        path = f"pathological/{name}-{index}.txt"
+        original[path] = "".join(before).encode()
+        modified[path] = "".join(after).encode()
+
+    return original, modified
+
+
+def write_tree(root: str, files: Dict[str, bytes]) -> None:
+    for rel_path, content in files.items():
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+
+def write_pair(output_dir: str, spec: RepoSpec) -> Tuple[str, str]:
+    """Generate a repository pair under output_dir and return the two tree paths."""
+    original, modified = generate_pair(spec)
+    original_dir = os.path.join(output_dir, "original")
+    modified_dir = os.path.join(output_dir, "modified")
+    write_tree(original_dir, original)
+    write_tree(modified_dir, modified)
+    return original_dir, modified_dir
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add one --option per RepoSpec field to parser."""
+    for field, default in RepoSpec._field_defaults.items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(default), default=default)
+
+
+def spec_from_args(args: argparse.Namespace) -> RepoSpec:
+    return RepoSpec(**{field: getattr(args, field) for field in RepoSpec._fields})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic pair of synthetic repositories.")
+    parser.add_argument("output_dir", help="Directory to create 'original' and 'modified' in.")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    original_dir, modified_dir = write_pair(args.output_dir, spec_from_args(args))
+    print(original_dir)
+    print(modified_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,25 @@
 import argparse
+import functools
 import logging
 import os
-from src.repo_diff_general import run_general
-from src.repo_diff_unified import run_unified
-from src.repo_diff_includes import run_includes
+import sys
+from typing import Optional
+from src import repo_diff_general, repo_diff_unified, repo_diff_includes
+from src.diff_algorithms import (
+    ALGORITHMS, DEFAULT_ALGORITHM, CONTEXT_MODES, CONTEXT_FUNCTION, DEFAULT_CONTEXT, DEFAULT_CONTEXT_LINES,
+)
+# src/ modules import each other by bare name (src/ is on sys.path once they are loaded),
+# so metrics must be imported the same way for its registry to be shared with them
+from metrics import PROFILERS, RunStats, collect, profiled, write_stats
+from utils import DEFAULT_MAX_FILE_SIZE
+from manifest import write_manifest
+from renames import DEFAULT_RENAME_THRESHOLD
+from api import CompareOptions, KnownTrees, compare, write_jsonl
+from watch import DEFAULT_DEBOUNCE, WatchState, watch, write_atomically
+from compare_many import SUMMARY_FILE, compare_many
+from normalize import ENCODINGS, UTF8
+from shards import check_sharding, merge_shards, parse_shard
+from report_archive import OUTPUT_FORMATS, OUTPUT_SUFFIXES, PLAIN, check_output_format
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,54 +32,323 @@ def validate_paths(original_dir, modified_dir):
     if not os.path.isdir(modified_dir):
         raise FileNotFoundError(f"Modified directory does not exist: {modified_dir}")
 
-def main():
-    parser = argparse.ArgumentParser(description="File comparison tool")
-    parser.add_argument("--method", required=True, choices=["general", "unified", "includes"], help="Comparison method")
-    parser.add_argument("original_dir", help="Path to the original directory")
-    parser.add_argument("modified_dir", help="Path to the modified directory")
-    parser.add_argument("output_file", help="Path to the output report file")
-    parser.add_argument("--ignore", nargs="*", default=[], help="Ignore patterns")
+def snapshot(argv):
+    """Record a directory tree in a manifest that later runs can compare against with --against-manifest."""
+    parser = argparse.ArgumentParser(prog="main.py snapshot", description="Record a directory tree in a manifest")
+    parser.add_argument("directory", help="Path to the directory to record")
+    parser.add_argument("manifest", help="Path to the manifest file to write")
+    parser.add_argument("--ignore", nargs="*", default=[], help="Ignore patterns (names, globs or gitignore-style paths)")
     parser.add_argument("--shallow-ignore", nargs="*", default=[], help="Shallow ignore directories")
-    parser.add_argument("--max-depth", type=int, default=None, help="Maximum directory depth to compare")
-    parser.add_argument("--include", nargs="*", default=[], help="Include patterns (for includes method)")
+    parser.add_argument("--max-depth", type=int, default=None, help="Maximum directory depth to record")
+    parser.add_argument("--include", nargs="*", default=[], help="Only record these paths or globs relative to the root")
+    parser.add_argument("--gitignore", action="store_true", help="Also skip files ignored by .gitignore files in the tree")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.directory):
+        raise FileNotFoundError(f"Directory does not exist: {args.directory}")
+
+    count = write_manifest(
+        args.directory,
+        args.manifest,
+        max_depth=args.max_depth,
+        ignore_patterns=set(args.ignore),
+        shallow_ignore=set(args.shallow_ignore),
+        include_only=set(args.include),
+        use_gitignore=args.gitignore,
+    )
+    logger.info(f"Recorded {count} files in manifest: {args.manifest}")
 
-    # Validate directories
-    validate_paths(args.original_dir, args.modified_dir)
+def rename_threshold(args) -> Optional[float]:
+    """Rename threshold from the command line, None to disable rename detection."""
+    return None if args.no_renames else args.rename_threshold / 100
 
-    # Dispatch to the appropriate method
-    if args.method == "general":
-        run_general(
+def compare_options(args) -> CompareOptions:
+    """CompareOptions of the comparison the method's report is rendered from."""
+    return CompareOptions(
+        ignore_patterns=set(args.ignore),
+        shallow_ignore=set(args.shallow_ignore),
+        include_only=set(args.include) if args.method == "includes" else None,
+        max_depth=args.max_depth,
+        cache_dir=args.cache_dir,
+        jobs=args.jobs,
+        io_threads=args.io_threads,
+        diff_algorithm=args.diff_algorithm,
+        max_file_size=args.max_file_size,
+        git_repo=args.git_repo,
+        use_gitignore=args.gitignore,
+        against_manifest=args.against_manifest,
+        rename_threshold=None if args.method == "general" else rename_threshold(args),
+        context_lines=args.unified,
+        function_context=args.context == CONTEXT_FUNCTION,
+        ignore_eol=args.ignore_eol,
+        ignore_whitespace=args.ignore_whitespace,
+        encoding=args.encoding,
+        shard=args.shard,
+    )
+
+def write_report(args, output_file, known: KnownTrees = None):
+    """Write the report chosen on the command line to output_file, reusing known scans if given."""
+    if args.format == "jsonl":
+        options = compare_options(args)._replace(hashes=True)
+        with open(output_file, 'w', encoding='utf-8') as out:
+            write_jsonl(compare(args.original_dir, args.modified_dir, options, known), out)
+    elif args.method == "general":
+        repo_diff_general.run_general(
             original_dir=args.original_dir,
             modified_dir=args.modified_dir,
-            output_file=args.output_file,
+            output_file=output_file,
             ignore_patterns=set(args.ignore),
             shallow_ignore=set(args.shallow_ignore),
             max_depth=args.max_depth,
+            cache_dir=args.cache_dir,
+            max_bytes=args.max_bytes,
+            max_tokens=args.max_tokens,
+            git_repo=args.git_repo,
+            use_gitignore=args.gitignore,
+            max_file_size=args.max_file_size,
+            against_manifest=args.against_manifest,
+            io_threads=args.io_threads,
+            known=known,
+            context=args.context,
+            context_lines=args.unified,
+            output_format=args.output_format,
+            ignore_eol=args.ignore_eol,
+            ignore_whitespace=args.ignore_whitespace,
+            encoding=args.encoding,
         )
     elif args.method == "unified":
-        run_unified(
+        repo_diff_unified.run_unified(
             original_dir=args.original_dir,
             modified_dir=args.modified_dir,
-            output_file=args.output_file,
+            output_file=output_file,
             ignore_patterns=set(args.ignore),
             shallow_ignore=set(args.shallow_ignore),
             max_depth=args.max_depth,
+            cache_dir=args.cache_dir,
+            max_bytes=args.max_bytes,
+            max_tokens=args.max_tokens,
+            jobs=args.jobs,
+            diff_algorithm=args.diff_algorithm,
+            git_repo=args.git_repo,
+            use_gitignore=args.gitignore,
+            max_file_size=args.max_file_size,
+            against_manifest=args.against_manifest,
+            rename_threshold=rename_threshold(args),
+            io_threads=args.io_threads,
+            known=known,
+            context=args.context,
+            context_lines=args.unified,
+            output_format=args.output_format,
+            ignore_eol=args.ignore_eol,
+            ignore_whitespace=args.ignore_whitespace,
+            encoding=args.encoding,
+            shard=args.shard,
         )
     elif args.method == "includes":
-        run_includes(
+        repo_diff_includes.run_includes(
             original_dir=args.original_dir,
             modified_dir=args.modified_dir,
-            output_file=args.output_file,
+            output_file=output_file,
             include_patterns=set(args.include),
             ignore_patterns=set(args.ignore),
             shallow_ignore=set(args.shallow_ignore),
             max_depth=args.max_depth,
+            cache_dir=args.cache_dir,
+            max_bytes=args.max_bytes,
+            max_tokens=args.max_tokens,
+            jobs=args.jobs,
+            diff_algorithm=args.diff_algorithm,
+            git_repo=args.git_repo,
+            use_gitignore=args.gitignore,
+            max_file_size=args.max_file_size,
+            against_manifest=args.against_manifest,
+            rename_threshold=rename_threshold(args),
+            io_threads=args.io_threads,
+            known=known,
+            context=args.context,
+            context_lines=args.unified,
+            output_format=args.output_format,
+            ignore_eol=args.ignore_eol,
+            ignore_whitespace=args.ignore_whitespace,
+            encoding=args.encoding,
+            shard=args.shard,
         )
 
+def add_report_options(parser: argparse.ArgumentParser) -> None:
+    """Add the options that choose and shape a report, shared by the comparison commands."""
+    parser.add_argument("--method", required=True, choices=["general", "unified", "includes"], help="Comparison method")
+    parser.add_argument("--ignore", nargs="*", default=[], help="Ignore patterns (names, globs or gitignore-style paths)")
+    parser.add_argument("--shallow-ignore", nargs="*", default=[], help="Shallow ignore directories")
+    parser.add_argument("--max-depth", type=int, default=None, help="Maximum directory depth to compare")
+    parser.add_argument("--include", nargs="*", default=[], help="Include paths or globs relative to the root (for includes method)")
+    parser.add_argument("--cache-dir", default=None, help="Directory for the persistent file digest cache")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes for diffing modified files (unified and includes methods)")
+    parser.add_argument("--diff-algorithm", choices=ALGORITHMS, default=DEFAULT_ALGORITHM, help="Line diff algorithm (unified and includes methods)")
+    parser.add_argument("--max-bytes", type=int, default=None, help="Maximum report size in bytes; sections are trimmed to fit")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Approximate maximum report size in LLM tokens; sections are trimmed to fit")
+    parser.add_argument("--max-file-size", type=int, default=DEFAULT_MAX_FILE_SIZE, help="Summarize text files larger than this many bytes, like binary files, instead of reading them")
+    parser.add_argument("--gitignore", action="store_true", help="Also skip files ignored by .gitignore files in the compared trees")
+    parser.add_argument("--stats", default=None, metavar="PATH", help="Write phase timings, counters and the slowest files as JSON to PATH")
+    parser.add_argument("--profile", choices=PROFILERS, default=None, help="Profile the run and print the top functions (cprofile) or allocation sites (tracemalloc) to stderr")
+    parser.add_argument("--rename-threshold", type=int, default=int(DEFAULT_RENAME_THRESHOLD * 100), help="Minimum similarity in percent for a deleted and an added file to be shown as a rename (unified and includes methods)")
+    parser.add_argument("--no-renames", action="store_true", help="Show renamed files as deleted and new (unified and includes methods)")
+    parser.add_argument("--context", choices=CONTEXT_MODES, default=DEFAULT_CONTEXT, help="What to show with each modified file: the whole file (ORIGINAL, or BEFORE/AFTER), the enclosing function or class of each change, or the changed hunks only")
+    parser.add_argument("-U", "--unified", type=int, default=DEFAULT_CONTEXT_LINES, metavar="N", help="Lines of context around each change in diffs")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text", help="Write the text report of the method, or one JSON record per changed file (with digests and diff hunks)")
+    parser.add_argument("--io-threads", type=int, default=0, help="Threads reading, comparing and diffing files ahead of the report writer; hides read latency on network file systems")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=PLAIN, help="Write the text report as is, or compressed with gzip or zstd in chunks, with a section offset index next to it for reading one file's sections")
+    parser.add_argument("--ignore-eol", action="store_true", help="Treat files that differ only in line endings (CRLF, CR or LF) as unchanged")
+    parser.add_argument("--ignore-whitespace", action="store_true", help="Ignore changes in the amount of whitespace within lines, trailing whitespace and line endings, like diff -b")
+    parser.add_argument("--encoding", choices=ENCODINGS, default=UTF8, help="Read text files as UTF-8, or detect each file's encoding (byte order mark, else UTF-8, Windows-1252 or Latin-1) so encoding-only changes compare equal")
+
+def check_report_options(parser, args):
+    """Reject option combinations that apply to every comparison command."""
+    if args.unified < 0:
+        parser.error("-U/--unified must not be negative")
+    if args.output_format != PLAIN:
+        if args.format == "jsonl":
+            parser.error("--output-format applies to text reports; it cannot be combined with --format jsonl")
+        try:
+            check_output_format(args.output_format)
+        except ValueError as e:
+            parser.error(str(e))
+
+def check_shard_options(parser, args):
+    """Parse --shard i/N and reject reports that cannot be merged from shards."""
+    try:
+        args.shard = parse_shard(args.shard)
+        if args.method == "general":
+            raise ValueError("The general method's directory tree spans all shards; shard the unified or includes method")
+        if args.format == "jsonl":
+            raise ValueError("--shard applies to text reports; it cannot be combined with --format jsonl")
+        check_sharding(args.max_bytes, args.max_tokens, rename_threshold(args), args.output_format)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.watch:
+        parser.error("--watch keeps one whole report updated; it cannot be combined with --shard")
+
+def merge(argv):
+    """Merge the reports of all shards of a comparison into the report of a single run."""
+    parser = argparse.ArgumentParser(prog="main.py merge", description="Merge the reports written with --shard i/N")
+    parser.add_argument("output_file", help="Path to the merged report")
+    parser.add_argument("shard_reports", nargs="+", metavar="shard_report", help="Report of each shard (with its .shard index next to it)")
+
+    args = parser.parse_args(argv)
+    for report_file in args.shard_reports:
+        if not os.path.isfile(report_file):
+            raise FileNotFoundError(f"Shard report does not exist: {report_file}")
+
+    paths = merge_shards(args.shard_reports, args.output_file)
+    logger.info(f"Merged {len(args.shard_reports)} shards ({paths} files) into: {args.output_file}")
+
+def write_candidate_report(args, candidate_dir, output_file, known):
+    """Write the report of one compare-many candidate against the baseline in args."""
+    write_report(argparse.Namespace(**{**vars(args), "modified_dir": candidate_dir}), output_file, known)
+
+def many(argv):
+    """Compare one baseline directory against many candidate directories, walking and hashing the baseline once."""
+    parser = argparse.ArgumentParser(prog="main.py compare-many", description="Compare a baseline against many candidate trees")
+    parser.add_argument("original_dir", metavar="baseline_dir", help="Path to the baseline directory")
+    parser.add_argument("candidates", nargs="+", metavar="candidate_dir", help="Paths to the candidate directories")
+    parser.add_argument("--output-dir", required=True, help=f"Directory for one report per candidate and {SUMMARY_FILE}, a matrix of changed files per candidate")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes comparing candidates in parallel")
+    add_report_options(parser)
+    parser.set_defaults(git_repo=None, against_manifest=False, shard=None)
+
+    args = parser.parse_args(argv)
+    check_report_options(parser, args)
+    for directory in [args.original_dir, *args.candidates]:
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Directory does not exist: {directory}")
+
+    stats = RunStats() if args.stats else None
+    with collect(stats), profiled(args.profile, sys.stderr) as profile_summary:
+        matrix = compare_many(
+            args.original_dir,
+            args.candidates,
+            args.output_dir,
+            functools.partial(write_candidate_report, args),
+            compare_options(args),
+            workers=args.workers,
+            suffix=".jsonl" if args.format == "jsonl" else ".txt" + OUTPUT_SUFFIXES[args.output_format],
+        )
+    if stats is not None:
+        write_stats(args.stats, stats, {"method": args.method, **profile_summary})
+        logger.info(f"Run statistics saved to: {args.stats}")
+    logger.info(f"Compared {len(matrix)} candidates; reports and {SUMMARY_FILE} saved to: {args.output_dir}")
+
+def main():
+    if sys.argv[1:2] == ["snapshot"]:
+        snapshot(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["compare-many"]:
+        many(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["merge"]:
+        merge(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="File comparison tool")
+    parser.add_argument("original_dir", help="Path to the original directory (or a revision with --git-repo, or a manifest with --against-manifest)")
+    parser.add_argument("modified_dir", help="Path to the modified directory (or a revision with --git-repo)")
+    parser.add_argument("output_file", help="Path to the output report file")
+    add_report_options(parser)
+    parser.add_argument("--git-repo", default=None, help="Compare two revisions of this git repository without checking them out")
+    parser.add_argument("--against-manifest", action="store_true", help="original_dir is a manifest written by 'main.py snapshot'; only modified_dir is walked")
+    parser.add_argument("--watch", action="store_true", help="After writing the report, keep it updated as files in modified_dir change")
+    parser.add_argument("--watch-debounce", type=int, default=int(DEFAULT_DEBOUNCE * 1000), metavar="MS", help="Quiet time in milliseconds after a change before the report is rewritten")
+    parser.add_argument("--shard", default=None, metavar="I/N", help="Only walk and report the top-level entries owned by shard I of N (0-based); combine the shards with 'main.py merge'")
+    parser.add_argument("--watch-poll", action="store_true", help="Watch by rescanning modified_dir every second instead of with inotify")
+
+    args = parser.parse_args()
+
+    # Validate directories (revisions are resolved by the git backend)
+    if args.git_repo and args.against_manifest:
+        parser.error("--git-repo and --against-manifest cannot be combined")
+    check_report_options(parser, args)
+    if args.shard is not None:
+        check_shard_options(parser, args)
+    if args.watch and (args.git_repo or args.against_manifest):
+        parser.error("--watch compares two directories; it cannot be combined with --git-repo or --against-manifest")
+    if args.against_manifest:
+        if not os.path.isfile(args.original_dir):
+            raise FileNotFoundError(f"Manifest does not exist: {args.original_dir}")
+        if not os.path.isdir(args.modified_dir):
+            raise FileNotFoundError(f"Modified directory does not exist: {args.modified_dir}")
+    elif args.git_repo:
+        if not os.path.isdir(args.git_repo):
+            raise FileNotFoundError(f"Git repository does not exist: {args.git_repo}")
+    else:
+        validate_paths(args.original_dir, args.modified_dir)
+
+    stats = RunStats() if args.stats else None
+    with collect(stats), profiled(args.profile, sys.stderr) as profile_summary:
+        state = WatchState(args.original_dir, args.modified_dir, compare_options(args)) if args.watch else None
+        if state is None:
+            write_report(args, args.output_file)
+        else:
+            write_atomically(args.output_file, lambda path: write_report(args, path, state.known()))
+
+    if stats is not None:
+        write_stats(args.stats, stats, {"method": args.method, **profile_summary})
+        logger.info(f"Run statistics saved to: {args.stats}")
+
     # Log completion
     logger.info(f"Comparison report saved to: {args.output_file}")
 
+    if state is not None:
+        logger.info(f"Watching {args.modified_dir} for changes (Ctrl-C to stop)")
+        try:
+            watch(
+                state,
+                lambda: write_atomically(args.output_file, lambda path: write_report(args, path, state.known())),
+                debounce=args.watch_debounce / 1000,
+                use_inotify=not args.watch_poll,
+            )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            state.close()
+
 if __name__ == "__main__":
     main()
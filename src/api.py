@@ -0,0 +1,502 @@
+import os
+import re
+import sys
+import json
+from bisect import bisect_right
+from contextlib import ExitStack
+from typing import Callable, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Set, TextIO
+
+# Adding src to the Python path so modules in src/ can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import (
+    DEFAULT_MAX_FILE_SIZE, TEXT, TreeScan, scan_trees, files_differ, diff_files, map_ordered, sniff_file, compare_cost,
+    diff_cost, text_files_differ,
+)
+from hash_cache import hash_file, open_hash_cache
+from budget import estimate_diff_bytes, estimate_section_costs
+from diff_algorithms import DEFAULT_ALGORITHM, DEFAULT_CONTEXT_LINES
+from normalize import UTF8, Normalization
+from shards import Shard
+from renames import DEFAULT_RENAME_THRESHOLD, Rename, detect_renames
+import metrics
+
+MODIFIED = "modified"
+NEW = "new"
+DELETED = "deleted"
+RENAMED = "renamed"
+UNCHANGED = "unchanged"
+
+HUNK_HEADER = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class CompareOptions(NamedTuple):
+    """Settings of a comparison; the defaults match those of the command line."""
+    ignore_patterns: Set[str] = None
+    shallow_ignore: Set[str] = None
+    include_only: Set[str] = None
+    max_depth: int = None
+    cache_dir: str = None
+    jobs: int = 1
+    io_threads: int = 0
+    diff_algorithm: str = DEFAULT_ALGORITHM
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE
+    git_repo: str = None
+    use_gitignore: bool = False
+    against_manifest: bool = False
+    # None disables rename detection
+    rename_threshold: Optional[float] = DEFAULT_RENAME_THRESHOLD
+    # Also yield files that did not change
+    list_unchanged: bool = False
+    # Without diffs, changed files are only found by comparing bytes and nothing is sniffed
+    diffs: bool = True
+    # Unchanged lines around each change, and whether hunks widen to the enclosing function or class
+    context_lines: int = DEFAULT_CONTEXT_LINES
+    function_context: bool = False
+    # Line ending, whitespace and encoding differences to ignore (see normalize.py)
+    ignore_eol: bool = False
+    ignore_whitespace: bool = False
+    encoding: str = UTF8
+    # Fill in the digests of both sides of each change
+    hashes: bool = False
+    # Only compare the top-level entries this shard owns (see shards.py)
+    shard: Shard = None
+
+    @property
+    def normalization(self) -> Normalization:
+        """How contents are normalized before they are compared."""
+        return Normalization(self.ignore_eol, self.ignore_whitespace, self.encoding)
+
+
+class KnownTrees(NamedTuple):
+    """Scans of both trees and the common files known to differ, kept from an earlier comparison (see watch.py)."""
+    original_scan: TreeScan
+    modified_scan: TreeScan
+    # Common files not listed here are known to be identical
+    changed: FrozenSet[str]
+
+
+def _format_range(start: int, count: int) -> str:
+    return str(start) if count == 1 else f"{start},{count}"
+
+
+class Hunk:
+    """One '@@' block of a unified diff; lines keep their ' ', '-' or '+' prefix."""
+    __slots__ = ("original_start", "original_count", "modified_start", "modified_count", "lines")
+
+    def __init__(self, original_start: int, original_count: int, modified_start: int, modified_count: int,
+                 lines: List[str]):
+        self.original_start = original_start
+        self.original_count = original_count
+        self.modified_start = modified_start
+        self.modified_count = modified_count
+        self.lines = lines
+
+    @property
+    def header(self) -> str:
+        """The '@@ -1,3 +1,4 @@' line, formatted as difflib does."""
+        return (f"@@ -{_format_range(self.original_start, self.original_count)} "
+                f"+{_format_range(self.modified_start, self.modified_count)} @@")
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"Hunk({self.header!r}, {len(self.lines)} lines)"
+
+
+def parse_hunks(diff: List[str]) -> List[Hunk]:
+    """Split unified diff lines (as returned by diff_files) into hunks."""
+    hunks = []
+    for line in diff:
+        match = HUNK_HEADER.match(line)
+        if match:
+            original_start, original_count, modified_start, modified_count = match.groups()
+            hunks.append(Hunk(
+                int(original_start), int(original_count or 1),
+                int(modified_start), int(modified_count or 1),
+                [],
+            ))
+        elif hunks:
+            hunks[-1].lines.append(line.rstrip("\n"))
+    return hunks
+
+
+class Change:
+    """
+    One file of a comparison.
+
+    Paths are relative to the compared trees; for a rename, path is the new
+    path and source the original one. kind is TEXT, BINARY or OVERSIZED once
+    the file has been sniffed or diffed, diff holds the raw unified diff lines
+    (or a one-line summary for files that are not diffed as text), and error
+    the OSError or UnicodeDecodeError raised while reading the file, if any.
+    original_file and modified_file are where the contents can be read while
+    the Comparison that produced the change is open.
+    """
+    __slots__ = (
+        "path", "status", "source", "similarity", "kind", "original_size", "modified_size",
+        "original_digest", "modified_digest", "diff", "error", "original_file", "modified_file",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        status: str,
+        source: str = None,
+        similarity: float = None,
+        kind: str = None,
+        original_size: int = None,
+        modified_size: int = None,
+        original_digest: bytes = None,
+        modified_digest: bytes = None,
+        diff: List[str] = None,
+        error: Exception = None,
+        original_file: str = None,
+        modified_file: str = None,
+    ):
+        self.path = path
+        self.status = status
+        self.source = source
+        self.similarity = similarity
+        self.kind = kind
+        self.original_size = original_size
+        self.modified_size = modified_size
+        self.original_digest = original_digest
+        self.modified_digest = modified_digest
+        self.diff = diff
+        self.error = error
+        self.original_file = original_file
+        self.modified_file = modified_file
+
+    @property
+    def hunks(self) -> List[Hunk]:
+        """The diff parsed into hunks (empty for files that are not diffed as text)."""
+        if self.kind != TEXT or not self.diff:
+            return []
+        return parse_hunks(self.diff)
+
+    def to_dict(self) -> dict:
+        """Return the change as JSON-serializable data, leaving out fields that do not apply."""
+        data = {"path": self.path, "status": self.status}
+        for name in ("source", "similarity", "kind", "original_size", "modified_size"):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        for name in ("original_digest", "modified_digest"):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value.hex()
+        if self.diff:
+            if self.kind == TEXT:
+                data["hunks"] = [hunk.to_dict() for hunk in self.hunks]
+            else:
+                data["summary"] = self.diff[0]
+        if self.error is not None:
+            data["error"] = str(self.error)
+        return data
+
+    def __repr__(self) -> str:
+        return f"Change({self.path!r}, {self.status!r})"
+
+
+class Comparison:
+    """
+    Two trees set up for comparison, and the changes between them.
+
+    Creating a Comparison walks both trees (or reads git revisions or a
+    manifest), settles unchanged files through the digest cache where one is
+    configured (or by comparing bytes when no diffs are wanted), and pairs
+    renamed files. Nothing else is read until changes() is iterated or a
+    report plans its budget with section_costs(). Use it as a
+    context manager: it holds the digest cache and any temporary directory the
+    original contents were restored to.
+
+    Args:
+        original (str): Original directory, or a revision with git_repo, or a manifest with against_manifest.
+        modified (str): Modified directory, or a revision with git_repo.
+        options (CompareOptions): Settings of the comparison.
+        known (KnownTrees): Scans and changed files to reuse instead of walking and comparing the trees.
+    """
+
+    def __init__(self, original: str, modified: str, options: CompareOptions = None, known: KnownTrees = None):
+        self.options = options = options or CompareOptions()
+        self.known = known
+        stats = metrics.current()
+        if known is not None:
+            self.original_scan, self.modified_scan = known.original_scan, known.modified_scan
+        else:
+            with stats.phase("walk"):
+                self.original_scan, self.modified_scan = scan_trees(
+                    original, modified, options.max_depth, options.ignore_patterns, options.shallow_ignore,
+                    include_only=options.include_only, git_repo=options.git_repo,
+                    list_unchanged=options.list_unchanged, use_gitignore=options.use_gitignore,
+                    against_manifest=options.against_manifest, shard=options.shard,
+                )
+        # Contents are read from wherever the scans found them (a temporary directory for git revisions
+        # and manifests)
+        self.original_dir, self.modified_dir = self.original_scan.root, self.modified_scan.root
+        self.original_files = self.original_scan.files
+        self.modified_files = self.modified_scan.files
+        self.paths = sorted(self.original_files.keys() | self.modified_files.keys())
+
+        self._stack = ExitStack()
+        try:
+            self.cache = self._stack.enter_context(open_hash_cache(options.cache_dir))
+            self._match_files()
+        except BaseException:
+            self.close()
+            raise
+
+    def _match_files(self) -> None:
+        options = self.options
+        stats = metrics.current()
+        # Common files that may differ; exactly those that do when a cache or a byte compare settled them
+        self.candidates = [
+            file_path for file_path in self.paths
+            if file_path in self.original_files and file_path in self.modified_files
+        ]
+        self._settled = False
+        if self.known is not None:
+            self.candidates = [file_path for file_path in self.candidates if file_path in self.known.changed]
+            self._settled = True
+        if not options.diffs or (self.known is None and self.cache is not None):
+            # Warm caches settle most unchanged files without reading them; without diffs, files
+            # known to differ as bytes are still compared by their lines
+            self._settle_candidates()
+
+        self.renames: Dict[str, Rename] = {}
+        if options.rename_threshold is not None:
+            with stats.phase("compare"):
+                self.renames = detect_renames(
+                    self.original_files, self.modified_files, self.original_dir, self.modified_dir,
+                    options.rename_threshold, self.cache, options.max_file_size,
+                )
+        self.rename_sources = {rename.source for rename in self.renames.values()}
+        self._index_candidates()
+
+    def _settle_candidates(self) -> None:
+        """
+        Narrow the candidates down to the files that differ, comparing their contents.
+
+        Without diffs, text files are also compared by their lines, so a file
+        that differs only in line endings is unchanged as it is in a diff.
+        """
+        options = self.options
+        stats = metrics.current()
+        compare, extra = (files_differ, ()) if options.diffs else (text_files_differ, (options.max_file_size,))
+        with stats.phase("compare"):
+            differs = map_ordered(
+                compare,
+                (
+                    (
+                        os.path.join(self.original_dir, file_path),
+                        os.path.join(self.modified_dir, file_path),
+                        self.original_files[file_path],
+                        self.modified_files[file_path],
+                        self.cache,
+                        options.normalization,
+                        *extra,
+                    )
+                    for file_path in self.candidates
+                ),
+                threads=options.io_threads,
+                cost=compare_cost,
+            )
+            self.candidates = [file_path for file_path, future in zip(self.candidates, differs) if future.result()]
+        self._settled = True
+
+    def _index_candidates(self) -> None:
+        # Modified files, and renamed files that are not identical, keyed to their original path
+        self._diff_sources = {file_path: file_path for file_path in self.candidates}
+        self._diff_sources.update(
+            (file_path, rename.source) for file_path, rename in self.renames.items() if rename.similarity < 1.0
+        )
+        candidates = set(self.candidates)
+        # Paths that may still yield a change other than UNCHANGED, in order
+        self._pending = [
+            file_path for file_path in self.paths
+            if file_path in candidates or (
+                (file_path not in self.original_files or file_path not in self.modified_files)
+                and file_path not in self.rename_sources
+            )
+        ]
+
+    def pending_after(self, file_path: str) -> int:
+        """Number of paths after file_path that may still be reported as changed (for omitted-section counts)."""
+        return len(self._pending) - bisect_right(self._pending, file_path)
+
+    def section_costs(self, modified_cost: Callable[[int, int], int] = estimate_diff_bytes) -> Dict[str, int]:
+        """
+        Estimated report bytes of each pending path from stat sizes (see budget.py).
+
+        Common files not yet settled by the cache or a byte compare are
+        compared first, so only files that differ are charged and the
+        estimate is the same with or without a cache.
+        """
+        if not self._settled:
+            self._settle_candidates()
+            self._index_candidates()
+        return estimate_section_costs(
+            self.candidates, self.original_files, self.modified_files, modified_cost,
+            renames={file_path: rename.source for file_path, rename in self.renames.items()},
+        )
+
+    def _digest(self, path: str, stat) -> bytes:
+        if self.cache is not None:
+            return self.cache.digest(path, stat)
+        metrics.current().count("bytes_read", stat.st_size)
+        return hash_file(path)
+
+    def changes(self) -> Iterator[Change]:
+        """
+        Yield a Change for each reported path, in path order.
+
+        Diffs are computed lazily, a window ahead of the consumer (in worker
+        processes with jobs > 1, on threads with io_threads), so stopping the
+        iteration early stops reading input. Rename sources are reported under
+        their new path only, and unchanged files only with list_unchanged.
+        Errors reading a file are stored on its change rather than raised.
+        """
+        options = self.options
+        stats = metrics.current()
+        original_files, modified_files = self.original_files, self.modified_files
+        candidates = set(self.candidates)
+
+        diffs = None
+        if options.diffs:
+            diffs = map_ordered(
+                diff_files,
+                (
+                    (
+                        os.path.join(self.original_dir, self._diff_sources[file_path]),
+                        os.path.join(self.modified_dir, file_path),
+                        original_files[self._diff_sources[file_path]],
+                        modified_files[file_path],
+                        options.diff_algorithm,
+                        options.max_file_size,
+                        options.context_lines,
+                        options.function_context,
+                        options.normalization,
+                    )
+                    for file_path in self.paths
+                    if file_path in self._diff_sources
+                ),
+                jobs=options.jobs,
+                threads=options.io_threads,
+                cost=diff_cost,
+            )
+
+        for file_path in self.paths:
+            if file_path in self.rename_sources:
+                continue
+            if file_path in self.renames:
+                rename = self.renames[file_path]
+                change = Change(file_path, RENAMED, source=rename.source, similarity=rename.similarity)
+            elif file_path not in original_files:
+                change = Change(file_path, NEW)
+            elif file_path not in modified_files:
+                change = Change(file_path, DELETED)
+            else:
+                change = Change(file_path, MODIFIED if file_path in candidates else UNCHANGED)
+
+            original_path = change.source or file_path
+            if original_path in original_files:
+                change.original_size = original_files[original_path].st_size
+                change.original_file = os.path.join(self.original_dir, original_path)
+            if file_path in modified_files:
+                change.modified_size = modified_files[file_path].st_size
+                change.modified_file = os.path.join(self.modified_dir, file_path)
+
+            try:
+                if diffs is not None and file_path in self._diff_sources:
+                    with stats.phase("diff"):
+                        change.kind, change.diff = next(diffs).result()
+                    if change.kind is None:
+                        if change.status == MODIFIED:
+                            # Same contents after all
+                            change.status = UNCHANGED
+                        else:
+                            # Renamed without any change to its text
+                            change.kind = TEXT
+                elif options.diffs and change.status in (NEW, DELETED):
+                    path, stat = (
+                        (change.modified_file, modified_files[file_path]) if change.status == NEW
+                        else (change.original_file, original_files[file_path])
+                    )
+                    change.kind = sniff_file(path, stat, options.max_file_size)
+
+                if change.status == UNCHANGED and not options.list_unchanged:
+                    continue
+
+                if options.hashes:
+                    if change.original_file is not None:
+                        change.original_digest = self._digest(change.original_file, original_files[original_path])
+                    if change.modified_file is not None:
+                        change.modified_digest = self._digest(change.modified_file, modified_files[file_path])
+            except (OSError, UnicodeDecodeError) as e:
+                change.error = e
+            yield change
+
+    def close(self) -> None:
+        """Close the digest cache and remove temporary copies of the original contents."""
+        self._stack.close()
+        if self.known is not None:
+            # The scans belong to whoever keeps them
+            return
+        for scan in (self.original_scan, self.modified_scan):
+            cleanup = getattr(scan.storage, "cleanup", None)
+            if cleanup is not None:
+                cleanup()
+
+    def __enter__(self) -> "Comparison":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def compare(
+    original: str,
+    modified: str,
+    options: CompareOptions = None,
+    known: KnownTrees = None,
+) -> Iterator[Change]:
+    """
+    Compare two trees and yield a Change record for each changed file, lazily.
+
+    Nothing is walked or read until the first change is requested, and
+    temporary storage is released once the generator is exhausted or closed.
+    Each change is only valid until the generator finishes as far as its
+    original_file and modified_file are concerned; the other fields can be
+    kept.
+
+    Args:
+        original (str): Original directory, or a revision with git_repo, or a manifest with against_manifest.
+        modified (str): Modified directory, or a revision with git_repo.
+        options (CompareOptions): Settings of the comparison.
+        known (KnownTrees): Scans and changed files to reuse (see Comparison).
+
+    Returns:
+        Iterator[Change]: Changes in path order.
+    """
+    with Comparison(original, modified, options, known) as comparison:
+        yield from comparison.changes()
+
+
+def write_jsonl(changes: Iterator[Change], out: TextIO) -> int:
+    """
+    Write one JSON object per change to out, as each change arrives.
+
+    Args:
+        changes (Iterator[Change]): Changes, e.g. from compare().
+        out (TextIO): Text stream to write to.
+
+    Returns:
+        int: Number of changes written.
+    """
+    count = 0
+    for change in changes:
+        out.write(json.dumps(change.to_dict(), ensure_ascii=False, separators=(",", ":")) + "\n")
+        count += 1
+    return count
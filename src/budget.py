@@ -0,0 +1,125 @@
+import os
+from typing import Callable, Dict, Iterable, Optional, Set
+
+# Rough size of one LLM token in UTF-8 bytes for source code and prose
+BYTES_PER_TOKEN = 4
+
+# Bytes held back so the closing "sections omitted" note always fits
+FOOTER_RESERVE = 128
+
+# Rough bytes for a section header plus diff headers and context lines
+SECTION_OVERHEAD = 64
+
+LOW_RELEVANCE_NAMES = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock",
+    "Pipfile.lock", "Cargo.lock", "composer.lock", "Gemfile.lock", "go.sum",
+}
+LOW_RELEVANCE_SUFFIXES = (".min.js", ".min.css", ".map", ".lock", ".svg", ".snap")
+LOW_RELEVANCE_DIRS = {"vendor", "node_modules", "dist", "build", "third_party", "__snapshots__"}
+
+
+def estimate_tokens(num_bytes: int) -> int:
+    """Estimate the number of LLM tokens in num_bytes of report text."""
+    return (num_bytes + BYTES_PER_TOKEN - 1) // BYTES_PER_TOKEN
+
+
+def estimate_diff_bytes(original_size: int, modified_size: int) -> int:
+    """Estimate the size of a unified diff from the two files' stat sizes alone."""
+    return abs(modified_size - original_size) + 4 * SECTION_OVERHEAD
+
+
+def estimate_section_costs(
+    changed_files: Iterable[str],
+    original_files: Dict[str, os.stat_result],
+    modified_files: Dict[str, os.stat_result],
+    modified_cost: Callable[[int, int], int] = estimate_diff_bytes,
+    renames: Dict[str, str] = None,
+) -> Dict[str, int]:
+    """
+    Estimate the full section size of every changed, new, deleted and renamed file.
+
+    Args:
+        changed_files (Iterable[str]): Files present on both sides that may differ.
+        original_files (Dict[str, os.stat_result]): Original tree from scan_tree.
+        modified_files (Dict[str, os.stat_result]): Modified tree from scan_tree.
+        modified_cost (Callable[[int, int], int]): Section size of a modified file,
+            given its original and modified sizes.
+        renames (Dict[str, str]): Source path of each renamed file, keyed by its new
+            path. A rename is shown as a diff rather than as DELETED and NEW.
+
+    Returns:
+        Dict[str, int]: Estimated bytes per file path.
+    """
+    costs = {
+        file_path: modified_cost(original_files[file_path].st_size, modified_files[file_path].st_size)
+        for file_path in changed_files
+    }
+    for file_path in original_files.keys() ^ modified_files.keys():
+        stat = modified_files.get(file_path) or original_files[file_path]
+        costs[file_path] = stat.st_size + SECTION_OVERHEAD
+    for file_path, source in (renames or {}).items():
+        del costs[source]
+        costs[file_path] = estimate_diff_bytes(original_files[source].st_size, modified_files[file_path].st_size)
+    return costs
+
+
+def is_low_relevance(file_path: str) -> bool:
+    """Return True for lockfiles, minified or generated assets and vendored paths."""
+    name = os.path.basename(file_path)
+    if name in LOW_RELEVANCE_NAMES or name.endswith(LOW_RELEVANCE_SUFFIXES):
+        return True
+    return any(part in LOW_RELEVANCE_DIRS for part in file_path.split(os.sep)[:-1])
+
+
+class ReportBudget:
+    """
+    Output size budget for one report, in bytes.
+
+    A token limit is converted at BYTES_PER_TOKEN bytes per token; when both
+    limits are given the smaller one wins. The budget is spent by ReportWriter
+    as text is written, and plan() decides up front which files can be shown
+    in full so the most useful sections survive.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, max_tokens: Optional[int] = None):
+        limits = [limit for limit in (max_bytes, max_tokens and max_tokens * BYTES_PER_TOKEN) if limit]
+        self.limit = max(min(limits) - FOOTER_RESERVE, 0) if limits else None
+        self.used = 0
+
+    @property
+    def remaining(self) -> float:
+        """Bytes left to spend (infinite when unbounded)."""
+        if self.limit is None:
+            return float("inf")
+        return self.limit - self.used
+
+    def charge(self, num_bytes: int) -> None:
+        """Record num_bytes of written output."""
+        self.used += num_bytes
+
+    def plan(self, costs: Dict[str, int]) -> Set[str]:
+        """
+        Choose which files are shown in full detail.
+
+        Files are ranked with relevant paths before lockfiles, generated and
+        vendored files, and smaller estimated sections first, then taken
+        greedily while their estimated cost still fits in the budget. The
+        remaining files are written in a reduced form by the caller.
+
+        Args:
+            costs (Dict[str, int]): Estimated bytes of each file's full section.
+
+        Returns:
+            Set[str]: Paths that should be written in full.
+        """
+        if self.limit is None:
+            return set(costs)
+
+        available = self.remaining
+        full = set()
+        for file_path in sorted(costs, key=lambda path: (is_low_relevance(path), costs[path], path)):
+            if costs[file_path] > available:
+                continue
+            available -= costs[file_path]
+            full.add(file_path)
+        return full
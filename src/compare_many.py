@@ -0,0 +1,239 @@
+import os
+import sys
+from typing import Callable, Dict, List, Sequence, TextIO
+
+# Adding src to the Python path so modules in src/ can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import DEFAULT_MAX_FILE_SIZE, TreeScan, compare_cost, map_ordered, scan_tree, text_files_differ
+from hash_cache import hash_file, open_hash_cache
+from api import CompareOptions, KnownTrees
+from normalize import Normalization
+import metrics
+
+SUMMARY_FILE = "summary.tsv"
+
+# Cells of the summary matrix
+MATRIX_MODIFIED = "M"
+MATRIX_NEW = "A"
+MATRIX_DELETED = "D"
+
+# Renders the report of one candidate: (candidate_dir, output_file, known)
+Render = Callable[[str, str, KnownTrees], None]
+
+
+def _digest(path: str, stat, cache) -> bytes:
+    if cache is not None:
+        return cache.digest(path, stat)
+    metrics.current().count("bytes_read", stat.st_size)
+    return hash_file(path)
+
+
+def _digest_cost(task: tuple) -> int:
+    return task[1].st_size
+
+
+class BaselineIndex:
+    """
+    Scan and content digests of a baseline tree, made once and compared against many candidate trees.
+
+    A candidate file differs from the baseline when its size does, or else
+    when its digest does, so the baseline is never read again however many
+    candidates are compared against it.
+
+    Args:
+        scan (TreeScan): Walk of the baseline tree.
+        digests (Dict[str, bytes]): Digest of each file of the scan.
+    """
+
+    def __init__(self, scan: TreeScan, digests: Dict[str, bytes]):
+        self.scan = scan
+        self.digests = digests
+
+    @classmethod
+    def build(cls, baseline_dir: str, options: CompareOptions) -> "BaselineIndex":
+        """Walk and hash baseline_dir with the filters, cache and I/O threads of options."""
+        stats = metrics.current()
+        with stats.phase("walk"):
+            scan = scan_tree(
+                baseline_dir, options.max_depth, options.ignore_patterns, options.shallow_ignore,
+                options.include_only, options.use_gitignore,
+            )
+        paths = sorted(scan.files)
+        with stats.phase("compare"), open_hash_cache(options.cache_dir) as cache:
+            digests = map_ordered(
+                _digest,
+                ((os.path.join(scan.root, file_path), scan.files[file_path], cache) for file_path in paths),
+                threads=options.io_threads,
+                cost=_digest_cost,
+            )
+            return cls(scan, {file_path: future.result() for file_path, future in zip(paths, digests)})
+
+    def statuses(
+        self,
+        candidate: TreeScan,
+        cache=None,
+        io_threads: int = 0,
+        normalization: Normalization = None,
+        max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    ) -> Dict[str, str]:
+        """
+        Compare a candidate scan with the baseline.
+
+        Args:
+            candidate (TreeScan): Walk of the candidate tree.
+            cache (HashCache): Optional persistent digest cache for the candidate's files.
+            io_threads (int): Threads hashing candidate files.
+            normalization (Normalization): How contents are normalized; files whose raw
+                bytes differ are compared again by their lines (see text_files_differ), so
+                a file that differs only in line endings is not reported.
+            max_file_size (int): Largest text file compared by its lines (see sniff_file).
+
+        Returns:
+            Dict[str, str]: MATRIX_MODIFIED, MATRIX_NEW or MATRIX_DELETED for each path that differs.
+        """
+        stats = metrics.current()
+        base_files, files = self.scan.files, candidate.files
+        statuses = {file_path: MATRIX_DELETED for file_path in base_files.keys() - files.keys()}
+        differing, same_size = [], []
+        for file_path, stat in files.items():
+            base_stat = base_files.get(file_path)
+            if base_stat is None:
+                statuses[file_path] = MATRIX_NEW
+            elif base_stat.st_size != stat.st_size:
+                differing.append(file_path)
+            else:
+                same_size.append(file_path)
+        stats.count("files_compared", len(same_size))
+        digests = map_ordered(
+            _digest,
+            ((os.path.join(candidate.root, file_path), files[file_path], cache) for file_path in same_size),
+            threads=io_threads,
+            cost=_digest_cost,
+        )
+        for file_path, future in zip(same_size, digests):
+            if future.result() != self.digests[file_path]:
+                differing.append(file_path)
+        # Only files whose bytes differ are read again, to compare them by their (normalized) lines as the reports do
+        results = map_ordered(
+            text_files_differ,
+            (
+                (
+                    os.path.join(self.scan.root, file_path), os.path.join(candidate.root, file_path),
+                    base_files[file_path], files[file_path], None, normalization, max_file_size,
+                )
+                for file_path in differing
+            ),
+            threads=io_threads,
+            cost=compare_cost,
+        )
+        differing = [file_path for file_path, future in zip(differing, results) if future.result()]
+        statuses.update((file_path, MATRIX_MODIFIED) for file_path in differing)
+        return statuses
+
+
+# State of each worker of compare_many, set once by _start_worker
+_worker = None
+
+
+def _start_worker(index: BaselineIndex, options: CompareOptions, render: Render) -> None:
+    global _worker
+    _worker = (index, options, render)
+
+
+def _compare_candidate(candidate_dir: str, output_file: str) -> Dict[str, str]:
+    index, options, render = _worker
+    stats = metrics.current()
+    with open_hash_cache(options.cache_dir) as cache:
+        with stats.phase("walk"):
+            scan = scan_tree(
+                candidate_dir, options.max_depth, options.ignore_patterns, options.shallow_ignore,
+                options.include_only, options.use_gitignore,
+            )
+        with stats.phase("compare"):
+            statuses = index.statuses(scan, cache, options.io_threads, options.normalization, options.max_file_size)
+    changed = frozenset(file_path for file_path, status in statuses.items() if status == MATRIX_MODIFIED)
+    render(candidate_dir, output_file, KnownTrees(index.scan, scan, changed))
+    return statuses
+
+
+def report_names(candidates: Sequence[str]) -> List[str]:
+    """Return a distinct report name for each candidate directory, from its base name."""
+    names: List[str] = []
+    taken = set()
+    for candidate in candidates:
+        base = os.path.basename(os.path.normpath(candidate)) or "candidate"
+        name, number = base, 1
+        while name in taken:
+            number += 1
+            name = f"{base}-{number}"
+        taken.add(name)
+        names.append(name)
+    return names
+
+
+def write_summary(matrix: Dict[str, Dict[str, str]], out: TextIO) -> None:
+    """
+    Write the summary matrix as tab-separated values.
+
+    The header names the candidates; the next row counts the changed files of
+    each, and then every path changed in any candidate gets a row with its
+    status letter (M, A or D) per candidate.
+    """
+    names = list(matrix)
+    out.write("\t".join(["path", *names]) + "\n")
+    out.write("\t".join(["(changed files)", *(str(len(matrix[name])) for name in names)]) + "\n")
+    for file_path in sorted(set().union(*matrix.values())):
+        out.write("\t".join([file_path, *(matrix[name].get(file_path, "") for name in names)]) + "\n")
+
+
+def compare_many(
+    baseline_dir: str,
+    candidates: Sequence[str],
+    output_dir: str,
+    render: Render,
+    options: CompareOptions = None,
+    workers: int = 1,
+    suffix: str = ".txt",
+) -> Dict[str, Dict[str, str]]:
+    """
+    Compare one baseline tree against many candidate trees in one run.
+
+    The baseline is walked and hashed once (see BaselineIndex) and its index
+    is handed to each worker process once. Candidates are then walked,
+    compared and rendered on a pool of `workers` processes, so the run costs
+    about one baseline scan plus one scan per candidate. Each candidate's
+    report is written to output_dir as <name><suffix>, and SUMMARY_FILE
+    holds the matrix of changed files per candidate.
+
+    Args:
+        baseline_dir (str): Path to the baseline directory.
+        candidates (Sequence[str]): Paths to the candidate directories.
+        output_dir (str): Directory for the reports and the summary, created if needed.
+        render (Render): Module-level (picklable) function writing one candidate's report.
+        options (CompareOptions): Filters, cache and I/O threads of the comparisons.
+        workers (int): Number of worker processes.
+        suffix (str): File name suffix of the reports.
+
+    Returns:
+        Dict[str, Dict[str, str]]: Changed paths and their status letters, keyed by report name.
+    """
+    options = options or CompareOptions()
+    names = report_names(candidates)
+    os.makedirs(output_dir, exist_ok=True)
+    index = BaselineIndex.build(baseline_dir, options)
+
+    results = map_ordered(
+        _compare_candidate,
+        (
+            (candidate_dir, os.path.join(output_dir, name + suffix))
+            for candidate_dir, name in zip(candidates, names)
+        ),
+        jobs=workers,
+        initializer=_start_worker,
+        initargs=(index, options, render),
+    )
+    matrix = {name: future.result() for name, future in zip(names, results)}
+    with open(os.path.join(output_dir, SUMMARY_FILE), 'w', encoding='utf-8') as f:
+        write_summary(matrix, f)
+    return matrix
@@ -0,0 +1,381 @@
+import difflib
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Dict, Iterator, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from scopes import ScopeIndex
+
+ALGORITHMS = ("difflib", "myers", "patience")
+DEFAULT_ALGORITHM = "difflib"
+DEFAULT_CONTEXT_LINES = 3
+
+# How much of a modified file a report shows: the whole original file (or both
+# versions) next to its diff, the diff with each change's enclosing function or
+# class, or the diff alone
+CONTEXT_FILE = "file"
+CONTEXT_FUNCTION = "function"
+CONTEXT_HUNKS = "hunks"
+CONTEXT_MODES = (CONTEXT_FILE, CONTEXT_FUNCTION, CONTEXT_HUNKS)
+DEFAULT_CONTEXT = CONTEXT_FILE
+
+# (ai, bj, size) runs of equal lines, as in SequenceMatcher.get_matching_blocks()
+Match = Tuple[int, int, int]
+Opcode = Tuple[str, int, int, int, int]
+
+
+def intern_lines(a: Sequence[str], b: Sequence[str]) -> Tuple[List[int], List[int]]:
+    """Map the lines of both files to small integers so comparisons are int compares."""
+    ids: Dict[str, int] = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    return a_ids, b_ids
+
+
+def _trim(a: List[int], b: List[int], alo: int, ahi: int, blo: int, bhi: int, matches: List[Match]):
+    """Strip the common prefix and suffix of a range, recording them as matches."""
+    start = alo
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    if alo > start:
+        matches.append((start, blo - (alo - start), alo - start))
+
+    end = ahi
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+    if ahi < end:
+        matches.append((ahi, bhi, end - ahi))
+    return alo, ahi, blo, bhi
+
+
+def _middle_snake(a: List[int], alo: int, ahi: int, b: List[int], blo: int, bhi: int):
+    """
+    Find the midpoint of a shortest edit script between a[alo:ahi] and b[blo:bhi].
+
+    This is the linear-space bisection from Myers' O(ND) paper, searching
+    forward and backward at once. Returns the split point as absolute (x, y)
+    indices, or None if the ranges have nothing in common.
+    """
+    n = ahi - alo
+    m = bhi - blo
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    length = 2 * max_d + 2
+    forward = [-1] * length
+    backward = [-1] * length
+    forward[offset + 1] = 0
+    backward[offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(max_d):
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and forward[k1_offset - 1] < forward[k1_offset + 1]):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                x1 += 1
+                y1 += 1
+            forward[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < length and backward[k2_offset] != -1:
+                    if x1 >= n - backward[k2_offset]:
+                        return alo + x1, blo + y1
+
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and backward[k2_offset - 1] < backward[k2_offset + 1]):
+                x2 = backward[k2_offset + 1]
+            else:
+                x2 = backward[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[ahi - x2 - 1] == b[bhi - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            backward[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < length and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    y1 = offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return alo + x1, blo + y1
+    return None
+
+
+def _myers_matches(a: List[int], b: List[int], alo: int, ahi: int, blo: int, bhi: int, matches: List[Match]) -> None:
+    """Append the matching runs of a minimal diff of a[alo:ahi] and b[blo:bhi] to matches."""
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        alo, ahi, blo, bhi = _trim(a, b, alo, ahi, blo, bhi, matches)
+        if alo == ahi or blo == bhi:
+            continue
+        split = _middle_snake(a, alo, ahi, b, blo, bhi)
+        if split is None:
+            continue
+        x, y = split
+        stack.append((alo, x, blo, y))
+        stack.append((x, ahi, y, bhi))
+
+
+def _longest_increasing_run(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Return the longest subsequence of (i, j) pairs, sorted by i, whose j also increases."""
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous = [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        position = bisect_left(tails, j)
+        if position == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[position] = j
+            tail_index[position] = index
+        previous[index] = tail_index[position - 1] if position else -1
+
+    result = []
+    index = tail_index[-1] if tail_index else -1
+    while index != -1:
+        result.append(pairs[index])
+        index = previous[index]
+    result.reverse()
+    return result
+
+
+def _patience_matches(a: List[int], b: List[int], matches: List[Match]) -> None:
+    """Append the matching runs of a patience diff of a and b to matches."""
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        alo, ahi, blo, bhi = _trim(a, b, alo, ahi, blo, bhi, matches)
+        if alo == ahi or blo == bhi:
+            continue
+
+        # Lines that occur exactly once on each side anchor the diff
+        a_count: Dict[int, int] = {}
+        for line in a[alo:ahi]:
+            a_count[line] = a_count.get(line, 0) + 1
+        b_position: Dict[int, int] = {}
+        for j in range(blo, bhi):
+            line = b[j]
+            if a_count.get(line) == 1:
+                b_position[line] = -1 if line in b_position else j
+        pairs = [
+            (i, b_position[a[i]]) for i in range(alo, ahi)
+            if b_position.get(a[i], -1) != -1 and a_count[a[i]] == 1
+        ]
+        anchors = _longest_increasing_run(pairs)
+        if not anchors:
+            _myers_matches(a, b, alo, ahi, blo, bhi, matches)
+            continue
+
+        prev_i, prev_j = alo, blo
+        for i, j in anchors:
+            stack.append((prev_i, i, prev_j, j))
+            matches.append((i, j, 1))
+            prev_i, prev_j = i + 1, j + 1
+        stack.append((prev_i, ahi, prev_j, bhi))
+
+
+def matching_blocks(a: Sequence[str], b: Sequence[str], algorithm: str = "myers") -> List[Match]:
+    """
+    Return the matching blocks of two line sequences, like SequenceMatcher.get_matching_blocks().
+
+    Args:
+        a (Sequence[str]): Lines of the original file.
+        b (Sequence[str]): Lines of the modified file.
+        algorithm (str): "myers" or "patience".
+
+    Returns:
+        List[Match]: Sorted, merged (ai, bj, size) runs ending with (len(a), len(b), 0).
+    """
+    a_ids, b_ids = intern_lines(a, b)
+    matches: List[Match] = []
+    if algorithm == "myers":
+        _myers_matches(a_ids, b_ids, 0, len(a_ids), 0, len(b_ids), matches)
+    elif algorithm == "patience":
+        _patience_matches(a_ids, b_ids, matches)
+    else:
+        raise ValueError(f"Unknown diff algorithm: {algorithm}")
+
+    matches.sort()
+    merged: List[Match] = []
+    for ai, bj, size in matches:
+        if merged and merged[-1][0] + merged[-1][2] == ai and merged[-1][1] + merged[-1][2] == bj:
+            last_ai, last_bj, last_size = merged[-1]
+            merged[-1] = (last_ai, last_bj, last_size + size)
+        elif size:
+            merged.append((ai, bj, size))
+    merged.append((len(a), len(b), 0))
+    return merged
+
+
+def get_opcodes(a: Sequence[str], b: Sequence[str], algorithm: str = "myers") -> List[Opcode]:
+    """Return SequenceMatcher-style opcodes describing how to turn a into b."""
+    if algorithm == "difflib":
+        return difflib.SequenceMatcher(None, a, b).get_opcodes()
+
+    i = j = 0
+    opcodes: List[Opcode] = []
+    for ai, bj, size in matching_blocks(a, b, algorithm):
+        tag = ''
+        if i < ai and j < bj:
+            tag = 'replace'
+        elif i < ai:
+            tag = 'delete'
+        elif j < bj:
+            tag = 'insert'
+        if tag:
+            opcodes.append((tag, i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(('equal', ai, i, bj, j))
+    return opcodes
+
+
+def group_opcodes(opcodes: List[Opcode], n: int = 3) -> Iterator[List[Opcode]]:
+    """Group opcodes into hunks with n lines of context, like SequenceMatcher.get_grouped_opcodes()."""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    nn = n + n
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def group_opcodes_in_scopes(opcodes: List[Opcode], n: int, scopes: "ScopeIndex") -> Iterator[List[Opcode]]:
+    """
+    Group opcodes into hunks that show the whole function or class around each change.
+
+    Like group_opcodes, but the context before and after a change reaches the
+    bounds of its enclosing scope in the original file (see scopes.py), and
+    is never less than n lines.
+    """
+    codes = list(opcodes)
+    # Lines of context each change needs before and after it
+    needs = {}
+    for index, (tag, i1, i2, j1, j2) in enumerate(codes):
+        if tag != 'equal':
+            start, end = scopes.enclosing(i1, i2)
+            needs[index] = (max(n, i1 - start), max(n, end - i2))
+
+    group: List[Opcode] = []
+    for index, (tag, i1, i2, j1, j2) in enumerate(codes):
+        if tag == 'equal':
+            after = needs[index - 1][1] if index - 1 in needs else 0
+            before = needs[index + 1][0] if index + 1 in needs else 0
+            if i2 - i1 > after + before:
+                if after:
+                    group.append((tag, i1, i1 + after, j1, j1 + after))
+                if group:
+                    yield group
+                group = []
+                if not before:
+                    continue
+                i1, j1 = i2 - before, j2 - before
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def _format_range(start: int, stop: int) -> str:
+    """Convert a range to the 'start,length' form used in unified diff hunk headers."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff(
+    a: Sequence[str],
+    b: Sequence[str],
+    fromfile: str = '',
+    tofile: str = '',
+    n: int = 3,
+    lineterm: str = '\n',
+    algorithm: str = DEFAULT_ALGORITHM,
+    scopes: "ScopeIndex" = None,
+    keys: Tuple[Sequence[str], Sequence[str]] = None,
+) -> Iterator[str]:
+    """
+    Yield a unified diff of two line sequences using the chosen algorithm.
+
+    The output format is the same as difflib.unified_diff; "difflib" delegates
+    to it, while "myers" and "patience" avoid SequenceMatcher's quadratic worst
+    case on large files with many repeated lines. With scopes, each hunk is
+    widened to the function or class around its changes. With keys, lines
+    are matched by their keys (e.g. with whitespace normalized) but shown as
+    they are in a and b.
+
+    Args:
+        a (Sequence[str]): Lines of the original file.
+        b (Sequence[str]): Lines of the modified file.
+        fromfile (str): Name shown on the '---' line.
+        tofile (str): Name shown on the '+++' line.
+        n (int): Lines of context around each change.
+        lineterm (str): Terminator for the header lines.
+        algorithm (str): One of ALGORITHMS.
+        scopes (ScopeIndex): Function and class ranges of a, for function-level context.
+        keys (Tuple[Sequence[str], Sequence[str]]): Compared form of each line of a and b.
+
+    Returns:
+        Iterator[str]: Lines of the unified diff.
+    """
+    if algorithm == "difflib" and scopes is None and keys is None:
+        yield from difflib.unified_diff(a, b, fromfile=fromfile, tofile=tofile, n=n, lineterm=lineterm)
+        return
+
+    opcodes = get_opcodes(*(keys or (a, b)), algorithm)
+    groups = group_opcodes(opcodes, n) if scopes is None else group_opcodes_in_scopes(opcodes, n, scopes)
+    started = False
+    for group in groups:
+        if not started:
+            started = True
+            yield f"--- {fromfile}{lineterm}"
+            yield f"+++ {tofile}{lineterm}"
+
+        first, last = group[0], group[-1]
+        yield f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@{lineterm}"
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in a[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in b[j1:j2]:
+                    yield '+' + line
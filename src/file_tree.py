@@ -0,0 +1,127 @@
+import sys
+from typing import Dict, Iterable, Iterator, List
+
+# Lines joined into each chunk yielded by render_tree
+RENDER_CHUNK_LINES = 4096
+
+IGNORED_MARKER = " [CONTENTS IGNORED]"
+
+
+class TreeDir:
+    """A directory of a FileTree: subdirectories and file statuses keyed by interned names."""
+    __slots__ = ("dirs", "files", "ignored")
+
+    def __init__(self):
+        self.dirs: Dict[str, "TreeDir"] = {}
+        self.files: Dict[str, str] = {}
+        self.ignored = False
+
+
+class FileTree:
+    """
+    Prefix tree of relative paths, built once from scan results.
+
+    Names are interned, so a name repeated across the tree (__init__.py,
+    src, tests) is stored once, and each directory path is split only once
+    however many entries it holds.
+    """
+
+    def __init__(self):
+        self.root = TreeDir()
+        self._nodes: Dict[str, TreeDir] = {"": self.root}
+
+    def add_dir(self, dir_path: str) -> TreeDir:
+        """Return the node of dir_path ('/'-separated), creating it and its parents as needed."""
+        node = self._nodes.get(dir_path)
+        if node is None:
+            parent, _, name = dir_path.rpartition("/")
+            node = TreeDir()
+            self.add_dir(parent).dirs[sys.intern(name)] = node
+            self._nodes[dir_path] = node
+        return node
+
+    def add_file(self, file_path: str, status: str = "") -> None:
+        """Add a file with a status label such as 'NEW' (empty for no label)."""
+        parent, _, name = file_path.rpartition("/")
+        self.add_dir(parent).files[sys.intern(name)] = status
+
+    def mark_ignored(self, dir_path: str) -> None:
+        """Add a directory whose contents were not walked (shallow-ignored)."""
+        self.add_dir(dir_path).ignored = True
+
+
+def build_tree(dirs: Iterable[str], files: Dict[str, str], ignored_dirs: Iterable[str] = ()) -> FileTree:
+    """
+    Build a FileTree from scan results.
+
+    Args:
+        dirs (Iterable[str]): Relative directory paths, e.g. TreeScan.dirs of both sides.
+        files (Dict[str, str]): Relative file paths mapped to their status label ('' for none).
+        ignored_dirs (Iterable[str]): Directories to mark as [CONTENTS IGNORED].
+
+    Returns:
+        FileTree: The tree.
+    """
+    tree = FileTree()
+    for dir_path in dirs:
+        tree.add_dir(dir_path)
+    for dir_path in ignored_dirs:
+        tree.mark_ignored(dir_path)
+    # Sorted paths list the files of a directory together, so its node is looked up once
+    intern, add_dir = sys.intern, tree.add_dir
+    last_parent, node = None, None
+    for file_path, status in files.items():
+        parent, _, name = file_path.rpartition("/")
+        if parent != last_parent:
+            last_parent, node = parent, add_dir(parent)
+        node.files[intern(name)] = status
+    return tree
+
+
+def render_tree(tree: FileTree, header: str = "/repository-root") -> Iterator[str]:
+    """
+    Render a FileTree with box-drawing connectors, in one depth-first pass.
+
+    Files are listed under their directory, directories before files, each
+    group sorted, with '├──' for all but the last entry of a directory and
+    '└──' for the last.
+
+    Args:
+        tree (FileTree): Tree to render.
+        header (str): First line, naming the root.
+
+    Returns:
+        Iterator[str]: Newline-terminated lines joined into chunks of about RENDER_CHUNK_LINES lines.
+    """
+    lines: List[str] = [header + "\n"]
+    # Frames of [directory, prefix of its entries, sorted subdirectory names, next subdirectory]
+    stack = [[tree.root, "", sorted(tree.root.dirs), 0]]
+    while stack:
+        frame = stack[-1]
+        node, prefix, dir_names, index = frame
+        if index < len(dir_names):
+            frame[3] = index + 1
+            name = dir_names[index]
+            child = node.dirs[name]
+            last = index == len(dir_names) - 1 and not node.files
+            lines.append(f"{prefix}{'└── ' if last else '├── '}{name}/{IGNORED_MARKER if child.ignored else ''}\n")
+            stack.append([child, prefix + ("    " if last else "│   "), sorted(child.dirs), 0])
+            continue
+
+        # Subdirectories done: list the files, then leave the directory
+        stack.pop()
+        files = node.files
+        if files:
+            file_names = sorted(files)
+            branch = prefix + "├── "
+            lines.extend([
+                f"{branch}{name} [{files[name]}]\n" if files[name] else f"{branch}{name}\n"
+                for name in file_names[:-1]
+            ])
+            name = file_names[-1]
+            lines.append(f"{prefix}└── {name} [{files[name]}]\n" if files[name] else f"{prefix}└── {name}\n")
+        if len(lines) >= RENDER_CHUNK_LINES:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
@@ -0,0 +1,553 @@
+import os
+import re
+import mmap
+import zlib
+import struct
+import tempfile
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils import TreeScan
+from patterns import compile_matcher
+from shards import Shard
+import metrics
+
+OBJECT_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+OFS_DELTA = 6
+REF_DELTA = 7
+TREE_MODE = "40000"
+SUBMODULE_MODE = "160000"
+SYMLINK_MODE = "120000"
+# Symbolic links followed while resolving one path, as in Linux's limit
+MAX_SYMLINK_HOPS = 40
+
+# Resolved pack objects kept around as delta bases
+BASE_CACHE_SIZE = 256
+
+# Device number given to the stat stand-ins of blobs that are never read
+UNREAD_BLOB_DEV = 0
+
+HEX_SHA = re.compile(r"^[0-9a-f]{4,40}$")
+
+
+class GitError(Exception):
+    """Raised when a repository, revision or object cannot be read."""
+
+
+class PackFile:
+    """
+    A packfile and its version 2 index, memory-mapped for random access.
+
+    Lookups bisect the index's sorted SHA table in place, narrowed by its
+    fanout table, so opening a pack costs the same however many objects it
+    holds.
+    """
+
+    def __init__(self, idx_path: str):
+        self.idx_path = idx_path
+        self.pack_path = idx_path[:-4] + ".pack"
+        with open(idx_path, 'rb') as f:
+            self.idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.idx[:4] != b"\xfftOc" or struct.unpack_from(">I", self.idx, 4)[0] != 2:
+            raise GitError(f"Unsupported pack index version: {idx_path}")
+
+        self.count = struct.unpack_from(">I", self.idx, 8 + 255 * 4)[0]
+        self._sha_start = 8 + 256 * 4
+        self._offset_start = self._sha_start + self.count * 24
+        self._large_offset_start = self._offset_start + self.count * 4
+
+        with open(self.pack_path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _sha(self, index: int) -> bytes:
+        start = self._sha_start + index * 20
+        return self.idx[start:start + 20]
+
+    def _bisect(self, sha: bytes) -> int:
+        """Return the index of the first SHA in the table that is not less than sha."""
+        # Fanout entry b counts the SHAs whose first byte is at most b
+        first = sha[0]
+        low = struct.unpack_from(">I", self.idx, 8 + (first - 1) * 4)[0] if first else 0
+        high = struct.unpack_from(">I", self.idx, 8 + first * 4)[0]
+        while low < high:
+            middle = (low + high) // 2
+            if self._sha(middle) < sha:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, sha: bytes) -> Optional[int]:
+        """Return the pack offset of a binary SHA, or None if it is not in this pack."""
+        index = self._bisect(sha)
+        if index == self.count or self._sha(index) != sha:
+            return None
+        offset = struct.unpack_from(">I", self.idx, self._offset_start + index * 4)[0]
+        if offset & 0x80000000:
+            offset = struct.unpack_from(">Q", self.idx, self._large_offset_start + (offset & 0x7fffffff) * 8)[0]
+        return offset
+
+    def shas_with_prefix(self, prefix: str) -> List[str]:
+        """Return the hex SHAs in this pack that start with a hex prefix."""
+        matches = []
+        for index in range(self._bisect(bytes.fromhex(prefix.ljust(40, "0"))), self.count):
+            hex_sha = self._sha(index).hex()
+            if not hex_sha.startswith(prefix):
+                break
+            matches.append(hex_sha)
+        return matches
+
+
+class GitRepository:
+    """
+    Read-only access to a local repository's object database.
+
+    Objects are read straight from loose object files and packfiles (including
+    OFS_DELTA and REF_DELTA chains) without running git or touching the
+    working tree.
+    """
+
+    def __init__(self, path: str):
+        self.git_dir = self._find_git_dir(path)
+        self.objects_dir = os.path.join(self.git_dir, "objects")
+        self.object_dirs = [self.objects_dir] + self._alternates()
+        self.packs = [
+            PackFile(os.path.join(objects_dir, "pack", name))
+            for objects_dir in self.object_dirs
+            if os.path.isdir(os.path.join(objects_dir, "pack"))
+            for name in sorted(os.listdir(os.path.join(objects_dir, "pack")))
+            if name.endswith(".idx")
+        ]
+        self._base_cache: "OrderedDict[Tuple[int, int], Tuple[int, bytes]]" = OrderedDict()
+
+    @staticmethod
+    def _find_git_dir(path: str) -> str:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            # Linked worktrees and submodules point at their git dir
+            with open(dot_git, 'r', encoding='utf-8') as f:
+                target = f.read().strip()
+            if target.startswith("gitdir:"):
+                git_dir = os.path.join(path, target[len("gitdir:"):].strip())
+                common = os.path.join(git_dir, "commondir")
+                if os.path.isfile(common):
+                    with open(common, 'r', encoding='utf-8') as f:
+                        return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+                return git_dir
+        if os.path.isdir(os.path.join(path, "objects")) and os.path.isfile(os.path.join(path, "HEAD")):
+            return path
+        raise GitError(f"Not a git repository: {path}")
+
+    def _alternates(self) -> List[str]:
+        alternates = os.path.join(self.objects_dir, "info", "alternates")
+        if not os.path.isfile(alternates):
+            return []
+        with open(alternates, 'r', encoding='utf-8') as f:
+            return [
+                os.path.join(self.objects_dir, line.strip())
+                for line in f if line.strip() and not line.startswith("#")
+            ]
+
+    # Object access
+
+    def read_object(self, sha: str) -> Tuple[str, bytes]:
+        """Return (type, data) for a hex SHA from loose objects or packs."""
+        for objects_dir in self.object_dirs:
+            loose = os.path.join(objects_dir, sha[:2], sha[2:])
+            if os.path.isfile(loose):
+                with open(loose, 'rb') as f:
+                    raw = zlib.decompress(f.read())
+                header, _, data = raw.partition(b"\0")
+                object_type, _ = header.split(b" ")
+                return object_type.decode(), data
+
+        binary_sha = bytes.fromhex(sha)
+        for pack in self.packs:
+            offset = pack.find(binary_sha)
+            if offset is not None:
+                type_id, data = self._read_packed(pack, offset)
+                return OBJECT_TYPES[type_id], data
+        raise GitError(f"Object not found: {sha}")
+
+    def _read_packed(self, pack: PackFile, offset: int) -> Tuple[int, bytes]:
+        key = (id(pack), offset)
+        cached = self._base_cache.get(key)
+        if cached is not None:
+            self._base_cache.move_to_end(key)
+            return cached
+
+        data = pack.data
+        byte = data[offset]
+        type_id = (byte >> 4) & 7
+        position = offset + 1
+        while byte & 0x80:
+            byte = data[position]
+            position += 1
+
+        if type_id == OFS_DELTA:
+            byte = data[position]
+            position += 1
+            distance = byte & 0x7f
+            while byte & 0x80:
+                byte = data[position]
+                position += 1
+                distance = ((distance + 1) << 7) | (byte & 0x7f)
+            base_type, base = self._read_packed(pack, offset - distance)
+            result = (base_type, _apply_delta(base, _inflate(data, position)))
+        elif type_id == REF_DELTA:
+            base_sha = data[position:position + 20].hex()
+            base_name, base = self.read_object(base_sha)
+            base_type = next(key for key, name in OBJECT_TYPES.items() if name == base_name)
+            result = (base_type, _apply_delta(base, _inflate(data, position + 20)))
+        else:
+            result = (type_id, _inflate(data, position))
+
+        self._base_cache[key] = result
+        if len(self._base_cache) > BASE_CACHE_SIZE:
+            self._base_cache.popitem(last=False)
+        return result
+
+    # Revisions
+
+    def resolve(self, rev: str) -> str:
+        """
+        Resolve a revision to a commit SHA.
+
+        Supports full and abbreviated SHAs, HEAD, branch, tag and remote names
+        (loose or packed refs), and the ~N and ^ suffixes for first parents.
+        """
+        match = re.match(r"^(.*?)((?:~\d*|\^)*)$", rev)
+        name, suffix = match.group(1), match.group(2)
+        sha = self._peel(self._resolve_name(name))
+        for step in re.findall(r"~\d*|\^", suffix):
+            count = 1 if step in ("^", "~") else int(step[1:])
+            for _ in range(count):
+                sha = self._first_parent(sha)
+        return sha
+
+    def _resolve_name(self, name: str) -> str:
+        for ref in (name, f"refs/{name}", f"refs/tags/{name}", f"refs/heads/{name}",
+                    f"refs/remotes/{name}", f"refs/remotes/{name}/HEAD"):
+            sha = self._read_ref(ref)
+            if sha:
+                return sha
+        if HEX_SHA.match(name):
+            if len(name) == 40:
+                return name
+            candidates = self._shas_with_prefix(name)
+            if len(candidates) == 1:
+                return candidates.pop()
+            if candidates:
+                raise GitError(f"Ambiguous revision: {name}")
+        raise GitError(f"Unknown revision: {name}")
+
+    def _read_ref(self, ref: str, depth: int = 0) -> Optional[str]:
+        if depth > 10:
+            raise GitError(f"Symbolic ref loop at {ref}")
+        path = os.path.join(self.git_dir, ref)
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                value = f.read().strip()
+            if value.startswith("ref:"):
+                return self._read_ref(value[4:].strip(), depth + 1)
+            return value
+        packed = os.path.join(self.git_dir, "packed-refs")
+        if os.path.isfile(packed):
+            with open(packed, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref and not line.startswith(("#", "^")):
+                        return parts[0]
+        return None
+
+    def _shas_with_prefix(self, prefix: str) -> Set[str]:
+        matches = set()
+        for objects_dir in self.object_dirs:
+            fan_dir = os.path.join(objects_dir, prefix[:2])
+            if len(prefix) >= 2 and os.path.isdir(fan_dir):
+                matches.update(
+                    prefix[:2] + name for name in os.listdir(fan_dir)
+                    if (prefix[:2] + name).startswith(prefix)
+                )
+        for pack in self.packs:
+            matches.update(pack.shas_with_prefix(prefix))
+        return matches
+
+    def _peel(self, sha: str) -> str:
+        """Follow annotated tags down to the commit they point at."""
+        object_type, data = self.read_object(sha)
+        while object_type == "tag":
+            sha = data.split(b"\n", 1)[0].split(b" ")[1].decode()
+            object_type, data = self.read_object(sha)
+        return sha
+
+    def _first_parent(self, sha: str) -> str:
+        _, data = self.read_object(sha)
+        for line in data.split(b"\n"):
+            if line.startswith(b"parent "):
+                return line.split(b" ")[1].decode()
+            if not line:
+                break
+        raise GitError(f"Commit {sha} has no parent")
+
+    def tree_of(self, rev: str) -> str:
+        """Return the root tree SHA of a revision."""
+        object_type, data = self.read_object(self.resolve(rev))
+        if object_type != "commit":
+            raise GitError(f"{rev} is a {object_type}, not a commit")
+        return data.split(b"\n", 1)[0].split(b" ")[1].decode()
+
+    def read_tree(self, sha: str) -> Dict[str, Tuple[str, str]]:
+        """Return a tree's entries as {name: (mode, hex sha)}."""
+        object_type, data = self.read_object(sha)
+        if object_type != "tree":
+            raise GitError(f"Object {sha} is a {object_type}, not a tree")
+        entries = {}
+        position = 0
+        while position < len(data):
+            space = data.index(b" ", position)
+            nul = data.index(b"\0", space)
+            mode = data[position:space].decode()
+            name = data[space + 1:nul].decode('utf-8', errors='surrogateescape')
+            entries[name] = (mode, data[nul + 1:nul + 21].hex())
+            position = nul + 21
+        return entries
+
+    def resolve_path(self, tree: str, rel_path: str) -> Optional[Tuple[str, str]]:
+        """
+        Return the (mode, hex sha) of the entry at rel_path in a tree, following symbolic links.
+
+        Links are followed as in a checkout of the tree. Returns None when the
+        path does not exist, a link is absolute, leads out of the tree, or
+        nests more than MAX_SYMLINK_HOPS deep.
+        """
+        # Trees of the directories from the root down to the current one
+        trees = [tree]
+        parts = rel_path.split("/")
+        entry = (TREE_MODE, tree)
+        hops = 0
+        while parts:
+            part = parts.pop(0)
+            if part in ("", "."):
+                entry = (TREE_MODE, trees[-1])
+                continue
+            if part == "..":
+                if len(trees) == 1:
+                    return None
+                trees.pop()
+                entry = (TREE_MODE, trees[-1])
+                continue
+            entry = self.read_tree(trees[-1]).get(part)
+            if entry is None:
+                return None
+            if entry[0] == SYMLINK_MODE:
+                hops += 1
+                target = self.read_object(entry[1])[1].decode('utf-8', errors='surrogateescape')
+                if hops > MAX_SYMLINK_HOPS or target.startswith("/"):
+                    return None
+                # The target is relative to the link's directory
+                parts = target.split("/") + parts
+                entry = (TREE_MODE, trees[-1])
+                continue
+            if entry[0] == TREE_MODE:
+                trees.append(entry[1])
+            elif parts:
+                return None
+        return entry
+
+
+def _inflate(data: mmap.mmap, position: int, chunk_size: int = 64 * 1024) -> bytes:
+    """Decompress one zlib stream starting at position in a pack."""
+    inflater = zlib.decompressobj()
+    output = []
+    while not inflater.eof:
+        chunk = data[position:position + chunk_size]
+        if not chunk:
+            raise GitError("Truncated pack entry")
+        output.append(inflater.decompress(chunk))
+        position += chunk_size
+    return b"".join(output)
+
+
+def _read_varint(delta: bytes, position: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = delta[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def _apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Rebuild an object from its delta base and a git delta instruction stream."""
+    _, position = _read_varint(delta, 0)
+    target_size, position = _read_varint(delta, position)
+    output = bytearray()
+    while position < len(delta):
+        op = delta[position]
+        position += 1
+        if op & 0x80:
+            copy_offset = copy_size = 0
+            for bit in range(4):
+                if op & (1 << bit):
+                    copy_offset |= delta[position] << (8 * bit)
+                    position += 1
+            for bit in range(3):
+                if op & (1 << (4 + bit)):
+                    copy_size |= delta[position] << (8 * bit)
+                    position += 1
+            output += base[copy_offset:copy_offset + (copy_size or 0x10000)]
+        elif op:
+            output += delta[position:position + op]
+            position += op
+        else:
+            raise GitError("Invalid delta opcode")
+    if len(output) != target_size:
+        raise GitError("Delta produced an object of the wrong size")
+    return bytes(output)
+
+
+def _unread_blob_stat(sha: str) -> os.stat_result:
+    """
+    Stat stand-in shared by both sides of an unchanged blob.
+
+    Both sides get the same size and a fake inode derived from the SHA, so
+    files_differ reports them unchanged without the blob ever being read.
+    """
+    return os.stat_result((0o100644, int(sha[:15], 16) or 1, UNREAD_BLOB_DEV, 1, 0, 0, 0, 0, 0, 0))
+
+
+def scan_git_trees(
+    repo_path: str,
+    original_rev: str,
+    modified_rev: str,
+    max_depth: int = None,
+    ignore_patterns: Set[str] = None,
+    shallow_ignore: Set[str] = None,
+    include_only: Set[str] = None,
+    list_unchanged: bool = True,
+    use_gitignore: bool = False,
+    shard: Shard = None,
+) -> Tuple[TreeScan, TreeScan]:
+    """
+    Scan two revisions of a repository as if they were checked out, without checking them out.
+
+    Both trees are walked together. Subtrees and blobs with the same SHA on both
+    sides are never read; only blobs that differ (or exist on one side only)
+    are written into a temporary directory, which becomes the scans' root and
+    is removed once both scans are garbage collected. Filtering follows
+    utils.scan_tree, and symbolic links are treated as that walk treats them
+    in a checkout: a link to a file is read as the file, and links to
+    directories, dangling links and links out of the tree are skipped. (An
+    identical subtree skipped without list_unchanged is not searched for
+    links to files that changed elsewhere.)
+
+    Args:
+        repo_path (str): Path to the repository (work tree, .git dir or bare repository).
+        original_rev (str): Revision for the original side.
+        modified_rev (str): Revision for the modified side.
+        max_depth (int): Maximum number of path components to keep.
+        ignore_patterns (Set[str]): Names, globs or gitignore-style patterns to ignore completely.
+        shallow_ignore (Set[str]): Top-level directories whose contents are skipped.
+        include_only (Set[str]): Paths or globs a file must match or be under.
+        list_unchanged (bool): List files in identical subtrees (needed for the
+            tree view); when False, identical subtrees are skipped entirely.
+        use_gitignore (bool): Also honour the .gitignore files committed in the
+            trees (the modified side's copy when both sides have one).
+        shard (Shard): Only read the top-level entries this shard owns.
+
+    Returns:
+        Tuple[TreeScan, TreeScan]: Scans for the original and modified revisions.
+    """
+    repo = GitRepository(repo_path)
+
+    storage = tempfile.TemporaryDirectory(prefix="repo-diff-git-")
+    roots = (os.path.join(storage.name, "original"), os.path.join(storage.name, "modified"))
+    files: Tuple[Dict[str, os.stat_result], Dict[str, os.stat_result]] = ({}, {})
+    dirs: Tuple[List[str], List[str]] = ([], [])
+    shallow_dirs: Tuple[List[str], List[str]] = ([], [])
+
+    def materialize(side: int, rel_path: str, sha: str) -> None:
+        path = os.path.join(roots[side], rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _, data = repo.read_object(sha)
+        with open(path, 'wb') as f:
+            f.write(data)
+        files[side][rel_path] = os.stat(path)
+        metrics.current().count("blobs_read")
+
+    def follow(side: int, rel_path: str, entry: Optional[Tuple[str, str]]) -> Optional[Tuple[str, str]]:
+        # Like the directory walker, read links to files as the file and skip links to directories and dangling links
+        if entry is None or entry[0] != SYMLINK_MODE:
+            return entry
+        target = repo.resolve_path(root_trees[side], rel_path)
+        return target if target is not None and target[0] not in (TREE_MODE, SUBMODULE_MODE) else None
+
+    # Stack of (relative directory, number of components, original tree SHA, modified tree SHA, matcher)
+    matcher = compile_matcher(ignore_patterns, shallow_ignore, include_only, use_gitignore, shard)
+    root_trees = (repo.tree_of(original_rev), repo.tree_of(modified_rev))
+    stack = [("", 0, root_trees[0], root_trees[1], matcher)]
+    while stack:
+        rel_dir, depth, original_tree, modified_tree, matcher = stack.pop()
+        if original_tree == modified_tree and not list_unchanged:
+            continue
+        original_entries = repo.read_tree(original_tree) if original_tree else {}
+        if modified_tree == original_tree:
+            # Identical trees are read once and shared by both sides
+            trees = (original_entries, original_entries)
+        else:
+            trees = (original_entries, repo.read_tree(modified_tree) if modified_tree else {})
+
+        gitignore = trees[1].get(".gitignore") or trees[0].get(".gitignore")
+        if matcher.use_gitignore and gitignore and gitignore[0] != TREE_MODE:
+            text = repo.read_object(gitignore[1])[1].decode('utf-8', errors='replace')
+            matcher = matcher.with_gitignore(rel_dir, text)
+
+        for name in sorted(trees[0].keys() | trees[1].keys()):
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            entries = (follow(0, rel_path, trees[0].get(name)), follow(1, rel_path, trees[1].get(name)))
+            is_dir = tuple(entry is not None and entry[0] == TREE_MODE for entry in entries)
+
+            if depth == 0 and matcher.shallow(name):
+                for side in (0, 1):
+                    if is_dir[side] and not matcher.ignored(rel_path, name, True):
+                        shallow_dirs[side].append(rel_path)
+                continue
+            if max_depth is not None and depth + 1 > max_depth:
+                continue
+
+            if any(is_dir) and not matcher.ignored(rel_path, name, True) and matcher.may_include(rel_path):
+                subtrees = tuple(entry[1] if is_dir[side] else None for side, entry in enumerate(entries))
+                for side in (0, 1):
+                    if is_dir[side]:
+                        dirs[side].append(rel_path)
+                if max_depth is None or depth + 2 <= max_depth:
+                    stack.append((rel_path, depth + 1, subtrees[0], subtrees[1], matcher))
+
+            blobs = tuple(
+                entry[1] if entry is not None and not is_dir[side] and entry[0] != SUBMODULE_MODE else None
+                for side, entry in enumerate(entries)
+            )
+            if not any(blobs) or matcher.ignored(rel_path, name, False) or not matcher.included(rel_path):
+                continue
+            if blobs[0] and blobs[0] == blobs[1]:
+                if list_unchanged:
+                    stat = _unread_blob_stat(blobs[0])
+                    files[0][rel_path] = stat
+                    files[1][rel_path] = stat
+                continue
+            for side in (0, 1):
+                if blobs[side]:
+                    materialize(side, rel_path, blobs[side])
+
+    stats = metrics.current()
+    stats.count("files_scanned", len(files[0]) + len(files[1]))
+    stats.count("dirs_scanned", len(dirs[0]) + len(dirs[1]))
+    return tuple(
+        TreeScan(files[side], sorted(dirs[side]), sorted(shallow_dirs[side]), roots[side], storage)
+        for side in (0, 1)
+    )
@@ -0,0 +1,132 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import nullcontext
+from typing import List, Optional, Tuple
+
+import metrics
+
+HASH_CHUNK_SIZE = 1024 * 1024
+DIGEST_SIZE = 16
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+# Files modified this recently may still change within the same mtime tick,
+# so their digests are used for the current run but never persisted.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def hash_file(path: str) -> bytes:
+    """Return a BLAKE2b digest of a file, read in fixed-size chunks."""
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.digest()
+
+
+class HashCache:
+    """
+    On-disk cache of file digests keyed on (path, size, mtime_ns, inode).
+
+    A digest is reused only while the file's stat tuple is unchanged, so a warm
+    run hashes just the files that were touched since the last run. The cache
+    is an SQLite database in cache_dir and is trimmed to max_entries on close,
+    evicting the least recently used entries first. digest() may be called
+    from several threads; files are hashed outside the database lock.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_entries = max_entries
+        self.run_started_ns = time.time_ns()
+        self.hits = 0
+        self.misses = 0
+        self._used: List[Tuple[int, str]] = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "digests.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS digests ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " digest BLOB NOT NULL,"
+            " last_used INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS digests_last_used ON digests (last_used)")
+
+    def digest(self, path: str, stat: os.stat_result = None) -> bytes:
+        """
+        Return the digest of a file, hashing it only if its stat tuple changed.
+
+        Args:
+            path (str): Path to the file.
+            stat (os.stat_result): Stat of the file if already known.
+
+        Returns:
+            bytes: The file's BLAKE2b digest.
+        """
+        key = os.path.abspath(path)
+        stat = stat or os.stat(path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, inode, digest FROM digests WHERE path = ?", (key,)
+            ).fetchone()
+            if row and row[:3] == (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+                self.hits += 1
+                self._used.append((self.run_started_ns, key))
+            else:
+                self.misses += 1
+                row = None
+        if row:
+            metrics.current().count("cache_hits")
+            return row[3]
+
+        metrics.current().count("cache_misses")
+        metrics.current().count("bytes_read", stat.st_size)
+        digest = hash_file(path)
+        if stat.st_mtime_ns < self.run_started_ns - RACY_WINDOW_NS:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, stat.st_size, stat.st_mtime_ns, stat.st_ino, digest, self.run_started_ns),
+                )
+        return digest
+
+    def evict(self) -> None:
+        """Trim the cache to max_entries, dropping the least recently used entries."""
+        (count,) = self._db.execute("SELECT COUNT(*) FROM digests").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM digests WHERE path IN"
+                " (SELECT path FROM digests ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def close(self) -> None:
+        """Record which entries were used this run, evict, and persist the cache."""
+        if self._used:
+            self._db.executemany("UPDATE digests SET last_used = ? WHERE path = ?", self._used)
+            self._used = []
+        self.evict()
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def open_hash_cache(cache_dir: Optional[str], max_entries: int = DEFAULT_MAX_ENTRIES):
+    """Return a HashCache for cache_dir, or a context yielding None if no cache is configured."""
+    if not cache_dir:
+        return nullcontext(None)
+    return HashCache(cache_dir, max_entries)
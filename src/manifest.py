@@ -0,0 +1,281 @@
+import os
+import time
+import zlib
+import struct
+import hashlib
+import tempfile
+from typing import BinaryIO, Dict, List, NamedTuple, Set, Tuple
+
+from utils import TreeScan, path_kept, scan_tree
+from hash_cache import DIGEST_SIZE, HASH_CHUNK_SIZE, RACY_WINDOW_NS, hash_file
+from patterns import compile_matcher
+from shards import Shard
+import metrics
+
+MAGIC = b"RDMANIF1"
+# Magic, then offset and length of the compressed index, which follows the blobs
+HEADER = struct.Struct(">8sQQ")
+
+
+class ManifestEntry(NamedTuple):
+    """One file recorded in a manifest."""
+    size: int
+    mtime_ns: int
+    inode: int
+    digest: bytes
+    # Location of the file's zlib-compressed contents in the manifest
+    offset: int
+    length: int
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def _write_paths(out: bytearray, paths: List[str]) -> None:
+    """Write sorted paths, each as the length shared with the previous one plus the rest."""
+    _write_varint(out, len(paths))
+    previous = b""
+    for path in paths:
+        encoded = path.encode('utf-8', errors='surrogateescape')
+        shared = 0
+        limit = min(len(previous), len(encoded))
+        while shared < limit and previous[shared] == encoded[shared]:
+            shared += 1
+        _write_varint(out, shared)
+        _write_varint(out, len(encoded) - shared)
+        out += encoded[shared:]
+        previous = encoded
+
+
+def _read_paths(data: bytes, position: int) -> Tuple[List[str], int]:
+    count, position = _read_varint(data, position)
+    paths = []
+    previous = b""
+    for _ in range(count):
+        shared, position = _read_varint(data, position)
+        length, position = _read_varint(data, position)
+        encoded = previous[:shared] + data[position:position + length]
+        position += length
+        paths.append(encoded.decode('utf-8', errors='surrogateescape'))
+        previous = encoded
+    return paths, position
+
+
+def _store_blob(out: BinaryIO, path: str) -> Tuple[bytes, int, int]:
+    """Hash and compress a file in one pass, appending it to out. Returns (digest, offset, length)."""
+    offset = out.tell()
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    compressor = zlib.compressobj()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(compressor.compress(chunk))
+    out.write(compressor.flush())
+    return digest.digest(), offset, out.tell() - offset
+
+
+def write_manifest(
+    root_dir: str,
+    manifest_path: str,
+    max_depth: int = None,
+    ignore_patterns: Set[str] = None,
+    shallow_ignore: Set[str] = None,
+    include_only: Set[str] = None,
+    use_gitignore: bool = False,
+) -> int:
+    """
+    Snapshot a directory tree into a single compact manifest file.
+
+    The tree is walked with utils.scan_tree and every file is read once,
+    hashed and stored zlib-compressed (identical contents are stored once).
+    The index of paths, stat data and digests is written last, compressed,
+    and located through a fixed-size header.
+
+    Args:
+        root_dir (str): Directory to snapshot.
+        manifest_path (str): Manifest file to write.
+        max_depth, ignore_patterns, shallow_ignore, include_only, use_gitignore:
+            Filters, as for utils.scan_tree.
+
+    Returns:
+        int: Number of files recorded.
+    """
+    scan = scan_tree(root_dir, max_depth, ignore_patterns, shallow_ignore, include_only, use_gitignore)
+    created_ns = time.time_ns()
+    entries: Dict[str, ManifestEntry] = {}
+    stored: Dict[bytes, Tuple[int, int]] = {}
+
+    with open(manifest_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, 0, 0))
+        for rel_path in sorted(scan.files):
+            stat = scan.files[rel_path]
+            try:
+                digest, offset, length = _store_blob(out, os.path.join(root_dir, rel_path))
+            except OSError:
+                continue
+            if digest in stored:
+                # Same contents already stored: drop the copy just written
+                out.seek(offset)
+                out.truncate()
+                offset, length = stored[digest]
+            else:
+                stored[digest] = (offset, length)
+            entries[rel_path] = ManifestEntry(stat.st_size, stat.st_mtime_ns, stat.st_ino, digest, offset, length)
+
+        index = bytearray()
+        root = os.path.abspath(root_dir).encode('utf-8', errors='surrogateescape')
+        _write_varint(index, len(root))
+        index += root
+        _write_varint(index, created_ns)
+        _write_paths(index, scan.dirs)
+        _write_paths(index, scan.shallow_dirs)
+        paths = sorted(entries)
+        _write_paths(index, paths)
+        for rel_path in paths:
+            entry = entries[rel_path]
+            for value in (entry.size, entry.mtime_ns, entry.inode, entry.offset, entry.length):
+                _write_varint(index, value)
+            index += entry.digest
+
+        index_offset = out.tell()
+        compressed = zlib.compress(bytes(index))
+        out.write(compressed)
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, index_offset, len(compressed)))
+    return len(entries)
+
+
+class Manifest:
+    """A manifest written by write_manifest; file contents are read on demand."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, index_offset, index_length = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"Not a repo-diff manifest: {path}")
+            f.seek(index_offset)
+            index = zlib.decompress(f.read(index_length))
+
+        root_length, position = _read_varint(index, 0)
+        self.root = index[position:position + root_length].decode('utf-8', errors='surrogateescape')
+        self.created_ns, position = _read_varint(index, position + root_length)
+        self.dirs, position = _read_paths(index, position)
+        self.shallow_dirs, position = _read_paths(index, position)
+        paths, position = _read_paths(index, position)
+        self.files: Dict[str, ManifestEntry] = {}
+        for rel_path in paths:
+            values = []
+            for _ in range(5):
+                value, position = _read_varint(index, position)
+                values.append(value)
+            size, mtime_ns, inode, offset, length = values
+            digest = index[position:position + DIGEST_SIZE]
+            position += DIGEST_SIZE
+            self.files[rel_path] = ManifestEntry(size, mtime_ns, inode, digest, offset, length)
+
+    def read_blob(self, entry: ManifestEntry) -> bytes:
+        """Return the contents of a recorded file."""
+        with open(self.path, 'rb') as f:
+            f.seek(entry.offset)
+            data = zlib.decompress(f.read(entry.length))
+        metrics.current().count("bytes_read", entry.length)
+        return data
+
+
+def _unchanged(entry: ManifestEntry, path: str, stat: os.stat_result, created_ns: int) -> bool:
+    """Decide whether a file still matches its manifest entry, hashing it only when stat data cannot tell."""
+    if stat.st_size != entry.size:
+        return False
+    # A file modified within the racy window of the snapshot may change again without its mtime moving
+    if (stat.st_mtime_ns, stat.st_ino) == (entry.mtime_ns, entry.inode) and entry.mtime_ns < created_ns - RACY_WINDOW_NS:
+        return True
+    metrics.current().count("bytes_read", stat.st_size)
+    return hash_file(path) == entry.digest
+
+
+def scan_manifest_trees(
+    manifest_path: str,
+    modified_dir: str,
+    max_depth: int = None,
+    ignore_patterns: Set[str] = None,
+    shallow_ignore: Set[str] = None,
+    include_only: Set[str] = None,
+    list_unchanged: bool = True,
+    use_gitignore: bool = False,
+    shard: Shard = None,
+) -> Tuple[TreeScan, TreeScan]:
+    """
+    Scan a directory against a manifest instead of against the original directory.
+
+    Only modified_dir is walked. A file is unchanged if its size matches and
+    either its size, mtime and inode match the manifest (outside the racy
+    window) or its digest does. Unchanged files share the modified file's
+    stat on both sides, so files_differ settles them without reading; the
+    recorded contents of changed and deleted files are written to a
+    temporary directory that becomes the original scan's root.
+
+    Args:
+        manifest_path (str): Manifest written by write_manifest.
+        modified_dir (str): Directory to compare against it.
+        max_depth, ignore_patterns, shallow_ignore, include_only, use_gitignore, shard:
+            Filters, as for utils.scan_tree. .gitignore rules only apply to
+            the manifest as they were when it was written.
+        list_unchanged (bool): Keep unchanged files in the scans (needed for
+            the tree view).
+
+    Returns:
+        Tuple[TreeScan, TreeScan]: Scans for the manifest and for modified_dir.
+    """
+    manifest = Manifest(manifest_path)
+    modified_scan = scan_tree(modified_dir, max_depth, ignore_patterns, shallow_ignore, include_only, use_gitignore, shard)
+    matcher = compile_matcher(ignore_patterns, shallow_ignore, include_only, shard=shard)
+
+    storage = tempfile.TemporaryDirectory(prefix="repo-diff-manifest-")
+    original_root = os.path.join(storage.name, "original")
+    original_files: Dict[str, os.stat_result] = {}
+    modified_files = dict(modified_scan.files)
+
+    for rel_path, entry in manifest.files.items():
+        if not path_kept(rel_path, matcher, max_depth, False):
+            continue
+        stat = modified_files.get(rel_path)
+        if stat is not None and _unchanged(entry, os.path.join(modified_dir, rel_path), stat, manifest.created_ns):
+            if list_unchanged:
+                original_files[rel_path] = stat
+            else:
+                del modified_files[rel_path]
+            continue
+
+        path = os.path.join(original_root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(manifest.read_blob(entry))
+        original_files[rel_path] = os.stat(path)
+
+    original_scan = TreeScan(
+        original_files,
+        [rel_dir for rel_dir in manifest.dirs if path_kept(rel_dir, matcher, max_depth, True)],
+        [rel_dir for rel_dir in manifest.shallow_dirs if not matcher.ignored(rel_dir, rel_dir, True)],
+        original_root,
+        storage,
+    )
+    return original_scan, modified_scan._replace(files=modified_files)
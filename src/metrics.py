@@ -0,0 +1,197 @@
+import io
+import json
+import time
+import heapq
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+PROFILERS = ("cprofile", "tracemalloc")
+DEFAULT_SLOWEST = 20
+
+T = TypeVar("T")
+
+
+class RunStats:
+    """
+    Timers and counters for one report run.
+
+    Phase times are exclusive: entering a phase pauses the enclosing one, so
+    the phases of a run add up to its wall time. Counters may be bumped from
+    any thread. With --jobs > 1, work done inside worker processes is not
+    counted and per-file times are the main process's wait for each result.
+
+    Args:
+        slowest (int): Number of slowest files to keep.
+    """
+
+    def __init__(self, slowest: int = DEFAULT_SLOWEST):
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.slowest = slowest
+        self._slowest_files: List[Tuple[float, str]] = []
+        self._stack: List[str] = []
+        self._lock = threading.Lock()
+        self._started = self._since = time.perf_counter()
+
+    def _switch(self) -> None:
+        now = time.perf_counter()
+        if self._stack:
+            phase = self._stack[-1]
+            self.phases[phase] = self.phases.get(phase, 0.0) + now - self._since
+        self._since = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Charge the time spent in the block to phase name."""
+        self._switch()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._switch()
+            self._stack.pop()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Add amount to counter name."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def _record_file(self, seconds: float, file_path: str) -> None:
+        entry = (seconds, file_path)
+        if len(self._slowest_files) < self.slowest:
+            heapq.heappush(self._slowest_files, entry)
+        else:
+            heapq.heappushpop(self._slowest_files, entry)
+
+    @contextmanager
+    def time_file(self, file_path: str) -> Iterator[None]:
+        """Time the block as the processing of file_path, keeping the slowest files."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record_file(time.perf_counter() - start, file_path)
+
+    def time_each(self, items: Iterable[T], file_path: Callable[[T], str]) -> Iterator[T]:
+        """
+        Yield from items, timing each as the processing of file_path(item).
+
+        An item's time runs from the request for it until the request for the
+        next one, so it covers both producing the item (e.g. a lazy diff) and
+        what the caller does with it.
+        """
+        start = time.perf_counter()
+        for item in items:
+            yield item
+            self._record_file(time.perf_counter() - start, file_path(item))
+            start = time.perf_counter()
+
+    def to_dict(self) -> dict:
+        """Return the stats as JSON-serializable data."""
+        wall = time.perf_counter() - self._started
+        return {
+            "wall_seconds": round(wall, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in sorted(self.phases.items())},
+            "counters": dict(sorted(self.counters.items())),
+            "slowest_files": [
+                {"path": file_path, "seconds": round(seconds, 6)}
+                for seconds, file_path in sorted(self._slowest_files, reverse=True)
+            ],
+        }
+
+
+class NullStats:
+    """Stand-in used when no stats are being collected; every call is a no-op."""
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        yield
+
+    def count(self, name: str, amount: int = 1) -> None:
+        pass
+
+    @contextmanager
+    def time_file(self, file_path: str) -> Iterator[None]:
+        yield
+
+    def time_each(self, items: Iterable[T], file_path: Callable[[T], str]) -> Iterable[T]:
+        return items
+
+
+NULL_STATS = NullStats()
+_current = NULL_STATS
+
+
+def current():
+    """Return the RunStats being collected, or a NullStats if none is."""
+    return _current
+
+
+@contextmanager
+def collect(stats: Optional[RunStats]) -> Iterator[None]:
+    """Make stats the current RunStats for the duration of the block (None collects nothing)."""
+    global _current
+    previous = _current
+    _current = stats if stats is not None else NULL_STATS
+    try:
+        yield
+    finally:
+        _current = previous
+
+
+def write_stats(path: str, stats: RunStats, extra: dict = None) -> None:
+    """Write stats, plus any extra top-level fields, to path as JSON."""
+    data = stats.to_dict()
+    data.update(extra or {})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+@contextmanager
+def profiled(profiler: Optional[str], report: io.TextIOBase, limit: int = 30) -> Iterator[dict]:
+    """
+    Run the block under cProfile or tracemalloc and write the top entries to report.
+
+    Yields a dict that is filled with summary figures (e.g. peak traced
+    memory) once the block ends, for inclusion in the stats output.
+
+    Args:
+        profiler (str): "cprofile", "tracemalloc" or None to not profile.
+        report (io.TextIOBase): Stream for the profile report.
+        limit (int): Number of functions or allocation sites to list.
+    """
+    summary: dict = {}
+    if profiler is None:
+        yield summary
+        return
+
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield summary
+        finally:
+            profile.disable()
+            pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(limit)
+        return
+
+    if profiler == "tracemalloc":
+        tracemalloc.start()
+        try:
+            yield summary
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            summary["tracemalloc_peak_bytes"] = peak
+            report.write(f"Peak traced memory: {peak} bytes\nTop allocation sites:\n")
+            for statistic in snapshot.statistics("lineno")[:limit]:
+                report.write(f"  {statistic}\n")
+        return
+
+    raise ValueError(f"Unknown profiler: {profiler}")
@@ -0,0 +1,167 @@
+import io
+import re
+import codecs
+import hashlib
+from typing import List, NamedTuple, Optional, Sequence
+
+from hash_cache import DIGEST_SIZE
+import metrics
+
+UTF8 = "utf-8"
+# Detect each file's encoding: a byte order mark, else UTF-8, else Windows-1252, else Latin-1
+AUTO = "auto"
+ENCODINGS = (UTF8, AUTO)
+# Tried in order for files without a byte order mark; Latin-1 decodes any bytes
+FALLBACK_ENCODINGS = (UTF8, "cp1252", "latin-1")
+# UTF-32 first: its little-endian mark starts with the UTF-16 one
+BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+BOM_PREFIX_SIZE = 4
+
+READ_SIZE = 256 * 1024
+# Whitespace within a line, after line endings are normalized
+WHITESPACE_RUN = re.compile(rb"[ \t\f\v]+")
+WHITESPACE_RUN_TEXT = re.compile(r"[ \t\f\v]+")
+
+
+class Normalization(NamedTuple):
+    """
+    How file contents are normalized before they are compared.
+
+    ignore_eol treats CRLF and CR line endings like LF; ignore_whitespace
+    additionally treats each run of spaces and tabs as one space and ignores
+    whitespace at the end of lines (like diff -b). With encoding AUTO each
+    file is decoded with its detected encoding, so the same text saved in
+    another encoding or with a UTF-8 byte order mark compares equal.
+    """
+    ignore_eol: bool = False
+    ignore_whitespace: bool = False
+    encoding: str = UTF8
+
+    @property
+    def active(self) -> bool:
+        """Whether files with different bytes can still compare equal."""
+        return self.ignore_eol or self.ignore_whitespace or self.encoding == AUTO
+
+
+def bom_encoding(prefix: bytes) -> Optional[str]:
+    """Return the encoding named by a byte order mark at the start of prefix, if any."""
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if prefix.startswith(bom):
+            return encoding
+    return None
+
+
+def candidate_encodings(prefix: bytes, encoding: str) -> Sequence[str]:
+    """Encodings to try in order for a file starting with prefix."""
+    if encoding != AUTO:
+        return (encoding,)
+    bom = bom_encoding(prefix)
+    return (bom,) if bom else FALLBACK_ENCODINGS
+
+
+def normalize_bytes(data: bytes, normalization: Normalization, final: bool = False) -> bytes:
+    """
+    Normalize UTF-8 text made of whole lines (or the final part of a file, with final).
+
+    Applies the same rules as line_key, so data normalizes to the
+    concatenated keys of its lines.
+    """
+    if normalization.ignore_eol or normalization.ignore_whitespace:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    if normalization.ignore_whitespace:
+        data = WHITESPACE_RUN.sub(b" ", data).replace(b" \n", b"\n")
+        if final and data.endswith(b" "):
+            data = data[:-1]
+    return data
+
+
+def line_key(line: str, normalization: Normalization) -> str:
+    """Return the form of a line (read with universal newlines) that is compared under normalization."""
+    if normalization.ignore_whitespace:
+        line = WHITESPACE_RUN_TEXT.sub(" ", line)
+        if line.endswith(" \n"):
+            line = line[:-2] + "\n"
+        elif line.endswith(" "):
+            line = line[:-1]
+    return line
+
+
+def _digest_as(path: str, normalization: Normalization, encoding: str) -> bytes:
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    # Only AUTO decodes: it must notice invalid UTF-8 to fall back to the next encoding
+    decoder = codecs.getincrementaldecoder(encoding)() if normalization.encoding == AUTO else None
+    transcode = decoder is not None and encoding != UTF8
+    carry = b""
+    bytes_read = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            bytes_read += len(chunk)
+            end_of_file = not chunk
+            if decoder is not None:
+                text = decoder.decode(chunk, final=end_of_file)
+                if transcode:
+                    chunk = text.encode('utf-8')
+            if end_of_file:
+                # The last line has no line ending
+                if carry:
+                    digest.update(normalize_bytes(carry, normalization, final=True))
+                break
+            data = carry + chunk
+            # Normalize whole lines; a line ending split across reads is completed by the next one
+            end = data.rfind(b"\n") + 1
+            digest.update(normalize_bytes(data[:end], normalization))
+            carry = data[end:]
+    metrics.current().count("bytes_read", bytes_read)
+    return digest.digest()
+
+
+def normalized_digest(path: str, normalization: Normalization) -> bytes:
+    """
+    Return a digest of a file's normalized contents in one streaming pass.
+
+    The file is read in fixed-size blocks and normalized a block of whole
+    lines at a time, so no normalized copy is ever held in memory. With
+    encoding AUTO a file that turns out not to be UTF-8 is read again with
+    the next candidate encoding.
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(BOM_PREFIX_SIZE)
+    encodings = candidate_encodings(prefix, normalization.encoding)
+    for encoding in encodings[:-1]:
+        try:
+            return _digest_as(path, normalization, encoding)
+        except UnicodeDecodeError:
+            continue
+    return _digest_as(path, normalization, encodings[-1])
+
+
+def read_lines(path: str, encoding: str = UTF8) -> List[str]:
+    """
+    Read a text file's lines with universal newlines.
+
+    With encoding AUTO the first candidate encoding that decodes the whole
+    file is used; otherwise a file that is not valid in encoding raises
+    UnicodeDecodeError.
+    """
+    if encoding != AUTO:
+        with open(path, 'r', encoding=encoding) as f:
+            return f.readlines()
+    with open(path, 'rb') as f:
+        data = f.read()
+    encodings = candidate_encodings(data[:BOM_PREFIX_SIZE], AUTO)
+    for candidate in encodings[:-1]:
+        try:
+            text = data.decode(candidate)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        text = data.decode(encodings[-1])
+    return io.StringIO(text, newline=None).readlines()
@@ -0,0 +1,277 @@
+import re
+import copy
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Optional, Pattern, Set, Tuple
+
+from shards import Shard
+
+GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def translate_glob(pattern: str) -> str:
+    """
+    Translate a gitignore-style glob into a regular expression over '/'-separated paths.
+
+    '*' and '?' never match '/', '**/' matches any number of leading
+    directories, '/**' everything below a directory and '[...]' a character class.
+    """
+    parts = []
+    index = 0
+    length = len(pattern)
+    while index < length:
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+            continue
+        if pattern.startswith("**", index):
+            parts.append(".*")
+            index += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", index + 2 if pattern[index + 1:index + 2] in ("!", "^") else index + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[index + 1:end]
+                if body[:1] in ("!", "^"):
+                    body = "^" + body[1:]
+                parts.append("[" + body.replace("\\", "\\\\") + "]")
+                index = end
+        elif char == "\\" and index + 1 < length:
+            index += 1
+            parts.append(re.escape(pattern[index]))
+        else:
+            parts.append(re.escape(char))
+        index += 1
+    return "".join(parts)
+
+
+def _alternation(expressions: List[str]) -> Optional[Pattern]:
+    """Compile expressions into one regex that matches any of them, or None if there are none."""
+    if not expressions:
+        return None
+    return re.compile("|".join(f"(?:{expression})" for expression in expressions), re.DOTALL)
+
+
+class _Alternatives:
+    """
+    Patterns of one kind merged for matching in a single step.
+
+    Literal names are a set lookup, '*<literal>' globs such as '*.pyc' a
+    lookup per distinct suffix length, other name globs one combined regex
+    over the entry name, and anchored patterns one combined regex over the path.
+    """
+
+    def __init__(self):
+        self.names: Set[str] = set()
+        self.suffixes: Set[str] = set()
+        self.name_globs: List[str] = []
+        self.path_globs: List[str] = []
+
+    def add(self, pattern: str) -> None:
+        if pattern.startswith("/") or "/" in pattern:
+            self.path_globs.append(translate_glob(pattern.lstrip("/")))
+        elif pattern.startswith("*") and not GLOB_CHARS.search(pattern[1:]) and "\\" not in pattern:
+            self.suffixes.add(pattern[1:])
+        elif GLOB_CHARS.search(pattern) or "\\" in pattern:
+            self.name_globs.append(translate_glob(pattern))
+        else:
+            self.names.add(pattern)
+
+    def compile(self) -> "_Alternatives":
+        self.suffix_lengths = sorted({len(suffix) for suffix in self.suffixes})
+        self.name_regex = _alternation(self.name_globs)
+        self.path_regex = _alternation(self.path_globs)
+        return self
+
+    def match(self, rel_path: str, name: str) -> bool:
+        return (
+            name in self.names
+            or any(name[len(name) - length:] in self.suffixes for length in self.suffix_lengths if length <= len(name))
+            or (self.name_regex is not None and self.name_regex.fullmatch(name) is not None)
+            or (self.path_regex is not None and self.path_regex.fullmatch(rel_path) is not None)
+        )
+
+
+class _RuleGroup:
+    """A run of consecutive rules that all ignore, or all re-include ('!'), paths."""
+
+    def __init__(self, negate: bool):
+        self.negate = negate
+        self.any = _Alternatives()
+        self.dir_only = _Alternatives()
+
+    def compile(self) -> "_RuleGroup":
+        self.any.compile()
+        self.dir_only.compile()
+        return self
+
+    def match(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        return self.any.match(rel_path, name) or (is_dir and self.dir_only.match(rel_path, name))
+
+
+class RuleSet:
+    """
+    Ignore rules with gitignore semantics, compiled once.
+
+    A pattern without a '/' matches an entry name at any depth, a pattern with
+    a '/' is anchored to the rule set's base directory, a trailing '/' only
+    matches directories and a leading '!' re-includes a path. As in git, the
+    last matching rule wins; consecutive rules of the same kind are merged so
+    a path is matched against each run at once rather than rule by rule.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.groups: List[_RuleGroup] = []
+        for pattern in patterns:
+            negate = pattern.startswith("!")
+            if negate:
+                pattern = pattern[1:]
+            elif pattern.startswith("\\!") or pattern.startswith("\\#"):
+                pattern = pattern[1:]
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            if not pattern:
+                continue
+            if not self.groups or self.groups[-1].negate != negate:
+                self.groups.append(_RuleGroup(negate))
+            group = self.groups[-1]
+            (group.dir_only if dir_only else group.any).add(pattern)
+        for group in self.groups:
+            group.compile()
+
+    @classmethod
+    def from_gitignore(cls, text: str) -> "RuleSet":
+        """Parse the contents of a .gitignore file."""
+        patterns = []
+        for line in text.splitlines():
+            if not line.strip() or line.startswith("#"):
+                continue
+            # Trailing spaces are ignored unless escaped
+            stripped = line.rstrip(" ")
+            if stripped.endswith("\\") and len(stripped) < len(line):
+                stripped += " "
+            patterns.append(stripped)
+        return cls(patterns)
+
+    def match(self, rel_path: str, name: str, is_dir: bool) -> Optional[bool]:
+        """Return True if ignored, False if re-included, or None if no rule matches."""
+        for group in reversed(self.groups):
+            if group.match(rel_path, name, is_dir):
+                return not group.negate
+        return None
+
+
+def _include_prefix(pattern: str) -> str:
+    """Regex matching the directories a file matching the include pattern can be under."""
+    expression = ""
+    for component in reversed(pattern.split("/")):
+        if component == "**":
+            expression = ".*"
+            continue
+        regex = translate_glob(component)
+        expression = f"{regex}(?:/{expression})?" if expression else regex
+    return expression
+
+
+class PathMatcher:
+    """
+    All path filters of one comparison, compiled once and shared by both tree walks.
+
+    Args:
+        ignore_patterns (Iterable[str]): Patterns to ignore completely (gitignore syntax).
+            Re-including patterns ('!...') are applied after the others.
+        shallow_ignore (Iterable[str]): Top-level directory names or globs whose contents are skipped.
+        include_only (Iterable[str]): Paths or globs relative to the root. A file is kept if it
+            matches one or is below a directory that does.
+        use_gitignore (bool): Also honour the .gitignore files found while walking.
+        shard (Shard): Only keep the top-level entries this shard owns (see shards.py).
+    """
+
+    def __init__(
+        self,
+        ignore_patterns: Iterable[str] = (),
+        shallow_ignore: Iterable[str] = (),
+        include_only: Iterable[str] = (),
+        use_gitignore: bool = False,
+        shard: Shard = None,
+    ):
+        self.ignore_rules = RuleSet(sorted(ignore_patterns or (), key=lambda pattern: pattern.startswith("!")))
+        self.shallow_rules = RuleSet(shallow_ignore or ())
+        include_only = [pattern.strip("/") for pattern in include_only or () if pattern.strip("/")]
+        self.include_regex = _alternation([f"(?:{translate_glob(pattern)})(?:/.*)?" for pattern in include_only])
+        self.include_dir_regex = _alternation(
+            [f"(?:{translate_glob(pattern)})(?:/.*)?" for pattern in include_only]
+            + [_include_prefix(pattern) for pattern in include_only]
+        )
+        self.use_gitignore = use_gitignore
+        self.shard = shard
+        # (base directory, rules) from .gitignore files, outermost first
+        self.gitignores: Tuple[Tuple[str, RuleSet], ...] = ()
+
+    def with_gitignore(self, rel_dir: str, text: str) -> "PathMatcher":
+        """Return a matcher that also applies a .gitignore file found in rel_dir."""
+        matcher = copy.copy(self)
+        matcher.gitignores = self.gitignores + ((rel_dir, RuleSet.from_gitignore(text)),)
+        return matcher
+
+    def ignored(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        """Return True if the entry at rel_path is ignored by --ignore or a .gitignore file."""
+        decision = self.ignore_rules.match(rel_path, name, is_dir)
+        if decision is not None:
+            return decision
+        # Deeper .gitignore files take precedence, as in git
+        for base, rules in reversed(self.gitignores):
+            decision = rules.match(rel_path[len(base) + 1:] if base else rel_path, name, is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+    def shallow(self, name: str) -> bool:
+        """Return True if a top-level directory is shallow-ignored."""
+        return bool(self.shallow_rules.match(name, name, True))
+
+    def included(self, rel_path: str) -> bool:
+        """Return True if a file passes the include filter and belongs to the shard."""
+        if self.shard is not None and not self.shard.owns(rel_path):
+            return False
+        return self.include_regex is None or self.include_regex.fullmatch(rel_path) is not None
+
+    def may_include(self, rel_dir: str) -> bool:
+        """Return True if any file below rel_dir can pass the include filter and belong to the shard."""
+        if self.shard is not None and not self.shard.owns(rel_dir):
+            return False
+        return self.include_dir_regex is None or self.include_dir_regex.fullmatch(rel_dir) is not None
+
+
+@lru_cache(maxsize=32)
+def _compile_matcher(
+    ignore_patterns: FrozenSet[str],
+    shallow_ignore: FrozenSet[str],
+    include_only: FrozenSet[str],
+    use_gitignore: bool,
+    shard: Optional[Shard],
+) -> PathMatcher:
+    return PathMatcher(ignore_patterns, shallow_ignore, include_only, use_gitignore, shard)
+
+
+def compile_matcher(
+    ignore_patterns: Iterable[str] = None,
+    shallow_ignore: Iterable[str] = None,
+    include_only: Iterable[str] = None,
+    use_gitignore: bool = False,
+    shard: Shard = None,
+) -> PathMatcher:
+    """Return the PathMatcher for these filters, compiling it only the first time it is needed."""
+    return _compile_matcher(
+        frozenset(ignore_patterns or ()),
+        frozenset(shallow_ignore or ()),
+        frozenset(include_only or ()),
+        use_gitignore,
+        shard,
+    )
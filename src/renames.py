@@ -0,0 +1,186 @@
+import os
+import heapq
+import hashlib
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from hash_cache import hash_file
+from utils import DEFAULT_MAX_FILE_SIZE, TEXT, sniff_file
+import metrics
+
+# Minimum similarity for a deleted and an added file to be reported as a rename, as in git
+DEFAULT_RENAME_THRESHOLD = 0.5
+# Line hashes kept per file (a bottom-k MinHash sketch)
+SKETCH_SIZE = 64
+# Sketch values found in more files than this on either side are boilerplate and not indexed
+MAX_BUCKET_SIZE = 16
+# Sketch estimates are within a few percent; pairs this far below the threshold are still verified
+ESTIMATE_SLACK = 0.1
+
+
+class Rename(NamedTuple):
+    """An added file matched to the deleted file it was renamed from."""
+    source: str
+    similarity: float
+
+
+def format_rename(source: str, target: str, similarity: float) -> str:
+    """Return the report label of a rename, e.g. 'RENAMED a.py -> b.py (97%)'."""
+    return f"RENAMED {source} -> {target} ({int(similarity * 100)}%)"
+
+
+def _lines(path: str) -> List[bytes]:
+    """Non-blank lines of a file with surrounding whitespace removed."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    metrics.current().count("bytes_read", len(data))
+    return [line for line in (line.strip() for line in data.split(b"\n")) if line]
+
+
+def _line_hash(line: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), 'big')
+
+
+def _sketch(path: str) -> Tuple[int, ...]:
+    """The SKETCH_SIZE smallest hashes of a file's distinct lines, sorted."""
+    return tuple(heapq.nsmallest(SKETCH_SIZE, {_line_hash(line) for line in _lines(path)}))
+
+
+def estimate_similarity(sketch1: Tuple[int, ...], sketch2: Tuple[int, ...]) -> float:
+    """Estimate the Jaccard similarity of two files' line sets from their sketches."""
+    if not sketch1 or not sketch2:
+        return 1.0 if sketch1 == sketch2 else 0.0
+    union = heapq.nsmallest(SKETCH_SIZE, set(sketch1) | set(sketch2))
+    shared = set(sketch1) & set(sketch2)
+    return sum(1 for value in union if value in shared) / len(union)
+
+
+def line_similarity(path1: str, path2: str) -> float:
+    """Share of the two files' non-blank lines (with repeats) that they have in common."""
+    lines1, lines2 = Counter(_lines(path1)), Counter(_lines(path2))
+    total = sum((lines1 | lines2).values())
+    return sum((lines1 & lines2).values()) / total if total else 1.0
+
+
+def _exact_renames(
+    deleted: Dict[str, os.stat_result],
+    added: Dict[str, os.stat_result],
+    original_dir: str,
+    modified_dir: str,
+    cache=None,
+) -> Dict[str, Rename]:
+    """
+    Pair files with identical contents; only files whose size occurs on both sides are hashed.
+
+    Empty files are never paired (as in git): any two are identical, so
+    pairing them would only be a guess.
+    """
+    def digest(root: str, file_path: str, stat: os.stat_result) -> bytes:
+        path = os.path.join(root, file_path)
+        if cache is not None:
+            return cache.digest(path, stat)
+        metrics.current().count("bytes_read", stat.st_size)
+        return hash_file(path)
+
+    sizes = {stat.st_size for stat in deleted.values()} & {stat.st_size for stat in added.values()}
+    sizes.discard(0)
+    sources: Dict[bytes, List[str]] = defaultdict(list)
+    for file_path in sorted(deleted):
+        if deleted[file_path].st_size in sizes:
+            sources[digest(original_dir, file_path, deleted[file_path])].append(file_path)
+
+    renames = {}
+    for file_path in sorted(added):
+        if added[file_path].st_size not in sizes:
+            continue
+        candidates = sources.get(digest(modified_dir, file_path, added[file_path]))
+        if not candidates:
+            continue
+        # Prefer a source with the same name, as for a moved file
+        name = os.path.basename(file_path)
+        source = next((candidate for candidate in candidates if os.path.basename(candidate) == name), candidates[0])
+        candidates.remove(source)
+        renames[file_path] = Rename(source, 1.0)
+    return renames
+
+
+def detect_renames(
+    original_files: Dict[str, os.stat_result],
+    modified_files: Dict[str, os.stat_result],
+    original_dir: str,
+    modified_dir: str,
+    threshold: float = DEFAULT_RENAME_THRESHOLD,
+    cache=None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+) -> Dict[str, Rename]:
+    """
+    Match files deleted from the original tree to files added in the modified tree.
+
+    Exact renames are found by grouping the files by size and then by digest.
+    For the remaining text files, each file is read once to build a bottom-k
+    MinHash sketch of its lines, and candidate pairs are found through an
+    index from sketch values to files rather than by comparing all pairs.
+    Candidates are matched greedily by estimated similarity, and each chosen
+    pair is confirmed with its exact line similarity.
+
+    Args:
+        original_files (Dict[str, os.stat_result]): Original tree from scan_tree.
+        modified_files (Dict[str, os.stat_result]): Modified tree from scan_tree.
+        original_dir (str): Directory the original files are read from.
+        modified_dir (str): Directory the modified files are read from.
+        threshold (float): Minimum similarity, between 0 and 1.
+        cache (HashCache): Optional persistent digest cache (see hash_cache.py).
+        max_file_size (int): Largest text file to consider for near renames.
+
+    Returns:
+        Dict[str, Rename]: Source and similarity for each renamed file, keyed by its new path.
+    """
+    deleted = {file_path: stat for file_path, stat in original_files.items() if file_path not in modified_files}
+    added = {file_path: stat for file_path, stat in modified_files.items() if file_path not in original_files}
+    if not deleted or not added:
+        return {}
+
+    renames = _exact_renames(deleted, added, original_dir, modified_dir, cache)
+    sources = {rename.source for rename in renames.values()}
+    if threshold >= 1.0:
+        return renames
+
+    def sketches(root: str, files: Dict[str, os.stat_result], matched: Set[str]) -> Dict[str, Tuple[int, ...]]:
+        return {
+            file_path: _sketch(os.path.join(root, file_path))
+            for file_path, stat in sorted(files.items())
+            if file_path not in matched and sniff_file(os.path.join(root, file_path), stat, max_file_size) == TEXT
+        }
+
+    deleted_sketches = sketches(original_dir, deleted, sources)
+    added_sketches = sketches(modified_dir, added, set(renames))
+    if not deleted_sketches or not added_sketches:
+        return renames
+
+    index: Dict[int, Tuple[List[str], List[str]]] = defaultdict(lambda: ([], []))
+    for side, side_sketches in enumerate((deleted_sketches, added_sketches)):
+        for file_path, sketch in side_sketches.items():
+            for value in sketch:
+                index[value][side].append(file_path)
+
+    pairs: Set[Tuple[str, str]] = set()
+    for deleted_paths, added_paths in index.values():
+        if deleted_paths and added_paths and len(deleted_paths) <= MAX_BUCKET_SIZE and len(added_paths) <= MAX_BUCKET_SIZE:
+            pairs.update((source, target) for source in deleted_paths for target in added_paths)
+    metrics.current().count("rename_candidates", len(pairs))
+
+    candidates = []
+    for source, target in pairs:
+        estimate = estimate_similarity(deleted_sketches[source], added_sketches[target])
+        if estimate >= threshold - ESTIMATE_SLACK:
+            candidates.append((-estimate, target, source))
+
+    for _, target, source in sorted(candidates):
+        if target in renames or source in sources:
+            continue
+        similarity = line_similarity(os.path.join(original_dir, source), os.path.join(modified_dir, target))
+        if similarity >= threshold:
+            # Not byte-identical (those were matched above), so never shown as 100%
+            renames[target] = Rename(source, min(similarity, 0.99))
+            sources.add(source)
+    return renames
@@ -1,13 +1,19 @@
 import os
 import sys
-import difflib
-from typing import List, Set, Tuple
-from pathlib import Path
-import argparse
-from utils import get_files_with_rglob, should_ignore_path, get_directories_with_depth  # Imported new function
+from typing import Set
 
-sys.path.append(os.path.abspath('./src'))
- 
+# Adding src to the Python path so modules in src/ can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import DEFAULT_MAX_FILE_SIZE, TEXT, diff_file_pair, sniff_file
+from api import CompareOptions, Comparison, KnownTrees, MODIFIED, NEW
+from file_tree import build_tree, render_tree
+from report_writer import ReportWriter
+from normalize import UTF8
+from report_archive import PLAIN
+from budget import ReportBudget, SECTION_OVERHEAD, estimate_diff_bytes, estimate_section_costs
+from diff_algorithms import CONTEXT_FILE, CONTEXT_FUNCTION, DEFAULT_CONTEXT, DEFAULT_CONTEXT_LINES
+import metrics
 
 def generate_comparison_report(
     original_dir: str,
@@ -15,85 +21,196 @@ def generate_comparison_report(
     output_file: str,
     ignore_patterns: Set[str] = None,
     shallow_ignore: Set[str] = None,
-    max_depth: int = None
+    max_depth: int = None,
+    cache_dir: str = None,
+    max_bytes: int = None,
+    max_tokens: int = None,
+    git_repo: str = None,
+    use_gitignore: bool = False,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    against_manifest: bool = False,
+    io_threads: int = 0,
+    known: KnownTrees = None,
+    context: str = DEFAULT_CONTEXT,
+    context_lines: int = DEFAULT_CONTEXT_LINES,
+    output_format: str = PLAIN,
+    ignore_eol: bool = False,
+    ignore_whitespace: bool = False,
+    encoding: str = UTF8
 ) -> None:
-    """Generate a formatted comparison report between two directories."""
-    
-    # Get files and directories from both repos
-    original_files = set(get_files_with_rglob(original_dir, max_depth, ignore_patterns, shallow_ignore))
-    modified_files = set(get_files_with_rglob(modified_dir, max_depth, ignore_patterns, shallow_ignore))
-    
-    original_dirs = set(get_directories_with_depth(original_dir, max_depth, ignore_patterns, shallow_ignore))  # Updated to use the function from utils.py
-    modified_dirs = set(get_directories_with_depth(modified_dir, max_depth, ignore_patterns, shallow_ignore))  # Same here
-    
-    all_files = sorted(original_files | modified_files)
-    all_dirs = sorted(original_dirs | modified_dirs)
+    """
+    Generate a formatted comparison report between two directories.
+
+    With max_bytes/max_tokens, modified files that do not fit in full are shown
+    as a unified diff (DIFF) instead of BEFORE/AFTER copies, and contents are
+    elided once the budget runs out. Binary files and text files over
+    max_file_size are summarized in one line and never loaded. With git_repo, original_dir and
+    modified_dir are revisions of that repository; with against_manifest, original_dir is a
+    manifest written by the snapshot command. With io_threads, common files are
+    compared on that many threads, overlapping their reads. With known, the scans and
+    changed files kept by watch mode are reused instead of walking and comparing again.
+    Unless context is "file", modified files are always shown as a DIFF with
+    context_lines lines of context ("hunks") or their enclosing functions and
+    classes ("function"), so the report grows with the changes, not the files.
+    With output_format "gzip" or "zstd", the report is compressed in chunks and a
+    section offset index is written next to it (see report_archive.py).
+    With ignore_eol, ignore_whitespace or encoding "auto", files that differ only
+    in line endings, whitespace or encoding are left out of the changed files.
+    """
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        # Write directory structure
-        f.write("/repository-root\n")
-        
-        # Track current directory for tree structure
-        current_dirs = []
-        
-        # First write all directories
-        for dir_path in all_dirs:
-            parts = Path(dir_path).parts
-            for i, dir_name in enumerate(parts):
-                if i >= len(current_dirs):
-                    prefix = "│   " * i
-                    status = ""
-                    if dir_name in shallow_ignore:
-                        status = " [CONTENTS IGNORED]"
-                    f.write(f"{prefix}├── {dir_name}/{status}\n")
-                    current_dirs.append(dir_name)
-                elif dir_name != current_dirs[i]:
-                    current_dirs[i:] = [dir_name]
-                    prefix = "│   " * i
-                    status = ""
-                    if dir_name in shallow_ignore:
-                        status = " [CONTENTS IGNORED]"
-                    f.write(f"{prefix}├── {dir_name}/{status}\n")
-        
-        # Then write all files
-        for file_path in all_files:
-            parts = Path(file_path).parts
-            dirs = parts[:-1]
-            
-            # Write file entry with status
-            prefix = "│   " * len(dirs)
-            status = ""
-            if file_path not in original_files:
-                status = " [NEW]"
-            elif file_path not in modified_files:
-                status = " [DELETED]"
-            else:
-                # Compare file contents
-                with open(os.path.join(original_dir, file_path), 'r', encoding='utf-8') as orig:
-                    with open(os.path.join(modified_dir, file_path), 'r', encoding='utf-8') as mod:
-                        if orig.read() != mod.read():
-                            status = " [MODIFIED]"
-            
-            f.write(f"{prefix}└── {parts[-1]}{status}\n")
-        
-        # Write file contents
-        f.write("\n")
-        for file_path in all_files:
-            if file_path in original_files and file_path in modified_files:
-                # For modified files, show diff
-                with open(os.path.join(original_dir, file_path), 'r', encoding='utf-8') as orig:
-                    with open(os.path.join(modified_dir, file_path), 'r', encoding='utf-8') as mod:
-                        original_content = orig.readlines()
-                        modified_content = mod.readlines()
-                        
-                        if original_content != modified_content:
-                            f.write(f"\n------- {file_path} (BEFORE) -------\n")
-                            f.writelines(original_content)
-                            f.write(f"\n------- {file_path} (AFTER) -------\n")
-                            f.writelines(modified_content)
-            
-            elif file_path in modified_files:
-                # For new files, show content
-                with open(os.path.join(modified_dir, file_path), 'r', encoding='utf-8') as mod:
-                    f.write(f"\n------- {file_path} (NEW) -------\n")
-                    f.write(mod.read())
+    shallow_ignore = shallow_ignore or set()
+    stats = metrics.current()
+
+    # Walk both repos once, concurrently, and decide once which common files changed;
+    # contents are only read for those
+    options = CompareOptions(
+        ignore_patterns=ignore_patterns,
+        shallow_ignore=shallow_ignore,
+        max_depth=max_depth,
+        cache_dir=cache_dir,
+        io_threads=io_threads,
+        max_file_size=max_file_size,
+        git_repo=git_repo,
+        use_gitignore=use_gitignore,
+        against_manifest=against_manifest,
+        rename_threshold=None,
+        list_unchanged=True,
+        diffs=False,
+        ignore_eol=ignore_eol,
+        ignore_whitespace=ignore_whitespace,
+        encoding=encoding,
+    )
+    budget = ReportBudget(max_bytes, max_tokens)
+
+    with Comparison(original_dir, modified_dir, options, known) as comparison:
+        original_files = comparison.original_files
+        modified_files = comparison.modified_files
+
+        original_dirs = set(comparison.original_scan.dirs)
+        modified_dirs = set(comparison.modified_scan.dirs)
+
+        all_files = comparison.paths
+        all_dirs = original_dirs | modified_dirs
+        # Settled by their lines, so files that differ only in line endings are unchanged
+        changed_files = set(comparison.candidates)
+
+        with stats.phase("write"), ReportWriter(output_file, budget, output_format) as f:
+            # Write directory structure, with each file under its directory
+            tree = build_tree(
+                all_dirs,
+                {
+                    file_path: (
+                        "NEW" if file_path not in original_files
+                        else "DELETED" if file_path not in modified_files
+                        else "MODIFIED" if file_path in changed_files
+                        else ""
+                    )
+                    for file_path in all_files
+                },
+                set(comparison.original_scan.shallow_dirs) | set(comparison.modified_scan.shallow_dirs),
+            )
+            f.write_chunks(render_tree(tree))
+
+            # Write file contents, in full where the budget allows
+            f.write("\n")
+            show_files = context == CONTEXT_FILE
+            costs = estimate_section_costs(
+                changed_files,
+                original_files,
+                modified_files,
+                (lambda original_size, modified_size: original_size + modified_size + 2 * SECTION_OVERHEAD)
+                if show_files else estimate_diff_bytes,
+            )
+            full_files = budget.plan({file_path: cost for file_path, cost in costs.items() if file_path in modified_files})
+
+            for change in stats.time_each(comparison.changes(), lambda change: change.path):
+                file_path = change.path
+                if change.status not in (MODIFIED, NEW):
+                    continue
+                if f.exhausted:
+                    # Out of budget: stop reading input, just count what was left out
+                    f.omit()
+                    continue
+
+                if change.status == MODIFIED:
+                    original_path, modified_path = change.original_file, change.modified_file
+                    if show_files and file_path in full_files and all(
+                        sniff_file(path, stat, max_file_size) == TEXT
+                        for path, stat in ((original_path, original_files[file_path]), (modified_path, modified_files[file_path]))
+                    ):
+                        # For modified text files, show both versions
+                        f.section(file_path, "BEFORE")
+                        f.copy_file(original_path)
+                        f.section(file_path, "AFTER")
+                        f.copy_file(modified_path)
+                    elif f.section(file_path, "DIFF"):
+                        # Too large to show in full, binary, or asked for: show only what changed
+                        with stats.phase("diff"):
+                            diff = diff_file_pair(
+                                original_path,
+                                modified_path,
+                                original_files[file_path],
+                                modified_files[file_path],
+                                max_file_size=max_file_size,
+                                context_lines=context_lines,
+                                function_context=context == CONTEXT_FUNCTION,
+                                normalization=options.normalization,
+                            )
+                        f.write_lines(diff or [])
+
+                else:
+                    # For new files, show content
+                    if f.section(file_path, "NEW"):
+                        f.write_contents(
+                            change.modified_file, modified_files[file_path],
+                            "new", file_path in full_files, max_file_size,
+                        )
+
+
+def run_general(
+    original_dir: str,
+    modified_dir: str,
+    output_file: str,
+    ignore_patterns: Set[str] = None,
+    shallow_ignore: Set[str] = None,
+    max_depth: int = None,
+    cache_dir: str = None,
+    max_bytes: int = None,
+    max_tokens: int = None,
+    git_repo: str = None,
+    use_gitignore: bool = False,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    against_manifest: bool = False,
+    io_threads: int = 0,
+    known: KnownTrees = None,
+    context: str = DEFAULT_CONTEXT,
+    context_lines: int = DEFAULT_CONTEXT_LINES,
+    output_format: str = PLAIN,
+    ignore_eol: bool = False,
+    ignore_whitespace: bool = False,
+    encoding: str = UTF8
+) -> None:
+    """Entry point used by main.py for the general method."""
+    generate_comparison_report(
+        original_dir=original_dir,
+        modified_dir=modified_dir,
+        output_file=output_file,
+        ignore_patterns=ignore_patterns,
+        shallow_ignore=shallow_ignore,
+        max_depth=max_depth,
+        cache_dir=cache_dir,
+        max_bytes=max_bytes,
+        max_tokens=max_tokens,
+        git_repo=git_repo,
+        use_gitignore=use_gitignore,
+        max_file_size=max_file_size,
+        against_manifest=against_manifest,
+        io_threads=io_threads,
+        known=known,
+        context=context,
+        context_lines=context_lines,
+        output_format=output_format,
+        ignore_eol=ignore_eol,
+        ignore_whitespace=ignore_whitespace,
+        encoding=encoding
+    )
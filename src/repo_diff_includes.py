@@ -1,11 +1,20 @@
 import os
 import sys
-from typing import List, Set, Optional
-import argparse
-import difflib
-from utils import get_files_with_oswalk, should_ignore_path  # Changed to use consistent functions
+from typing import Set, Optional
 
-sys.path.append(os.path.abspath('./src'))
+# Adding src to the Python path so modules in src/ can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import DEFAULT_MAX_FILE_SIZE
+from api import CompareOptions, Comparison, KnownTrees, MODIFIED, NEW, DELETED, RENAMED
+from report_writer import SECTION_BODY_RESERVE, ReportWriter
+from shards import Shard, ShardIndex, check_sharding
+from normalize import UTF8
+from report_archive import PLAIN
+from budget import ReportBudget
+from diff_algorithms import DEFAULT_ALGORITHM, CONTEXT_FUNCTION, DEFAULT_CONTEXT, DEFAULT_CONTEXT_LINES
+from renames import DEFAULT_RENAME_THRESHOLD, format_rename
+import metrics
 
 def generate_comparison_report(
     original_dir: str,
@@ -14,63 +23,159 @@ def generate_comparison_report(
     ignore_patterns: Set[str] = None,
     shallow_ignore: Set[str] = None,
     include_only: Set[str] = None,
-    max_depth: int = None
+    max_depth: int = None,
+    cache_dir: str = None,
+    jobs: int = 1,
+    diff_algorithm: str = DEFAULT_ALGORITHM,
+    max_bytes: int = None,
+    max_tokens: int = None,
+    git_repo: str = None,
+    use_gitignore: bool = False,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    against_manifest: bool = False,
+    rename_threshold: Optional[float] = DEFAULT_RENAME_THRESHOLD,
+    io_threads: int = 0,
+    known: KnownTrees = None,
+    context: str = DEFAULT_CONTEXT,
+    context_lines: int = DEFAULT_CONTEXT_LINES,
+    output_format: str = PLAIN,
+    ignore_eol: bool = False,
+    ignore_whitespace: bool = False,
+    encoding: str = UTF8,
+    shard: Shard = None
 ) -> None:
-    # Using get_files_with_oswalk for more concise output
-    original_files = get_files_with_oswalk(
-        directory=original_dir, 
-        max_depth=max_depth, 
-        include_only=include_only, 
-        ignore_patterns=ignore_patterns
-    )
-    modified_files = get_files_with_oswalk(
-        directory=modified_dir, 
-        max_depth=max_depth, 
-        include_only=include_only, 
-        ignore_patterns=ignore_patterns
+    if shard is not None:
+        check_sharding(max_bytes, max_tokens, rename_threshold, output_format)
+    options = CompareOptions(
+        ignore_patterns=ignore_patterns,
+        shallow_ignore=shallow_ignore,
+        include_only=include_only,
+        max_depth=max_depth,
+        cache_dir=cache_dir,
+        jobs=jobs,
+        io_threads=io_threads,
+        diff_algorithm=diff_algorithm,
+        max_file_size=max_file_size,
+        git_repo=git_repo,
+        use_gitignore=use_gitignore,
+        against_manifest=against_manifest,
+        rename_threshold=rename_threshold,
+        context_lines=context_lines,
+        function_context=context == CONTEXT_FUNCTION,
+        ignore_eol=ignore_eol,
+        ignore_whitespace=ignore_whitespace,
+        encoding=encoding,
+        shard=shard,
     )
+    stats = metrics.current()
+    budget = ReportBudget(max_bytes, max_tokens)
+    shard_index = ShardIndex(shard) if shard is not None else None
+
+    # Walk both trees once, concurrently, pruning everything outside include_only
+    with Comparison(original_dir, modified_dir, options, known) as comparison, ReportWriter(output_file, budget, output_format) as f:
+        full_files = set(comparison.paths)
+        if budget.limit is not None:
+            # Decide from stat sizes which NEW/DELETED contents fit in full
+            full_files = budget.plan(comparison.section_costs())
 
-    # Convert full paths to relative paths for comparison
-    original_file_paths = {os.path.relpath(path, original_dir): depth 
-                          for path, depth in original_files.items()}
-    modified_file_paths = {os.path.relpath(path, modified_dir): depth 
-                          for path, depth in modified_files.items()}
+        with stats.phase("write"):
+            changes = comparison.changes()
+            if shard_index is not None:
+                changes = shard_index.track(changes, f)
+            for change in stats.time_each(changes, lambda change: change.path):
+                file_path = change.path
+                if change.error is not None:
+                    raise change.error
 
-    # Combine the lists of file paths for both directories
-    all_files = sorted(set(original_file_paths.keys()) | set(modified_file_paths.keys()))
+                if change.status == MODIFIED:
+                    if f.section(file_path, "MODIFIED"):
+                        f.write_lines(change.diff)
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for file_path in all_files:
-            orig_full_path = os.path.join(original_dir, file_path)
-            mod_full_path = os.path.join(modified_dir, file_path)
-            
-            if file_path in original_file_paths and file_path in modified_file_paths:
-                # Both versions exist, so compare them
-                with open(orig_full_path, 'r', encoding='utf-8') as orig:
-                    with open(mod_full_path, 'r', encoding='utf-8') as mod:
-                        original_content = orig.readlines()
-                        modified_content = mod.readlines()
+                elif change.status == RENAMED:
+                    if f.heading(
+                        format_rename(change.source, file_path, change.similarity), file_path, "RENAMED",
+                        SECTION_BODY_RESERVE if change.diff else 0,
+                    ) and change.diff:
+                        f.write_lines(change.diff)
 
-                        if original_content != modified_content:
-                            f.write(f"\n------- {file_path} (MODIFIED) -------\n")
-                            diff = difflib.unified_diff(
-                                original_content,
-                                modified_content,
-                                fromfile="original",
-                                tofile="modified",
-                                lineterm=""
-                            )
-                            f.writelines(f"{line}\n" for line in diff)
+                elif change.status == NEW:
+                    # For new files, show the content
+                    if f.section(file_path, "NEW"):
+                        f.write_contents(
+                            change.modified_file, comparison.modified_files[file_path],
+                            "new", file_path in full_files, max_file_size, change.kind,
+                        )
 
-            elif file_path in modified_file_paths:
-                # For new files, show the content
-                with open(mod_full_path, 'r', encoding='utf-8') as mod:
-                    f.write(f"\n------- {file_path} (NEW) -------\n")
-                    f.writelines(mod.readlines())
+                elif change.status == DELETED:
+                    # For deleted files, show the content
+                    if f.section(file_path, "DELETED"):
+                        f.write_contents(
+                            change.original_file, comparison.original_files[file_path],
+                            "deleted", file_path in full_files, max_file_size, change.kind,
+                        )
 
-            elif file_path in original_file_paths:
-                # For deleted files, show the content
-                with open(orig_full_path, 'r', encoding='utf-8') as orig:
-                    f.write(f"\n------- {file_path} (DELETED) -------\n")
-                    f.writelines(orig.readlines())
+                if f.exhausted:
+                    # Out of budget: stop reading input, just count what was left out
+                    f.omit(comparison.pending_after(file_path))
+                    break
 
+    if shard_index is not None:
+        shard_index.write(output_file)
+
+def run_includes(
+    original_dir: str,
+    modified_dir: str,
+    output_file: str,
+    include_patterns: Set[str] = None,
+    ignore_patterns: Set[str] = None,
+    shallow_ignore: Set[str] = None,
+    max_depth: int = None,
+    cache_dir: str = None,
+    jobs: int = 1,
+    diff_algorithm: str = DEFAULT_ALGORITHM,
+    max_bytes: int = None,
+    max_tokens: int = None,
+    git_repo: str = None,
+    use_gitignore: bool = False,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    against_manifest: bool = False,
+    rename_threshold: Optional[float] = DEFAULT_RENAME_THRESHOLD,
+    io_threads: int = 0,
+    known: KnownTrees = None,
+    context: str = DEFAULT_CONTEXT,
+    context_lines: int = DEFAULT_CONTEXT_LINES,
+    output_format: str = PLAIN,
+    ignore_eol: bool = False,
+    ignore_whitespace: bool = False,
+    encoding: str = UTF8,
+    shard: Shard = None
+) -> None:
+    """Entry point used by main.py for the includes method."""
+    generate_comparison_report(
+        original_dir=original_dir,
+        modified_dir=modified_dir,
+        output_file=output_file,
+        ignore_patterns=ignore_patterns,
+        shallow_ignore=shallow_ignore,
+        include_only=include_patterns,
+        max_depth=max_depth,
+        cache_dir=cache_dir,
+        jobs=jobs,
+        diff_algorithm=diff_algorithm,
+        max_bytes=max_bytes,
+        max_tokens=max_tokens,
+        git_repo=git_repo,
+        use_gitignore=use_gitignore,
+        max_file_size=max_file_size,
+        against_manifest=against_manifest,
+        rename_threshold=rename_threshold,
+        io_threads=io_threads,
+        known=known,
+        context=context,
+        context_lines=context_lines,
+        output_format=output_format,
+        ignore_eol=ignore_eol,
+        ignore_whitespace=ignore_whitespace,
+        encoding=encoding,
+        shard=shard
+    )
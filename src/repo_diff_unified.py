@@ -2,13 +2,23 @@ import os
 import sys
 from typing import List, Set, Optional
 import argparse
-import difflib
 
 # Adding src to the Python path so modules in src/ can be imported
-sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Importing the function from utils.py
-from utils import get_files_with_oswalk
+from utils import DEFAULT_MAX_FILE_SIZE, TEXT, sniff_file
+from api import CompareOptions, Comparison, KnownTrees, MODIFIED, NEW, DELETED, RENAMED
+from report_writer import SECTION_BODY_RESERVE, ReportWriter
+from shards import Shard, ShardIndex, check_sharding, parse_shard
+from normalize import ENCODINGS, UTF8
+from report_archive import OUTPUT_FORMATS, PLAIN
+from budget import ReportBudget, estimate_diff_bytes
+from diff_algorithms import (
+    ALGORITHMS, DEFAULT_ALGORITHM, CONTEXT_MODES, CONTEXT_FILE, CONTEXT_FUNCTION, DEFAULT_CONTEXT, DEFAULT_CONTEXT_LINES,
+)
+from renames import DEFAULT_RENAME_THRESHOLD, format_rename
+import metrics
 
 
 def generate_comparison_report(
@@ -17,74 +27,259 @@ def generate_comparison_report(
     output_file: str,
     ignore_patterns: Set[str] = None,
     shallow_ignore: Set[str] = None,
-    max_depth: int = None
+    max_depth: int = None,
+    cache_dir: str = None,
+    jobs: int = 1,
+    diff_algorithm: str = DEFAULT_ALGORITHM,
+    max_bytes: int = None,
+    max_tokens: int = None,
+    git_repo: str = None,
+    use_gitignore: bool = False,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    against_manifest: bool = False,
+    rename_threshold: Optional[float] = DEFAULT_RENAME_THRESHOLD,
+    io_threads: int = 0,
+    known: KnownTrees = None,
+    context: str = DEFAULT_CONTEXT,
+    context_lines: int = DEFAULT_CONTEXT_LINES,
+    output_format: str = PLAIN,
+    ignore_eol: bool = False,
+    ignore_whitespace: bool = False,
+    encoding: str = UTF8,
+    shard: Shard = None
 ) -> None:
     """
     Generate a formatted comparison report between two directories.
     - Outputs original files with their content.
     - Displays only the differences in a unified diff format for modified files.
     - Includes the full content for new or deleted files.
+    - With max_bytes/max_tokens, trims sections to fit, dropping the ORIGINAL
+      dump first, then file contents, then diff bodies.
+    - Ignore patterns accept names, globs and gitignore syntax; with
+      use_gitignore the trees' own .gitignore files apply as well.
+    - Binary files and text files over max_file_size are summarized in one
+      line (e.g. "[BINARY, 2048 bytes, changed]") and never loaded.
+    - With git_repo, original_dir and modified_dir are revisions of that
+      repository, read from its object store without a checkout.
+    - With against_manifest, original_dir is a manifest written by the
+      snapshot command and only modified_dir is walked.
+    - Deleted and added files at least rename_threshold similar are shown as
+      one "RENAMED a -> b (97%)" section with only their diff (None disables
+      rename detection).
+    - With io_threads, files are compared and diffed on that many threads
+      ahead of the writer, hiding read latency on network file systems.
+    - With known, the scans and changed files kept by watch mode are reused
+      instead of walking and comparing the trees again.
+    - context chooses what accompanies each diff: "file" dumps the ORIGINAL
+      file first, "function" widens each hunk to its enclosing function or
+      class, and "hunks" shows the diff with context_lines lines of context.
+    - With output_format "gzip" or "zstd", the report is compressed in chunks
+      and a section offset index is written next to it (see report_archive.py).
+    - With ignore_eol or ignore_whitespace, files that differ only in line
+      endings or whitespace are left out, and diffs skip such lines; with
+      encoding "auto", files are decoded by their byte order mark or as
+      UTF-8, Windows-1252 or Latin-1 instead of being shown as binary.
+    - With shard, only the top-level entries the shard owns are walked and
+      reported, and an index next to the report lets merge_shards (see
+      shards.py) combine all shards into the report of a single run.
     """
+    if shard is not None:
+        check_sharding(max_bytes, max_tokens, rename_threshold, output_format)
+    options = CompareOptions(
+        ignore_patterns=ignore_patterns,
+        shallow_ignore=shallow_ignore,
+        max_depth=max_depth,
+        cache_dir=cache_dir,
+        jobs=jobs,
+        io_threads=io_threads,
+        diff_algorithm=diff_algorithm,
+        max_file_size=max_file_size,
+        git_repo=git_repo,
+        use_gitignore=use_gitignore,
+        against_manifest=against_manifest,
+        rename_threshold=rename_threshold,
+        context_lines=context_lines,
+        function_context=context == CONTEXT_FUNCTION,
+        ignore_eol=ignore_eol,
+        ignore_whitespace=ignore_whitespace,
+        encoding=encoding,
+        shard=shard,
+    )
+    stats = metrics.current()
+    shard_index = ShardIndex(shard) if shard is not None else None
     try:
-        original_files = set(get_files_with_oswalk(original_dir, max_depth, ignore_patterns, shallow_ignore))
-        modified_files = set(get_files_with_oswalk(modified_dir, max_depth, ignore_patterns, shallow_ignore))
-
-        all_files = sorted(original_files | modified_files)
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for file_path in all_files:
-                try:
-                    if file_path in original_files and file_path in modified_files:
-                        # Both versions exist, so compare them
-                        with open(os.path.join(original_dir, file_path), 'r', encoding='utf-8') as orig:
-                            with open(os.path.join(modified_dir, file_path), 'r', encoding='utf-8') as mod:
-                                original_content = orig.readlines()
-                                modified_content = mod.readlines()
-
-                                if original_content != modified_content:
-                                    f.write(f"\n------- {file_path} (ORIGINAL) -------\n")
-                                    f.writelines(original_content)
-
-                                    f.write(f"\n------- {file_path} (CHANGES) -------\n")
-                                    diff = difflib.unified_diff(
-                                        original_content,
-                                        modified_content,
-                                        fromfile="original",
-                                        tofile="modified",
-                                        lineterm=""
-                                    )
-                                    f.writelines(f"{line}\n" for line in diff)
-
-                    elif file_path in modified_files:
-                        # For new files, show the entire content
-                        with open(os.path.join(modified_dir, file_path), 'r', encoding='utf-8') as mod:
-                            f.write(f"\n------- {file_path} (NEW) -------\n")
-                            f.writelines(mod.readlines())
-
-                    elif file_path in original_files:
-                        # For deleted files, show the original content
-                        with open(os.path.join(original_dir, file_path), 'r', encoding='utf-8') as orig:
-                            f.write(f"\n------- {file_path} (DELETED) -------\n")
-                            f.writelines(orig.readlines())
-
-                except (IOError, UnicodeDecodeError) as e:
-                    f.write(f"\nError processing {file_path}: {str(e)}\n")
-                    continue
+        budget = ReportBudget(max_bytes, max_tokens)
+
+        with Comparison(original_dir, modified_dir, options, known) as comparison, ReportWriter(output_file, budget, output_format) as f:
+            original_files = comparison.original_files
+
+            dump_original = context == CONTEXT_FILE
+            full_files = set(comparison.paths)
+            if budget.limit is not None:
+                # Decide from stat sizes which sections fit in full
+                full_files = budget.plan(comparison.section_costs(
+                    lambda original_size, modified_size: (
+                        original_size * dump_original + estimate_diff_bytes(original_size, modified_size)
+                    ),
+                ))
+
+            with stats.phase("write"):
+                changes = comparison.changes()
+                if shard_index is not None:
+                    changes = shard_index.track(changes, f)
+                for change in stats.time_each(changes, lambda change: change.path):
+                    file_path = change.path
+                    try:
+                        if change.status == MODIFIED:
+                            if change.error is not None:
+                                raise change.error
+
+                            original_path = change.original_file
+                            if dump_original and file_path in full_files and sniff_file(original_path, original_files[file_path], max_file_size) == TEXT:
+                                f.section(file_path, "ORIGINAL")
+                                f.copy_file(original_path)
+
+                            if f.section(file_path, "CHANGES"):
+                                f.write_lines(change.diff)
+
+                        elif change.status == RENAMED:
+                            if change.error is not None:
+                                raise change.error
+                            if f.heading(
+                                format_rename(change.source, file_path, change.similarity), file_path, "RENAMED",
+                                SECTION_BODY_RESERVE if change.diff else 0,
+                            ) and change.diff:
+                                f.write_lines(change.diff)
+
+                        elif change.status == NEW:
+                            # For new files, show the entire content
+                            if f.section(file_path, "NEW"):
+                                if change.error is not None:
+                                    raise change.error
+                                f.write_contents(
+                                    change.modified_file, comparison.modified_files[file_path],
+                                    "new", file_path in full_files, max_file_size, change.kind,
+                                )
+
+                        elif change.status == DELETED:
+                            # For deleted files, show the original content
+                            if f.section(file_path, "DELETED"):
+                                if change.error is not None:
+                                    raise change.error
+                                f.write_contents(
+                                    change.original_file, original_files[file_path],
+                                    "deleted", file_path in full_files, max_file_size, change.kind,
+                                )
+
+                    except (IOError, UnicodeDecodeError) as e:
+                        f.write(f"\nError processing {file_path}: {str(e)}\n")
+
+                    if f.exhausted:
+                        # Out of budget: stop reading input, just count what was left out
+                        f.omit(comparison.pending_after(file_path))
+                        break
+
+        if shard_index is not None:
+            shard_index.write(output_file)
 
     except Exception as e:
         raise RuntimeError(f"Failed to generate comparison report: {str(e)}")
 
 
+def run_unified(
+    original_dir: str,
+    modified_dir: str,
+    output_file: str,
+    ignore_patterns: Set[str] = None,
+    shallow_ignore: Set[str] = None,
+    max_depth: int = None,
+    cache_dir: str = None,
+    jobs: int = 1,
+    diff_algorithm: str = DEFAULT_ALGORITHM,
+    max_bytes: int = None,
+    max_tokens: int = None,
+    git_repo: str = None,
+    use_gitignore: bool = False,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    against_manifest: bool = False,
+    rename_threshold: Optional[float] = DEFAULT_RENAME_THRESHOLD,
+    io_threads: int = 0,
+    known: KnownTrees = None,
+    context: str = DEFAULT_CONTEXT,
+    context_lines: int = DEFAULT_CONTEXT_LINES,
+    output_format: str = PLAIN,
+    ignore_eol: bool = False,
+    ignore_whitespace: bool = False,
+    encoding: str = UTF8,
+    shard: Shard = None
+) -> None:
+    """Entry point used by main.py for the unified method."""
+    generate_comparison_report(
+        original_dir=original_dir,
+        modified_dir=modified_dir,
+        output_file=output_file,
+        ignore_patterns=ignore_patterns,
+        shallow_ignore=shallow_ignore,
+        max_depth=max_depth,
+        cache_dir=cache_dir,
+        jobs=jobs,
+        diff_algorithm=diff_algorithm,
+        max_bytes=max_bytes,
+        max_tokens=max_tokens,
+        git_repo=git_repo,
+        use_gitignore=use_gitignore,
+        max_file_size=max_file_size,
+        against_manifest=against_manifest,
+        rename_threshold=rename_threshold,
+        io_threads=io_threads,
+        known=known,
+        context=context,
+        context_lines=context_lines,
+        output_format=output_format,
+        ignore_eol=ignore_eol,
+        ignore_whitespace=ignore_whitespace,
+        encoding=encoding,
+        shard=shard
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate a comparison report between two directories.")
-    parser.add_argument("original_dir", help="Path to the original directory.")
-    parser.add_argument("modified_dir", help="Path to the modified directory.")
+    parser.add_argument("original_dir", help="Path to the original directory (or revision with --git-repo).")
+    parser.add_argument("modified_dir", help="Path to the modified directory (or revision with --git-repo).")
     parser.add_argument("output_file", help="Path to the output report file.")
     parser.add_argument("--ignore", nargs="*", default=[], help="List of file extensions or patterns to ignore.")
     parser.add_argument("--shallow-ignore", nargs="*", default=[], help="List of directories to shallow ignore.")
     parser.add_argument("--max-depth", type=int, default=None, help="Maximum directory depth to compare.")
+    parser.add_argument("--cache-dir", default=None, help="Directory for the persistent file digest cache.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes for diffing modified files.")
+    parser.add_argument("--diff-algorithm", choices=ALGORITHMS, default=DEFAULT_ALGORITHM, help="Line diff algorithm for modified files.")
+    parser.add_argument("--max-bytes", type=int, default=None, help="Maximum size of the report in bytes.")
+    parser.add_argument("--max-tokens", type=int, default=None, help="Approximate maximum size of the report in LLM tokens.")
+    parser.add_argument("--max-file-size", type=int, default=DEFAULT_MAX_FILE_SIZE, help="Summarize text files larger than this many bytes instead of reading them.")
+    parser.add_argument("--gitignore", action="store_true", help="Also skip files ignored by .gitignore files in the trees.")
+    parser.add_argument("--git-repo", default=None, help="Compare two revisions of this git repository instead of two directories.")
+    parser.add_argument("--against-manifest", action="store_true", help="original_dir is a manifest written by 'main.py snapshot'.")
+    parser.add_argument("--rename-threshold", type=int, default=int(DEFAULT_RENAME_THRESHOLD * 100), help="Minimum similarity in percent for a deleted and an added file to be shown as a rename.")
+    parser.add_argument("--no-renames", action="store_true", help="Show renamed files as deleted and new.")
+    parser.add_argument("--io-threads", type=int, default=0, help="Threads reading and diffing files ahead of the report writer.")
+    parser.add_argument("--context", choices=CONTEXT_MODES, default=DEFAULT_CONTEXT, help="Show the whole original of modified files, the enclosing function or class of each change, or the changed hunks only.")
+    parser.add_argument("-U", "--unified", type=int, default=DEFAULT_CONTEXT_LINES, help="Lines of context around each change.")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=PLAIN, help="Write the report as plain text, or compressed with gzip or zstd plus a section index.")
+    parser.add_argument("--ignore-eol", action="store_true", help="Treat files differing only in line endings (CRLF/LF) as unchanged.")
+    parser.add_argument("--ignore-whitespace", action="store_true", help="Ignore changes in the amount of whitespace and trailing whitespace, and line endings.")
+    parser.add_argument("--encoding", choices=ENCODINGS, default=UTF8, help="Read files as UTF-8, or detect each file's encoding.")
+    parser.add_argument("--shard", default=None, metavar="I/N", help="Only walk and report the top-level entries owned by shard I of N; combine the shards with 'main.py merge'.")
 
     args = parser.parse_args()
+    rename_threshold = None if args.no_renames else args.rename_threshold / 100
+    shard = None
+    if args.shard is not None:
+        try:
+            shard = parse_shard(args.shard)
+            check_sharding(args.max_bytes, args.max_tokens, rename_threshold, args.output_format)
+        except ValueError as e:
+            parser.error(str(e))
 
     generate_comparison_report(
         original_dir=args.original_dir,
@@ -92,7 +287,25 @@ def main():
         output_file=args.output_file,
         ignore_patterns=set(args.ignore),
         shallow_ignore=set(args.shallow_ignore),
-        max_depth=args.max_depth
+        max_depth=args.max_depth,
+        cache_dir=args.cache_dir,
+        jobs=args.jobs,
+        diff_algorithm=args.diff_algorithm,
+        max_bytes=args.max_bytes,
+        max_tokens=args.max_tokens,
+        git_repo=args.git_repo,
+        use_gitignore=args.gitignore,
+        max_file_size=args.max_file_size,
+        against_manifest=args.against_manifest,
+        rename_threshold=rename_threshold,
+        io_threads=args.io_threads,
+        context=args.context,
+        context_lines=args.unified,
+        output_format=args.output_format,
+        ignore_eol=args.ignore_eol,
+        ignore_whitespace=args.ignore_whitespace,
+        encoding=args.encoding,
+        shard=shard
     )
 
 
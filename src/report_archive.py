@@ -0,0 +1,194 @@
+import json
+import zlib
+from bisect import bisect_right
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PLAIN = "plain"
+GZIP = "gzip"
+ZSTD = "zstd"
+OUTPUT_FORMATS = (PLAIN, GZIP, ZSTD)
+# File name suffix of each output format
+OUTPUT_SUFFIXES = {PLAIN: "", GZIP: ".gz", ZSTD: ".zst"}
+
+# The section index of a compressed report is written next to it with this suffix
+INDEX_SUFFIX = ".idx"
+
+# A new gzip member or zstd frame starts at the first section after this many uncompressed bytes
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# zlib window bits for a gzip header and trailer
+GZIP_WBITS = 31
+READ_SIZE = 256 * 1024
+
+
+class Section(NamedTuple):
+    """Where one file section of a report lies in its uncompressed text."""
+    path: str
+    label: str
+    offset: int
+    length: int
+
+
+def check_output_format(output_format: str) -> None:
+    """Raise ValueError for an unknown output format, or for zstd without the zstandard package."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if output_format == ZSTD and zstandard is None:
+        raise ValueError("zstd output needs the zstandard package (pip install zstandard)")
+
+
+def index_path(report_file: str) -> str:
+    """Path of the section index written next to a compressed report."""
+    return report_file + INDEX_SUFFIX
+
+
+def _compressor(output_format: str):
+    if output_format == GZIP:
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+
+def _decompressor(output_format: str):
+    if output_format == GZIP:
+        return zlib.decompressobj(GZIP_WBITS)
+    check_output_format(output_format)
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+class ChunkedStream:
+    """
+    Write-only binary stream that compresses into independent chunks.
+
+    Each chunk is a complete gzip member or zstd frame, so the whole file
+    still decompresses with gzip -d or zstd -d, while a reader that knows
+    where a chunk starts can decompress from there alone. A new chunk is only
+    started at a boundary() (a section start) once the current one holds
+    chunk_size bytes, so a section never straddles two chunks.
+
+    Args:
+        output_file (str): Path to the compressed file to write.
+        output_format (str): GZIP or ZSTD.
+        chunk_size (int): Uncompressed bytes per chunk before a boundary starts a new one
+            (DEFAULT_CHUNK_SIZE if not given).
+    """
+
+    def __init__(self, output_file: str, output_format: str, chunk_size: int = None):
+        check_output_format(output_format)
+        self.output_format = output_format
+        self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        # Uncompressed bytes written so far
+        self.position = 0
+        # (compressed offset, uncompressed offset) of each chunk
+        self.chunks: List[Tuple[int, int]] = []
+        self._file = open(output_file, 'wb')
+        self._compressed = 0
+        self._compressor = None
+
+    def _put(self, data: bytes) -> None:
+        if data:
+            self._file.write(data)
+            self._compressed += len(data)
+
+    def write(self, data: bytes) -> int:
+        if self._compressor is None:
+            self.chunks.append((self._compressed, self.position))
+            self._compressor = _compressor(self.output_format)
+        self._put(self._compressor.compress(data))
+        self.position += len(data)
+        return len(data)
+
+    def _end_chunk(self) -> None:
+        if self._compressor is not None:
+            self._put(self._compressor.flush())
+            self._compressor = None
+
+    def boundary(self) -> None:
+        """Mark a point where a new chunk may start; one does if the current chunk is full."""
+        if self.chunks and self.position - self.chunks[-1][1] >= self.chunk_size:
+            self._end_chunk()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._end_chunk()
+        self._file.close()
+
+
+def write_index(report_file: str, output_format: str, chunks: List[Tuple[int, int]], sections: List[Section]) -> None:
+    """
+    Write the section index of a compressed report.
+
+    The index is one JSON object: the output format, the [compressed offset,
+    uncompressed offset] of each chunk, and the path, label, uncompressed
+    offset and length of each file section.
+    """
+    with open(index_path(report_file), 'w', encoding='utf-8') as f:
+        json.dump(
+            {
+                "format": output_format,
+                "chunks": [list(chunk) for chunk in chunks],
+                "sections": [section._asdict() for section in sections],
+            },
+            f,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+
+class ReportIndex:
+    """
+    Random access to the sections of a compressed report through its index.
+
+    Reading a section seeks to the chunk that holds it and decompresses that
+    chunk only up to the end of the section.
+
+    Args:
+        report_file (str): Path to a report written with output format GZIP or ZSTD.
+    """
+
+    def __init__(self, report_file: str):
+        self.report_file = report_file
+        with open(index_path(report_file), encoding='utf-8') as f:
+            data = json.load(f)
+        self.output_format = data["format"]
+        self.chunks = [tuple(chunk) for chunk in data["chunks"]]
+        self.sections = [Section(**section) for section in data["sections"]]
+        self._chunk_starts = [uncompressed for _, uncompressed in self.chunks]
+
+    def find(self, file_path: str) -> List[Section]:
+        """Return the sections of file_path (e.g. ORIGINAL and CHANGES), in report order."""
+        return [section for section in self.sections if section.path == file_path]
+
+    def _read_range(self, f: BinaryIO, offset: int, length: int) -> bytes:
+        chunk = bisect_right(self._chunk_starts, offset) - 1
+        compressed_offset, chunk_start = self.chunks[chunk]
+        f.seek(compressed_offset)
+        decompressor = _decompressor(self.output_format)
+        skip, needed = offset - chunk_start, offset - chunk_start + length
+        data = bytearray()
+        while len(data) < needed:
+            block = f.read(READ_SIZE)
+            if not block:
+                break
+            data += decompressor.decompress(block)
+        return bytes(data[skip:needed])
+
+    def read(self, section: Section) -> bytes:
+        """Return the raw bytes of a section, header included."""
+        with open(self.report_file, 'rb') as f:
+            return self._read_range(f, section.offset, section.length)
+
+    def read_path(self, file_path: str) -> Optional[str]:
+        """Return the text of all sections of file_path, or None if the report has none."""
+        sections = self.find(file_path)
+        if not sections:
+            return None
+        with open(self.report_file, 'rb') as f:
+            return b"".join(self._read_range(f, section.offset, section.length) for section in sections).decode('utf-8')
@@ -0,0 +1,262 @@
+import os
+import shutil
+from typing import BinaryIO, Iterable
+
+from budget import ReportBudget
+from report_archive import PLAIN, ChunkedStream, Section, write_index
+from utils import DEFAULT_MAX_FILE_SIZE, TEXT, format_file_summary, sniff_file
+import metrics
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+COPY_CHUNK_SIZE = 256 * 1024
+# Smaller files are cheaper to copy through the write buffer than with a flush and a system call
+KERNEL_COPY_MIN_SIZE = 64 * 1024
+# Room kept after a section header for the smallest body a section can have: an elision note
+SECTION_BODY_RESERVE = 64
+
+
+def _kernel_copy(source_fd: int, out_fd: int, offset: int, count: int) -> int:
+    """Copy up to count bytes from offset in source_fd to out_fd's position inside the kernel."""
+    if hasattr(os, "copy_file_range"):
+        return os.copy_file_range(source_fd, out_fd, count, offset)
+    return os.sendfile(out_fd, source_fd, offset, count)
+
+
+class ReportWriter:
+    """
+    Buffered, incremental writer for comparison reports.
+
+    The report is written as UTF-8 bytes. Section headers and diff lines go
+    through one large write buffer; full file contents (NEW, DELETED, BEFORE,
+    AFTER, ORIGINAL) are never decoded: large files are copied by the kernel
+    (copy_file_range, or sendfile) straight into the report and small ones
+    through the buffer, so memory use does not grow with the size of the
+    inputs or of the report.
+
+    With a ReportBudget the writer never exceeds the budget: file contents are
+    cut at a line boundary, oversized diffs are reduced to their hunk headers,
+    and once the budget is spent further sections are dropped and counted in a
+    closing note. Callers check `exhausted` to stop reading input early.
+
+    With output_format GZIP or ZSTD the report is compressed in chunks that
+    start at section boundaries (see report_archive.py), contents are copied
+    through the compressor instead of by the kernel, and a section offset
+    index is written next to the report on close.
+    """
+
+    def __init__(self, output_file: str, budget: ReportBudget = None, output_format: str = PLAIN):
+        self.output_file = output_file
+        self.budget = budget if budget is not None and budget.limit is not None else None
+        self.exhausted = False
+        self.omitted = 0
+        self.output_format = output_format
+        if output_format == PLAIN:
+            self._stream = None
+            self._out = open(output_file, 'wb', buffering=WRITE_BUFFER_SIZE)
+        else:
+            self._stream = self._out = ChunkedStream(output_file, output_format)
+        # (path, label, uncompressed offset) of each section written to a compressed report
+        self._sections = []
+
+    @property
+    def position(self) -> int:
+        """Number of (uncompressed) bytes written to the report so far."""
+        return self._stream.position if self._stream is not None else self._out.tell()
+
+    def _write_if_fits(self, text: str) -> bool:
+        """Write text and charge it to the budget, unless it does not fit."""
+        data = text.encode('utf-8')
+        if self.budget is not None:
+            if len(data) > self.budget.remaining:
+                return False
+            self.budget.charge(len(data))
+        self._out.write(data)
+        return True
+
+    def write(self, text: str) -> bool:
+        """Write raw text to the report. Returns False once the budget is spent."""
+        if self.exhausted:
+            return False
+        if not self._write_if_fits(text):
+            self.exhausted = True
+            return False
+        return True
+
+    def write_chunks(self, chunks: Iterable[str]) -> bool:
+        """
+        Write text made of whole lines a chunk at a time, e.g. a rendered tree.
+
+        Under a budget, the chunk that does not fit is cut after its last line
+        that does. Returns False once the budget is spent.
+        """
+        for chunk in chunks:
+            if self.exhausted:
+                return False
+            data = chunk.encode('utf-8')
+            if self.budget is not None:
+                if len(data) > self.budget.remaining:
+                    data = data[:data.rfind(b"\n", 0, int(self.budget.remaining)) + 1]
+                    self.exhausted = True
+                self.budget.charge(len(data))
+            self._out.write(data)
+        return not self.exhausted
+
+    def write_lines(self, lines: Iterable[str]) -> None:
+        """
+        Write lines that have no line terminator, one per line.
+
+        Under a budget, a diff that does not fit is reduced to its '@@' hunk
+        headers, and if even those do not fit to a single elision note.
+        """
+        if self.budget is None:
+            write = self._out.write
+            for line in lines:
+                write(f"{line}\n".encode('utf-8'))
+            return
+
+        lines = list(lines)
+        if self.exhausted or self._write_if_fits("".join(f"{line}\n" for line in lines)):
+            return
+        hunks = [line for line in lines if line.startswith("@@")]
+        note = f"[{len(lines) - len(hunks)} diff lines elided to fit the output budget]\n"
+        if not self._write_if_fits("".join(f"{line}\n" for line in hunks) + note):
+            self.write(f"[{len(lines)} diff lines elided to fit the output budget]\n")
+
+    def section(self, file_path: str, label: str) -> bool:
+        """
+        Write the header that starts a file section, e.g. '------- a.py (NEW) -------'.
+
+        Returns False, counting the section as omitted, once the budget is spent
+        or when there is no room left for at least an elision note after it.
+        """
+        return self.heading(f"{file_path} ({label})", file_path, label, SECTION_BODY_RESERVE)
+
+    def heading(self, title: str, file_path: str = None, label: str = None, reserve: int = 0) -> bool:
+        """
+        Write a section header with a free-form title, e.g. '------- RENAMED a.py -> b.py (97%) -------'.
+
+        Under a budget the header is only written if reserve more bytes fit
+        after it, so a section never ends right after its header. A compressed
+        report indexes the section under file_path, if given.
+        """
+        header = f"\n------- {title} -------\n"
+        if self.budget is not None and not self.exhausted and len(header.encode('utf-8')) + reserve > self.budget.remaining:
+            self.exhausted = True
+        if self._stream is not None:
+            self._stream.boundary()
+            offset = self._stream.position
+        if self.write(header):
+            if self._stream is not None and file_path is not None:
+                self._sections.append((file_path, label, offset))
+            return True
+        self.omit()
+        return False
+
+    def omit(self, count: int = 1) -> None:
+        """Count sections that were skipped without being written."""
+        self.omitted += count
+
+    def elide(self, num_bytes: int) -> None:
+        """Note that num_bytes of content were left out of the current section."""
+        self.write(f"[{num_bytes} bytes elided to fit the output budget]\n")
+
+    def _emit(self, source: BinaryIO, size: int) -> None:
+        """Copy the first size bytes of an open binary file into the report."""
+        if size < KERNEL_COPY_MIN_SIZE:
+            self._out.write(source.read(size))
+            return
+        if self._stream is not None:
+            # Compressed reports take every byte through the compressor
+            while size > 0:
+                data = source.read(min(COPY_CHUNK_SIZE, size))
+                if not data:
+                    break
+                self._out.write(data)
+                size -= len(data)
+            return
+
+        self._out.flush()
+        copied = 0
+        try:
+            while copied < size:
+                sent = _kernel_copy(source.fileno(), self._out.fileno(), copied, size - copied)
+                if not sent:
+                    break
+                copied += sent
+        except OSError:
+            # Not supported between these files: copy the rest through the buffer
+            pass
+        # The kernel moved the report's file offset behind the buffered writer's back
+        self._out.seek(0, os.SEEK_END)
+        if copied < size:
+            source.seek(copied)
+            shutil.copyfileobj(source, self._out, COPY_CHUNK_SIZE)
+
+    def copy_file(self, path: str) -> None:
+        """Copy the contents of a file into the report as they are, without decoding them."""
+        if self.exhausted:
+            return
+        with open(path, 'rb') as source:
+            size = os.fstat(source.fileno()).st_size
+            if self.budget is None or size <= self.budget.remaining:
+                self._emit(source, size)
+                if self.budget is not None:
+                    self.budget.charge(size)
+                return
+
+            # Keep whole lines that fit, then stop reading the source altogether
+            room = max(int(self.budget.remaining) - SECTION_BODY_RESERVE, 0)
+            head = source.read(room)
+        head = head[:head.rfind(b"\n") + 1]
+        self._out.write(head)
+        self.budget.charge(len(head))
+        self.elide(size - len(head))
+        self.exhausted = True
+
+    def write_contents(
+        self,
+        path: str,
+        stat: os.stat_result,
+        status: str,
+        full: bool = True,
+        max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+        kind: str = None,
+    ) -> None:
+        """
+        Write the body of a NEW or DELETED style section.
+
+        Binary and oversized files get a one-line summary such as
+        '[BINARY, 2048 bytes, new]' and are never read past their prefix; text
+        files are copied when full is True and elided otherwise. The file is
+        sniffed unless its kind is already known.
+        """
+        kind = kind or sniff_file(path, stat, max_file_size)
+        if kind != TEXT:
+            self.write(format_file_summary(kind, stat.st_size, status) + "\n")
+        elif full:
+            self.copy_file(path)
+        else:
+            self.elide(stat.st_size)
+
+    def close(self) -> None:
+        """Note any sections dropped for the budget, then flush and close the report (and write its index)."""
+        if self._stream is not None:
+            ends = [offset for _, _, offset in self._sections[1:]] + [self._stream.position]
+            sections = [
+                Section(file_path, label, offset, end - offset)
+                for (file_path, label, offset), end in zip(self._sections, ends)
+            ]
+        if self.omitted:
+            # Written outside the budget: ReportBudget reserves room for it
+            self._out.write(f"\n[{self.omitted} more sections omitted to fit the output budget]\n".encode('utf-8'))
+        self._out.close()
+        if self._stream is not None:
+            write_index(self.output_file, self.output_format, self._stream.chunks, sections)
+        metrics.current().count("bytes_written", os.path.getsize(self.output_file))
+        metrics.current().count("sections_omitted", self.omitted)
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
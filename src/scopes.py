@@ -0,0 +1,76 @@
+import ast
+import re
+from typing import List, Optional, Sequence, Tuple
+
+PYTHON_SUFFIXES = (".py", ".pyi")
+# Lines that start a top-level definition in most languages, as git's default funcname rule
+# (a letter, '_' or '$' in the first column)
+TOP_LEVEL_HEADER = re.compile(r"[A-Za-z_$]")
+
+
+class ScopeIndex:
+    """
+    Line ranges of the functions and classes of a file, for function-level diff context.
+
+    Python files are parsed with ast, so a change inside a method is shown
+    with its whole method (decorators included). Other files, and Python
+    files that do not parse, fall back to an indentation rule: a scope
+    starts at each line beginning in the first column with a letter, '_'
+    or '$', and runs until the next one, less trailing blank lines.
+
+    Args:
+        lines (Sequence[str]): Lines of the file.
+        python (bool): Parse the lines as Python.
+    """
+
+    def __init__(self, lines: Sequence[str], python: bool = False):
+        # Innermost enclosing (start, end) of each line, or None outside any scope
+        self._scopes: List[Optional[Tuple[int, int]]] = [None] * len(lines)
+        ranges = self._python_ranges(lines) if python else None
+        if ranges is None:
+            ranges = self._header_ranges(lines)
+        # Outer scopes first, so inner ones overwrite them
+        for start, end in sorted(ranges, key=lambda scope: (scope[0], -scope[1])):
+            self._scopes[start:end] = [(start, end)] * (end - start)
+
+    @staticmethod
+    def _python_ranges(lines: Sequence[str]) -> Optional[List[Tuple[int, int]]]:
+        try:
+            tree = ast.parse("".join(lines))
+        except (SyntaxError, ValueError):
+            return None
+        return [
+            (min([node.lineno] + [decorator.lineno for decorator in node.decorator_list]) - 1, node.end_lineno)
+            for node in ast.walk(tree)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        ]
+
+    @staticmethod
+    def _header_ranges(lines: Sequence[str]) -> List[Tuple[int, int]]:
+        headers = [index for index, line in enumerate(lines) if TOP_LEVEL_HEADER.match(line)]
+        ranges = []
+        for start, stop in zip(headers, headers[1:] + [len(lines)]):
+            end = stop
+            while end > start + 1 and not lines[end - 1].strip():
+                end -= 1
+            ranges.append((start, end))
+        return ranges
+
+    def enclosing(self, start: int, stop: int) -> Tuple[int, int]:
+        """
+        Return the line range to show for a change to lines start..stop-1.
+
+        This spans the innermost scopes around the first and last changed
+        lines (for an insertion, start == stop, the line above it), or just
+        the lines themselves where they are outside any scope.
+        """
+        lines = (start, stop - 1) if stop > start else (start - 1,)
+        for line in lines:
+            if 0 <= line < len(self._scopes) and self._scopes[line] is not None:
+                scope_start, scope_end = self._scopes[line]
+                start, stop = min(start, scope_start), max(stop, scope_end)
+        return start, stop
+
+def scope_index(lines: Sequence[str], path: str = "") -> ScopeIndex:
+    """Return the ScopeIndex of a file's lines, parsing them as Python if path says so."""
+    return ScopeIndex(lines, python=path.endswith(PYTHON_SUFFIXES))
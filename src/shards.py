@@ -0,0 +1,193 @@
+import os
+import json
+import heapq
+import hashlib
+from contextlib import ExitStack
+from functools import lru_cache
+from typing import Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+
+from report_archive import PLAIN
+
+# The offset index of a shard's report is written next to it with this suffix
+SHARD_SUFFIX = ".shard"
+COPY_CHUNK_SIZE = 256 * 1024
+
+
+@lru_cache(maxsize=4096)
+def shard_of(name: str, count: int) -> int:
+    """Return the shard, out of count, that owns a top-level entry name (stable across runs and machines)."""
+    digest = hashlib.blake2b(name.encode('utf-8', 'surrogateescape'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+class Shard(NamedTuple):
+    """
+    One of count slices of a comparison, numbered from 0.
+
+    Each top-level file or directory belongs to exactly one shard, picked by
+    a hash of its name, so a shard only walks and reads the subtrees it owns
+    and the shards together cover every path exactly once.
+    """
+    index: int
+    count: int
+
+    def owns(self, rel_path: str) -> bool:
+        """Return True if rel_path is in (or is) a top-level entry owned by this shard."""
+        return shard_of(rel_path.split("/", 1)[0], self.count) == self.index
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+def parse_shard(text: str) -> Shard:
+    """Parse 'i/N' (0 <= i < N) into a Shard, raising ValueError if it is malformed."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must be given as i/N, e.g. 0/4: {text}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be at least 0 and less than the shard count: {text}")
+    return Shard(index, count)
+
+
+def check_sharding(max_bytes: int = None, max_tokens: int = None, rename_threshold: float = None, output_format: str = PLAIN) -> None:
+    """
+    Raise ValueError for report options whose output depends on paths outside one shard.
+
+    A budget is shared by the whole report, renames pair files that may lie in
+    different shards, and compressed chunks cannot be spliced, so merged
+    shards would not match a single run with any of them.
+    """
+    if max_bytes is not None or max_tokens is not None:
+        raise ValueError("Sharded reports cannot have a size budget (--max-bytes/--max-tokens)")
+    if rename_threshold is not None:
+        raise ValueError("Renames can pair files owned by different shards; shard with rename detection off (--no-renames)")
+    if output_format != PLAIN:
+        raise ValueError("Sharded reports are merged as plain text; compress the merged report instead")
+
+
+def shard_index_path(report_file: str) -> str:
+    """Path of the offset index written next to a shard's report."""
+    return report_file + SHARD_SUFFIX
+
+
+class ShardIndex:
+    """
+    Where the output of each reported path starts in one shard's report.
+
+    The reports of all shards of a comparison are merged by path with
+    merge_shards. Paths are recorded as the report's changes are consumed,
+    so whatever a renderer writes for a path (section headers, contents and
+    error notes alike) lies between its offset and the next path's.
+
+    Args:
+        shard (Shard): The shard the report was written for.
+    """
+
+    def __init__(self, shard: Shard):
+        self.shard = shard
+        # (path, offset, length) of the output of each path that has any, in path order
+        self.paths: List[Tuple[str, int, int]] = []
+        self.size = 0
+        self._starts: List[Tuple[str, int]] = []
+
+    def track(self, changes: Iterable, writer) -> Iterator:
+        """Yield changes, recording the writer's position as each one's output starts."""
+        for change in changes:
+            self._starts.append((change.path, writer.position))
+            yield change
+
+    def write(self, report_file: str) -> None:
+        """Write the index of report_file (closed, so its size is final) next to it."""
+        self.size = os.path.getsize(report_file)
+        ends = [offset for _, offset in self._starts[1:]] + [self.size]
+        self.paths = [
+            (file_path, offset, end - offset)
+            for (file_path, offset), end in zip(self._starts, ends)
+            if end > offset
+        ]
+        with open(shard_index_path(report_file), 'w', encoding='utf-8') as f:
+            json.dump(
+                {
+                    "shard": self.shard.index,
+                    "count": self.shard.count,
+                    "size": self.size,
+                    "paths": [list(entry) for entry in self.paths],
+                },
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+
+    @classmethod
+    def read(cls, report_file: str) -> "ShardIndex":
+        """Read the index written next to a shard's report."""
+        with open(shard_index_path(report_file), encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(Shard(data["shard"], data["count"]))
+        index.size = data["size"]
+        index.paths = [tuple(entry) for entry in data["paths"]]
+        return index
+
+
+def merge_shards(shard_reports: Sequence[str], output_file: str) -> int:
+    """
+    Merge the reports of all shards of a comparison into one report.
+
+    The shards' per-path outputs are merged by path (a k-way merge of their
+    indexes, each already in path order) and copied as bytes, so the result
+    is identical to the report of the same comparison run in one process.
+
+    Args:
+        shard_reports (Sequence[str]): Reports written with --shard i/N, one for each i, in any order.
+        output_file (str): Path to the merged report.
+
+    Returns:
+        int: Number of paths in the merged report.
+    """
+    indexes = [ShardIndex.read(report_file) for report_file in shard_reports]
+    counts = {index.shard.count for index in indexes}
+    if len(counts) != 1:
+        raise ValueError(f"Shard reports come from different shard counts: {sorted(counts)}")
+    count = counts.pop()
+    found = sorted(index.shard.index for index in indexes)
+    if found != list(range(count)):
+        missing = sorted(set(range(count)) - set(found))
+        raise ValueError(
+            f"Expected one report for each of shards 0..{count - 1}; "
+            + (f"missing {', '.join(map(str, missing))}" if missing else "some shards were given twice")
+        )
+    for report_file, index in zip(shard_reports, indexes):
+        if os.path.getsize(report_file) != index.size:
+            raise ValueError(f"Shard report does not match its index: {report_file}")
+
+    merged = heapq.merge(*(
+        [(file_path, offset, length, number) for file_path, offset, length in index.paths]
+        for number, index in enumerate(indexes)
+    ))
+    paths = 0
+    with ExitStack() as stack, open(output_file, 'wb') as out:
+        sources = [stack.enter_context(open(report_file, 'rb')) for report_file in shard_reports]
+        # Runs of consecutive paths from the same shard are copied in one go
+        run = None
+        for _, offset, length, number in merged:
+            paths += 1
+            if run is not None and run[0] == number and run[1] + run[2] == offset:
+                run[2] += length
+                continue
+            if run is not None:
+                _copy_range(sources[run[0]], run[1], run[2], out)
+            run = [number, offset, length]
+        if run is not None:
+            _copy_range(sources[run[0]], run[1], run[2], out)
+    return paths
+
+
+def _copy_range(source, offset: int, length: int, out) -> None:
+    source.seek(offset)
+    while length > 0:
+        data = source.read(min(COPY_CHUNK_SIZE, length))
+        if not data:
+            raise ValueError(f"Shard report ends early: {source.name}")
+        out.write(data)
+        length -= len(data)
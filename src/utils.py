@@ -1,26 +1,207 @@
 import os
+import codecs
 import logging
 import difflib
-from typing import List, Set, Dict, Optional
+import heapq
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Set, Dict, Optional, NamedTuple, Tuple, Union
+
+from diff_algorithms import DEFAULT_ALGORITHM, DEFAULT_CONTEXT_LINES, unified_diff
+from scopes import scope_index
+from normalize import AUTO, UTF8, Normalization, bom_encoding, line_key, normalized_digest, read_lines
+from patterns import PathMatcher, compile_matcher
+from shards import Shard
+import metrics
 
 import os
 from pathlib import Path
 from typing import List, Set, Tuple
 
 
+class TreeScan(NamedTuple):
+    """Result of a single walk over a directory tree."""
+    files: Dict[str, os.stat_result]
+    dirs: List[str]
+    shallow_dirs: List[str]
+    # Directory the relative paths in files are read from
+    root: str = ""
+    # Keeps temporary storage behind root alive (see git_backend.py)
+    storage: Any = None
+
+
 def should_ignore_path(path: str, ignore_patterns: Set[str], shallow_ignore: Set[str]) -> Tuple[bool, bool]:
     """
     Check if path should be ignored and how.
     Returns (fully_ignore, shallow_ignore) tuple.
     """
     path_parts = Path(path).parts
+    matcher = compile_matcher(ignore_patterns, shallow_ignore)
 
     # Check for shallow ignore first
-    if any(ignore == path_parts[0] for ignore in shallow_ignore):
+    if matcher.shallow(path_parts[0]):
         return False, True
 
-    # Then check for full ignore
-    return any(ignore in path_parts for ignore in ignore_patterns), False
+    # Then check for full ignore of the path or any directory above it
+    return any(
+        matcher.ignored("/".join(path_parts[:index + 1]), part, index < len(path_parts) - 1)
+        for index, part in enumerate(path_parts)
+    ), False
+
+def scan_tree(
+    root_dir: str,
+    max_depth: int = None,
+    ignore_patterns: Set[str] = None,
+    shallow_ignore: Set[str] = None,
+    include_only: Set[str] = None,
+    use_gitignore: bool = False,
+    shard: Shard = None,
+) -> TreeScan:
+    """
+    Walk a directory tree once, collecting files, directories and stat data.
+
+    Ignored and shallow-ignored directories are pruned before descending, and
+    directories that cannot contain an included file are never opened. All
+    patterns are compiled once into a PathMatcher (see patterns.py).
+
+    Args:
+        root_dir (str): The root directory to traverse.
+        max_depth (int): Maximum number of path components to keep (None for no limit).
+        ignore_patterns (Set[str]): Names, globs or gitignore-style patterns to ignore completely.
+        shallow_ignore (Set[str]): Top-level directories whose contents are skipped.
+        include_only (Set[str]): Paths or globs, relative to root_dir, a file must match or be under.
+        use_gitignore (bool): Also honour .gitignore files in the tree.
+        shard (Shard): Only walk the top-level entries this shard owns.
+
+    Returns:
+        TreeScan: Relative file paths mapped to their stat results, the relative
+        directories kept, and the shallow-ignored directories found.
+    """
+    files = {}
+    dirs = []
+    shallow_dirs = []
+    pruned = 0
+
+    # Stack of (relative directory, number of components in it, matcher for it)
+    stack = [("", 0, compile_matcher(ignore_patterns, shallow_ignore, include_only, use_gitignore, shard))]
+    while stack:
+        rel_dir, depth, matcher = stack.pop()
+        abs_dir = os.path.join(root_dir, rel_dir)
+        if matcher.use_gitignore:
+            matcher = _load_gitignore(matcher, rel_dir, os.path.join(abs_dir, ".gitignore"))
+        try:
+            entries = os.scandir(abs_dir)
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                name = entry.name
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if matcher.ignored(rel_path, name, is_dir):
+                    pruned += 1
+                    continue
+
+                if depth == 0 and matcher.shallow(name):
+                    if is_dir:
+                        shallow_dirs.append(rel_path)
+                    continue
+
+                if max_depth is not None and depth + 1 > max_depth:
+                    pruned += 1
+                    continue
+
+                if is_dir:
+                    if not matcher.may_include(rel_path):
+                        pruned += 1
+                        continue
+                    dirs.append(rel_path)
+                    if max_depth is None or depth + 2 <= max_depth:
+                        stack.append((rel_path, depth + 1, matcher))
+                elif entry.is_file():
+                    if not matcher.included(rel_path):
+                        pruned += 1
+                        continue
+                    try:
+                        files[rel_path] = entry.stat()
+                    except OSError:
+                        continue
+
+    stats = metrics.current()
+    stats.count("files_scanned", len(files))
+    stats.count("dirs_scanned", len(dirs))
+    stats.count("entries_pruned", pruned)
+    return TreeScan(files, sorted(dirs), sorted(shallow_dirs), root_dir)
+
+def path_kept(rel_path: str, matcher: PathMatcher, max_depth: int, is_dir: bool) -> bool:
+    """Apply the scan_tree filters to a relative path found without walking to it (no .gitignore files are read)."""
+    parts = rel_path.split("/")
+    if max_depth is not None and len(parts) > max_depth:
+        return False
+    if len(parts) > 1 and matcher.shallow(parts[0]):
+        return False
+    for index in range(len(parts)):
+        prefix = "/".join(parts[:index + 1])
+        prefix_is_dir = is_dir or index < len(parts) - 1
+        if matcher.ignored(prefix, parts[index], prefix_is_dir):
+            return False
+        if prefix_is_dir and not matcher.may_include(prefix):
+            return False
+    return is_dir or matcher.included(rel_path)
+
+def _load_gitignore(matcher: PathMatcher, rel_dir: str, path: str) -> PathMatcher:
+    """Extend matcher with the .gitignore file at path, if there is one."""
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return matcher.with_gitignore(rel_dir, f.read())
+    except OSError:
+        return matcher
+
+def scan_trees(
+    original_dir: str,
+    modified_dir: str,
+    max_depth: int = None,
+    ignore_patterns: Set[str] = None,
+    shallow_ignore: Set[str] = None,
+    include_only: Set[str] = None,
+    git_repo: str = None,
+    list_unchanged: bool = True,
+    use_gitignore: bool = False,
+    against_manifest: bool = False,
+    shard: Shard = None,
+) -> Tuple[TreeScan, TreeScan]:
+    """
+    Scan the original and modified trees concurrently on a thread pool.
+
+    With git_repo, original_dir and modified_dir are revisions of that
+    repository and are read from its object store instead (see git_backend.py).
+    With against_manifest, original_dir is a manifest written by the snapshot
+    command and only modified_dir is walked (see manifest.py). In both cases
+    list_unchanged=False lets the backend drop files identical on both sides.
+    With shard, every backend only walks the top-level entries the shard owns.
+    """
+    if against_manifest:
+        from manifest import scan_manifest_trees
+        return scan_manifest_trees(
+            original_dir, modified_dir, max_depth, ignore_patterns,
+            shallow_ignore, include_only, list_unchanged, use_gitignore, shard,
+        )
+    if git_repo:
+        from git_backend import scan_git_trees
+        return scan_git_trees(
+            git_repo, original_dir, modified_dir, max_depth, ignore_patterns,
+            shallow_ignore, include_only, list_unchanged, use_gitignore, shard,
+        )
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [
+            pool.submit(scan_tree, root, max_depth, ignore_patterns, shallow_ignore, include_only, use_gitignore, shard)
+            for root in (original_dir, modified_dir)
+        ]
+        original_scan, modified_scan = (future.result() for future in futures)
+    return original_scan, modified_scan
 
 def get_files_with_rglob(
     root_dir: str,
@@ -30,34 +211,8 @@ def get_files_with_rglob(
     include_only: Set[str] = None,
 ) -> List[str]:
     """Get all files in a directory up to max_depth, handling different ignore patterns."""
-    files = []
-    root_path = Path(root_dir)
-    
-    for path in root_path.rglob("*"):
-        if not path.is_file():
-            continue
-        
-        relative_path = path.relative_to(root_path)
-        
-        # Check depth
-        if max_depth is not None and len(relative_path.parts) > max_depth:
-            continue
-        
-        # Check include_only patterns
-        if include_only and not any(str(relative_path).startswith(pattern) for pattern in include_only):
-            continue
-            
-        # Check ignore patterns
-        fully_ignore, shallow_ignored = should_ignore_path(
-            str(relative_path), ignore_patterns or set(), shallow_ignore or set()
-        )
-        
-        if fully_ignore or shallow_ignored:
-            continue
-        
-        files.append(str(relative_path))
-    
-    return sorted(files)
+    scan = scan_tree(root_dir, max_depth, ignore_patterns, shallow_ignore, include_only)
+    return sorted(scan.files)
 
 def get_files_with_oswalk(
     directory: str, 
@@ -79,6 +234,7 @@ def get_files_with_oswalk(
     """
     file_structure = {}
     root_depth = directory.rstrip(os.sep).count(os.sep)
+    matcher = compile_matcher(ignore_patterns, include_only=include_only)
 
     for root, dirs, files in os.walk(directory):
         current_depth = root.count(os.sep) - root_depth
@@ -87,35 +243,38 @@ def get_files_with_oswalk(
         if max_depth is not None and max_depth != -1 and current_depth > max_depth:
             continue
 
-        # Filter directories
-        dirs[:] = [d for d in dirs if not should_ignore_name(d, ignore_patterns)]
+        rel_root = os.path.relpath(root, directory).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else rel_root + "/"
 
-        # Include specific directories only
-        if include_only:
-            dirs[:] = [d for d in dirs if d in include_only]
+        # Filter directories, pruning those outside include_only
+        dirs[:] = [
+            d for d in dirs
+            if not matcher.ignored(rel_root + d, d, True) and matcher.may_include(rel_root + d)
+        ]
 
         for file in files:
-            if include_only and not any(file.startswith(inc) for inc in include_only):
+            if not matcher.included(rel_root + file):
                 continue
-            if not should_ignore_name(file, ignore_patterns):
+            if not matcher.ignored(rel_root + file, file, False):
                 file_structure[os.path.join(root, file)] = current_depth
 
     return file_structure
 
 
-def should_ignore_name(name: str, patterns: Set[str] = None) -> bool:
+def should_ignore_name(name: str, patterns: Set[str] = None, is_dir: bool = False) -> bool:
     """
     Check if a file or directory matches any of the ignore patterns.
     Args:
         name (str): The name of the file or directory.
-        patterns (Set[str]): Patterns to ignore.
+        patterns (Set[str]): Names or globs to ignore (e.g. 'build', '*.pyc').
+        is_dir (bool): Whether name is a directory, for patterns ending in '/'.
     
     Returns:
         bool: True if the name should be ignored, False otherwise.
     """
     if not patterns:
         return False
-    return any(pattern in name for pattern in patterns)
+    return compile_matcher(patterns).ignored(name, name, is_dir)
 
 def get_directories_with_depth(
     root_dir: str,
@@ -124,35 +283,139 @@ def get_directories_with_depth(
     shallow_ignore: Set[str] = None,
 ) -> List[str]:
     """Get all directories in a directory up to max_depth, handling ignore patterns."""
-    dirs = set()
-    root_path = Path(root_dir)
-
-    for path in root_path.rglob("*"):
-        if not path.is_dir():
-            continue
-
-        relative_path = path.relative_to(root_path)
+    return scan_tree(root_dir, max_depth, ignore_patterns, shallow_ignore).dirs
+
+COMPARE_CHUNK_SIZE = 1024 * 1024
+# Per-thread pair of read buffers for files_differ, reused across calls
+_compare_buffers = threading.local()
+
+# Prefix read to tell text from binary files
+SNIFF_SIZE = 8192
+# Text files larger than this are summarized instead of read
+DEFAULT_MAX_FILE_SIZE = 16 * 1024 * 1024
+
+TEXT = "TEXT"
+BINARY = "BINARY"
+OVERSIZED = "OVERSIZED"
+
+def sniff_file(
+    path: str,
+    stat: os.stat_result = None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    encoding: str = UTF8,
+) -> str:
+    """
+    Classify a file as TEXT, BINARY or OVERSIZED from its size and a short prefix.
 
-        # Check depth
-        if max_depth is not None and len(relative_path.parts) > max_depth:
-            continue
+    Only the first SNIFF_SIZE bytes are read. A file is binary if its prefix
+    contains a NUL byte or is not valid UTF-8 (a multi-byte character cut
+    off at the end of the prefix is allowed), and oversized if it is text
+    but larger than max_file_size. With encoding AUTO, a file starting with
+    a byte order mark is text (UTF-16 and UTF-32 text holds NUL bytes), and
+    invalid UTF-8 is not binary: it is decoded with a fallback encoding.
 
-        # Check ignore patterns
-        fully_ignore, shallow_ignored = should_ignore_path(
-            str(relative_path), ignore_patterns or set(), shallow_ignore or set()
-        )
+    Args:
+        path (str): Path to the file.
+        stat (os.stat_result): Stat of the file if already known.
+        max_file_size (int): Largest text file to read in full (None for no limit).
+        encoding (str): UTF8, or AUTO to detect the encoding (see normalize.py).
 
-        if fully_ignore or shallow_ignored:  # Changed this condition to skip both fully ignored and shallow ignored
-            continue
+    Returns:
+        str: TEXT, BINARY or OVERSIZED.
+    """
+    stat = stat or os.stat(path)
+    with open(path, 'rb') as f:
+        prefix = f.read(SNIFF_SIZE)
+    metrics.current().count("bytes_read", len(prefix))
+    if encoding != AUTO or bom_encoding(prefix) is None:
+        if b"\0" in prefix:
+            return BINARY
+        if encoding != AUTO:
+            try:
+                codecs.getincrementaldecoder('utf-8')().decode(prefix, final=len(prefix) < SNIFF_SIZE)
+            except UnicodeDecodeError:
+                return BINARY
+    if max_file_size is not None and stat.st_size > max_file_size:
+        return OVERSIZED
+    return TEXT
+
+def format_file_summary(kind: str, size: int, status: str) -> str:
+    """Describe a file that is not shown as text, e.g. '[BINARY, 2048 bytes, changed]'."""
+    return f"[{kind}, {size} bytes, {status}]"
+
+
+def files_differ(
+    file1: str,
+    file2: str,
+    stat1: os.stat_result = None,
+    stat2: os.stat_result = None,
+    cache=None,
+    normalization: Normalization = None,
+) -> bool:
+    """
+    Decide whether two files differ without decoding or fully loading them.
 
-        dirs.add(str(relative_path))
+    A size mismatch means changed and the same inode means unchanged. Otherwise
+    the files' cached digests are compared when a cache is given, or the files
+    are read chunk by chunk into two reused buffers and compared as bytes,
+    stopping at the first differing chunk. With an active normalization, text
+    files whose bytes differ are compared again by their normalized digests,
+    computed in one streaming pass each (see normalize.py).
 
-    return sorted(list(dirs))
+    Args:
+        file1 (str): Path to the first file.
+        file2 (str): Path to the second file.
+        stat1 (os.stat_result): Stat of file1 if already known (e.g. from scan_tree).
+        stat2 (os.stat_result): Stat of file2 if already known.
+        cache (HashCache): Optional persistent digest cache (see hash_cache.py).
+        normalization (Normalization): Line ending, whitespace and encoding differences to ignore.
 
-def compare_file_contents_full(file1: str, file2: str) -> bool:
+    Returns:
+        bool: True if the files differ, False otherwise.
+    """
+    if normalization is not None and normalization.active:
+        if not files_differ(file1, file2, stat1, stat2, cache):
+            return False
+        encoding = normalization.encoding
+        if sniff_file(file1, stat1, None, encoding) != TEXT or sniff_file(file2, stat2, None, encoding) != TEXT:
+            return True
+        return normalized_digest(file1, normalization) != normalized_digest(file2, normalization)
+
+    stats = metrics.current()
+    stats.count("files_compared")
+    stat1 = stat1 or os.stat(file1)
+    stat2 = stat2 or os.stat(file2)
+    if stat1.st_size != stat2.st_size:
+        return True
+    if (stat1.st_ino, stat1.st_dev) == (stat2.st_ino, stat2.st_dev) and stat1.st_ino:
+        return False
+    if cache is not None:
+        return cache.digest(file1, stat1) != cache.digest(file2, stat2)
+
+    buffers = getattr(_compare_buffers, "pair", None)
+    if buffers is None:
+        buffers = _compare_buffers.pair = (bytearray(COMPARE_CHUNK_SIZE), bytearray(COMPARE_CHUNK_SIZE))
+    buffer1, buffer2 = buffers
+    bytes_read = 0
+    try:
+        with open(file1, 'rb', buffering=0) as f1, open(file2, 'rb', buffering=0) as f2:
+            while True:
+                read1 = f1.readinto(buffer1)
+                read2 = f2.readinto(buffer2)
+                bytes_read += read1 + read2
+                if read1 != read2:
+                    return True
+                if read1 < COMPARE_CHUNK_SIZE:
+                    # End of both files
+                    return buffer1[:read1] != buffer2[:read2]
+                if buffer1 != buffer2:
+                    return True
+    finally:
+        stats.count("bytes_read", bytes_read)
+
+def compare_file_contents_full(file1: str, file2: str, cache=None, normalization: Normalization = None) -> bool:
     """Compare the contents of two files. Return True if they differ, False otherwise."""
-    with open(file1, 'r', encoding='utf-8') as f1, open(file2, 'r', encoding='utf-8') as f2:
-        return f1.read() != f2.read()
+    return files_differ(file1, file2, cache=cache, normalization=normalization)
 
 def compare_file_contents_diff(file1: str, file2: str) -> List[str]:
     """
@@ -170,6 +433,294 @@ def compare_file_contents_diff(file1: str, file2: str) -> List[str]:
         content2 = f2.readlines()
         return list(difflib.unified_diff(content1, content2, lineterm=''))
 
+def diff_files(
+    file1: str,
+    file2: str,
+    stat1: os.stat_result = None,
+    stat2: os.stat_result = None,
+    algorithm: str = DEFAULT_ALGORITHM,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    context_lines: int = DEFAULT_CONTEXT_LINES,
+    function_context: bool = False,
+    normalization: Normalization = None,
+) -> Tuple[Optional[str], Optional[List[str]]]:
+    """
+    Read two files and return their kind and unified diff, or (None, None) if they are unchanged.
+
+    This bundles the read, compare and diff steps for one file pair so it can
+    run in a worker process (see map_ordered). Binary and oversized files are
+    never decoded: once they are known to differ, a single summary line such
+    as '[BINARY, 2048 bytes, changed]' is returned instead of a diff. With a
+    normalization, files equal after normalizing are settled by a streaming
+    pass before anything is decoded, and the diff matches lines by their
+    normalized form while showing them as they are.
+
+    Args:
+        file1 (str): Path to the original file.
+        file2 (str): Path to the modified file.
+        stat1 (os.stat_result): Stat of file1 if already known.
+        stat2 (os.stat_result): Stat of file2 if already known.
+        algorithm (str): Diff algorithm, one of diff_algorithms.ALGORITHMS.
+        max_file_size (int): Largest text file to diff (see sniff_file).
+        context_lines (int): Unchanged lines shown around each change.
+        function_context (bool): Widen each hunk to the function or class around its changes (see scopes.py).
+        normalization (Normalization): Line ending, whitespace and encoding differences to ignore.
+
+    Returns:
+        Tuple[Optional[str], Optional[List[str]]]: TEXT, BINARY or OVERSIZED, and
+            the diff lines without line terminators.
+    """
+    stat1 = stat1 or os.stat(file1)
+    stat2 = stat2 or os.stat(file2)
+    normalization = normalization or Normalization()
+    kind, content1, content2, keys = _read_changed(file1, file2, stat1, stat2, max_file_size, normalization)
+    if kind != TEXT:
+        return kind, None if kind is None else [format_file_summary(kind, stat2.st_size, "changed")]
+    metrics.current().count("files_diffed")
+    return TEXT, list(unified_diff(
+        content1,
+        content2,
+        fromfile="original",
+        tofile="modified",
+        n=context_lines,
+        lineterm="",
+        algorithm=algorithm,
+        scopes=scope_index(content1, file1) if function_context else None,
+        keys=keys,
+    ))
+
+def _read_changed(
+    file1: str,
+    file2: str,
+    stat1: os.stat_result,
+    stat2: os.stat_result,
+    max_file_size: int,
+    normalization: Normalization,
+    cache=None,
+) -> Tuple[Optional[str], Optional[List[str]], Optional[List[str]], Optional[tuple]]:
+    """
+    Return the kind of a changed file pair, with the lines of changed text files and their normalized forms.
+
+    Text files are compared by their lines read with universal newlines, so
+    files that differ only in line endings are unchanged (None).
+    """
+    if not files_differ(file1, file2, stat1, stat2, cache, normalization):
+        return None, None, None, None
+
+    encoding = normalization.encoding
+    kinds = {sniff_file(file1, stat1, max_file_size, encoding), sniff_file(file2, stat2, max_file_size, encoding)}
+    if kinds != {TEXT}:
+        return BINARY if BINARY in kinds else OVERSIZED, None, None, None
+    try:
+        content1 = read_lines(file1, encoding)
+        content2 = read_lines(file2, encoding)
+    except UnicodeDecodeError:
+        # Invalid UTF-8 beyond the sniffed prefix
+        return BINARY, None, None, None
+    metrics.current().count("bytes_read", os.path.getsize(file1) + os.path.getsize(file2))
+    # Lines are matched by their normalized form where it differs from the line itself
+    keys = None
+    if normalization.ignore_whitespace:
+        keys = ([line_key(line, normalization) for line in content1], [line_key(line, normalization) for line in content2])
+    compared1, compared2 = keys or (content1, content2)
+    if compared1 == compared2:
+        return None, None, None, None
+    return TEXT, content1, content2, keys
+
+def text_files_differ(
+    file1: str,
+    file2: str,
+    stat1: os.stat_result = None,
+    stat2: os.stat_result = None,
+    cache=None,
+    normalization: Normalization = None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+) -> bool:
+    """
+    Return True if diff_files would report two files as changed.
+
+    Takes the arguments of files_differ, which settles most files first.
+    Unlike files_differ, text files that differ only in line endings are
+    equal, as they are read with universal newlines when diffed.
+    """
+    stat1 = stat1 or os.stat(file1)
+    stat2 = stat2 or os.stat(file2)
+    normalization = normalization or Normalization()
+    return _read_changed(file1, file2, stat1, stat2, max_file_size, normalization, cache)[0] is not None
+
+def diff_file_pair(
+    file1: str,
+    file2: str,
+    stat1: os.stat_result = None,
+    stat2: os.stat_result = None,
+    algorithm: str = DEFAULT_ALGORITHM,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    context_lines: int = DEFAULT_CONTEXT_LINES,
+    function_context: bool = False,
+    normalization: Normalization = None,
+) -> Optional[List[str]]:
+    """Read two files and return their unified diff, or None if they are unchanged (see diff_files)."""
+    return diff_files(
+        file1, file2, stat1, stat2, algorithm, max_file_size, context_lines, function_context, normalization,
+    )[1]
+
+def compare_cost(task: tuple) -> int:
+    """Expected work of a files_differ task (file1, file2, stat1, stat2, ...): the bytes it may read."""
+    stat1, stat2 = task[2], task[3]
+    normalization = task[5] if len(task) > 5 else None
+    if stat1.st_size != stat2.st_size and (normalization is None or not normalization.active):
+        # Settled from the stat sizes alone
+        return 0
+    return stat1.st_size + stat2.st_size
+
+def diff_cost(task: tuple) -> int:
+    """Expected work of a diff_files task (file1, file2, stat1, stat2, algorithm, max_file_size, ...)."""
+    stat1, stat2, max_file_size = task[2], task[3], task[5]
+    if max_file_size is not None and max(stat1.st_size, stat2.st_size) > max_file_size:
+        # Summarized without being read
+        return 0
+    return stat1.st_size + stat2.st_size
+
+# Upcoming tasks map_ordered picks the most expensive from, when given their cost
+DEFAULT_LOOKAHEAD = 4096
+
+def map_ordered(
+    func: Callable,
+    tasks: Iterable[tuple],
+    jobs: int = 1,
+    window: int = None,
+    threads: int = 0,
+    initializer: Callable = None,
+    initargs: tuple = (),
+    cost: Callable[[tuple], int] = None,
+    lookahead: int = DEFAULT_LOOKAHEAD,
+) -> Iterator[Future]:
+    """
+    Run func(*task) for each task and yield futures in the original task order.
+
+    With jobs > 1 the calls run on a process pool. Otherwise, with threads > 0,
+    they run on a pool of that many threads: file reads release the GIL, so
+    upcoming files are read while the caller diffs and writes earlier ones,
+    which hides read latency on network file systems and cold caches. Either
+    way at most `window` tasks are in flight, so memory stays bounded and the
+    pool waits for the caller. With neither, each call runs inline when its
+    future is requested. Callers call .result() on each future, so a failing
+    task raises at its own position without stopping the others.
+    initializer(*initargs) runs once in each worker (or once inline), which
+    hands every worker large shared state without pickling it per task.
+
+    With cost, a pool is handed the most expensive of the next `lookahead`
+    tasks first (e.g. by stat size), so a large file late in the order
+    overlaps the small ones instead of running alone at the end. Results that
+    finish early wait in the window until their turn; up to `workers` slots of
+    it are kept for the earliest tasks, so the results are still yielded in
+    order and at most `window` are ever held.
+
+    Args:
+        func (Callable): Module-level (picklable) function to call.
+        tasks (Iterable[tuple]): Positional arguments for each call.
+        jobs (int): Number of worker processes.
+        window (int): Maximum tasks in flight (defaults to 4 per worker).
+        threads (int): Number of I/O threads, used when jobs <= 1.
+        initializer (Callable): Module-level function to set up each worker.
+        initargs (tuple): Arguments of initializer.
+        cost (Callable[[tuple], int]): Expected work of a task, to run expensive tasks first.
+        lookahead (int): Number of upcoming tasks cost picks from.
+
+    Returns:
+        Iterator[Future]: Completed or pending futures, in task order.
+    """
+    if jobs is not None and jobs > 1:
+        executor, workers = ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs), jobs
+    elif threads and threads > 0:
+        executor, workers = ThreadPoolExecutor(max_workers=threads, initializer=initializer, initargs=initargs), threads
+    else:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            future = Future()
+            try:
+                future.set_result(func(*task))
+            except Exception as e:
+                future.set_exception(e)
+            yield future
+        return
+
+    window = window or workers * 4
+    with executor as pool:
+        if cost is not None:
+            yield from _map_largest_first(pool, func, tasks, window, window - workers, cost, lookahead)
+            return
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(func, *task))
+            if len(pending) >= window:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+def _map_largest_first(
+    pool, func: Callable, tasks: Iterable[tuple], window: int, early_slots: int, cost: Callable[[tuple], int], lookahead: int,
+) -> Iterator[Future]:
+    """Submit the costliest upcoming tasks first and yield their futures in task order (see map_ordered)."""
+    tasks = iter(tasks)
+    # Upcoming tasks by index, the same indices in task order, and a max-heap of (-cost, index)
+    upcoming: Dict[int, tuple] = {}
+    order: deque = deque()
+    heap: List[Tuple[int, int]] = []
+    # Submitted futures not yet yielded, by index: the reorder buffer
+    pending: Dict[int, Future] = {}
+    read = 0
+
+    def refill() -> None:
+        nonlocal read
+        while len(upcoming) < lookahead:
+            task = next(tasks, None)
+            if task is None:
+                return
+            upcoming[read] = task
+            order.append(read)
+            heapq.heappush(heap, (-cost(task), read))
+            read += 1
+
+    refill()
+    head = 0
+    while True:
+        while len(pending) < window and upcoming:
+            while order[0] not in upcoming:
+                order.popleft()
+            first = order[0]
+            # Tasks submitted ahead of the first unsubmitted one wait in the buffer, so they get only part of it
+            if sum(index > first for index in pending) < early_slots:
+                while heap[0][1] not in upcoming:
+                    heapq.heappop(heap)
+                index = heapq.heappop(heap)[1]
+                if index != first:
+                    metrics.current().count("tasks_run_early")
+            else:
+                index = first
+            pending[index] = pool.submit(func, *upcoming.pop(index))
+            refill()
+        if head not in pending:
+            break
+        yield pending.pop(head)
+        head += 1
+
+def iter_format_output(diff_results: Dict[str, List[str]]) -> Iterator[str]:
+    """
+    Yield the formatted report one line at a time (see format_output).
+
+    Args:
+        diff_results (Dict[str, List[str]]): A dictionary with file paths as keys and differences as values.
+    
+    Returns:
+        Iterator[str]: Report lines without line terminators.
+    """
+    for file_path, diff in diff_results.items():
+        yield f"------- {file_path} -------"
+        yield from diff
+        yield "\n"
+
 def format_output(diff_results: Dict[str, List[str]]) -> str:
     """
     Format the differences for output in a human-readable way.
@@ -180,12 +731,7 @@ def format_output(diff_results: Dict[str, List[str]]) -> str:
     Returns:
         str: A formatted string for output.
     """
-    formatted = []
-    for file_path, diff in diff_results.items():
-        formatted.append(f"------- {file_path} -------")
-        formatted.extend(diff)
-        formatted.append("\n")
-    return "\n".join(formatted)
+    return "\n".join(iter_format_output(diff_results))
 
 def setup_logger(name: str, log_file: str = None, level: int = logging.INFO):
     """
@@ -215,16 +761,24 @@ def setup_logger(name: str, log_file: str = None, level: int = logging.INFO):
 
     return logger
 
-def write_to_file(output_file: str, content: str):
+def write_to_file(output_file: str, content: Union[str, Iterable[str]]):
     """
     Write content to a file.
 
     Args:
         output_file (str): Path to the output file.
-        content (str): Content to write.
+        content (Union[str, Iterable[str]]): Content to write. An iterable of
+            lines (e.g. from iter_format_output) is joined with newlines and
+            written incrementally instead of being built up in memory.
     """
-    with open(output_file, 'w', encoding='utf-8') as file:
-        file.write(content)
+    with open(output_file, 'w', encoding='utf-8', buffering=1024 * 1024) as file:
+        if isinstance(content, str):
+            file.write(content)
+            return
+        for i, line in enumerate(content):
+            if i:
+                file.write("\n")
+            file.write(line)
 
 # Unified wrapper function to allow user to choose between rglob and os.walk methods
 def get_files(
@@ -0,0 +1,342 @@
+import os
+import sys
+import time
+import stat
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Adding src to the Python path so modules in src/ can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import compare_cost, files_differ, map_ordered, path_kept, scan_tree, scan_trees
+from hash_cache import open_hash_cache
+from patterns import compile_matcher
+from api import CompareOptions, KnownTrees
+from report_archive import index_path
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Quiet time after the last event before the report is rewritten
+DEFAULT_DEBOUNCE = 0.1
+# Under a steady stream of events the report is still rewritten this often
+MAX_DEBOUNCE_WAIT = 1.0
+# Seconds between rescans when inotify is not available
+DEFAULT_POLL_INTERVAL = 1.0
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def _stat_key(file_stat: os.stat_result) -> Tuple[int, int, int]:
+    return file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino
+
+
+class WatchState:
+    """
+    Scans of both trees and the common files that differ, kept up to date.
+
+    The trees are walked and compared once. Afterwards only the paths named
+    by file events are stat'ed and compared again; events that can change
+    which files are kept (a directory or a .gitignore appearing or
+    vanishing) rescan the stat data of the modified tree, without reading
+    any contents. The original tree is assumed not to change.
+
+    Args:
+        original_dir (str): Path to the original directory.
+        modified_dir (str): Path to the modified directory, the one being edited.
+        options (CompareOptions): Filters, cache and threads; git_repo and against_manifest are not supported.
+    """
+
+    def __init__(self, original_dir: str, modified_dir: str, options: CompareOptions = None):
+        self.options = options = options or CompareOptions()
+        if options.git_repo or options.against_manifest:
+            raise ValueError("Watch mode compares two directories")
+        self.modified_dir = modified_dir
+        self._matcher = compile_matcher(options.ignore_patterns, options.shallow_ignore, options.include_only)
+        self._stack = ExitStack()
+        self.cache = self._stack.enter_context(open_hash_cache(options.cache_dir))
+
+        stats = metrics.current()
+        with stats.phase("walk"):
+            self.original_scan, self.modified_scan = scan_trees(
+                original_dir, modified_dir, options.max_depth, options.ignore_patterns, options.shallow_ignore,
+                include_only=options.include_only, use_gitignore=options.use_gitignore,
+            )
+        common_files = sorted(self.original_scan.files.keys() & self.modified_scan.files.keys())
+        with stats.phase("compare"):
+            differs = map_ordered(
+                files_differ,
+                ((*self._pair(file_path), self.cache, options.normalization) for file_path in common_files),
+                threads=options.io_threads,
+                cost=compare_cost,
+            )
+            self.changed: Set[str] = {
+                file_path for file_path, future in zip(common_files, differs) if future.result()
+            }
+
+    def _pair(self, file_path: str) -> Tuple[str, str, os.stat_result, os.stat_result]:
+        return (
+            os.path.join(self.original_scan.root, file_path),
+            os.path.join(self.modified_scan.root, file_path),
+            self.original_scan.files[file_path],
+            self.modified_scan.files[file_path],
+        )
+
+    def known(self) -> KnownTrees:
+        """The current state, for Comparison and the report generators."""
+        return KnownTrees(self.original_scan, self.modified_scan, frozenset(self.changed))
+
+    def needs_rescan(self, file_path: str, is_dir: bool) -> bool:
+        """Whether an event on file_path can change the kept paths in a way only a walk can tell."""
+        return is_dir or (self.options.use_gitignore and os.path.basename(file_path) == ".gitignore")
+
+    def update(self, paths: Iterable[str] = (), rescan: bool = False) -> bool:
+        """
+        Apply events on paths of the modified tree.
+
+        Args:
+            paths (Iterable[str]): Relative paths of files that may have been written, created or removed.
+            rescan (bool): Walk the modified tree again and find changed files from their stat data.
+
+        Returns:
+            bool: Whether the report can have changed.
+        """
+        options = self.options
+        files = self.modified_scan.files
+        paths = list(paths)
+        if options.use_gitignore and not rescan:
+            # Whether a new file is ignored depends on .gitignore files that only a walk reads
+            rescan = any(
+                file_path not in files and os.path.isfile(os.path.join(self.modified_dir, file_path))
+                for file_path in paths
+            )
+        dirty = set()
+        if rescan:
+            scan = scan_tree(
+                self.modified_dir, options.max_depth, options.ignore_patterns, options.shallow_ignore,
+                options.include_only, options.use_gitignore,
+            )
+            dirty = {
+                file_path for file_path in files.keys() | scan.files.keys()
+                if file_path not in files or file_path not in scan.files
+                or _stat_key(files[file_path]) != _stat_key(scan.files[file_path])
+            }
+            layout_changed = (scan.dirs, scan.shallow_dirs) != (self.modified_scan.dirs, self.modified_scan.shallow_dirs)
+            self.modified_scan = scan
+            files = scan.files
+        else:
+            layout_changed = False
+            for file_path in paths:
+                try:
+                    file_stat = os.stat(os.path.join(self.modified_dir, file_path))
+                except OSError:
+                    file_stat = None
+                if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+                    if files.pop(file_path, None) is not None:
+                        dirty.add(file_path)
+                elif file_path in files or path_kept(file_path, self._matcher, options.max_depth, False):
+                    if file_path not in files or _stat_key(files[file_path]) != _stat_key(file_stat):
+                        files[file_path] = file_stat
+                        dirty.add(file_path)
+
+        for file_path in dirty:
+            if file_path in files and file_path in self.original_scan.files and files_differ(
+                *self._pair(file_path), self.cache, options.normalization,
+            ):
+                self.changed.add(file_path)
+            else:
+                self.changed.discard(file_path)
+        return bool(dirty) or layout_changed
+
+    def close(self) -> None:
+        self._stack.close()
+
+    def __enter__(self) -> "WatchState":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class Inotify:
+    """Watches on the directories of a tree through the Linux inotify API (via ctypes)."""
+
+    def __init__(self, root: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = libc
+        self.root = root
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, str] = {}
+
+    def add(self, rel_dirs: Iterable[str]) -> None:
+        """Watch these directories of the tree ('' for the root); watching one twice is harmless."""
+        for rel_dir in rel_dirs:
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(os.path.join(self.root, rel_dir)), WATCH_MASK)
+            if wd >= 0:
+                self._dirs[wd] = rel_dir
+                continue
+            error = ctypes.get_errno()
+            if error not in (errno.ENOENT, errno.ENOTDIR):
+                # ENOSPC: out of watches (fs.inotify.max_user_watches)
+                raise OSError(error, f"inotify_add_watch failed for {rel_dir or self.root}")
+
+    def read(self, timeout: Optional[float]) -> Optional[List[Tuple[str, int]]]:
+        """
+        Wait up to timeout seconds for events.
+
+        Returns:
+            Optional[List[Tuple[str, int]]]: (relative path, mask) of each event, an
+            empty list on timeout, or None if events were lost and the tree must be rescanned.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            rel_dir = self._dirs.get(wd)
+            if rel_dir is None or not name:
+                continue
+            name = os.fsdecode(name)
+            events.append((f"{rel_dir}/{name}" if rel_dir else name, mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def write_atomically(output_file: str, render: Callable[[str], None]) -> None:
+    """
+    Have render write a report next to output_file, then move it into place in one step.
+
+    A section index written alongside (see report_archive.py) is moved into
+    place with it.
+    """
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        render(temp_file)
+        if os.path.exists(index_path(temp_file)):
+            os.replace(index_path(temp_file), index_path(output_file))
+        os.replace(temp_file, output_file)
+    finally:
+        for path in (temp_file, index_path(temp_file)):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def watch(
+    state: WatchState,
+    on_change: Callable[[], None],
+    debounce: float = DEFAULT_DEBOUNCE,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    use_inotify: bool = True,
+    stop: threading.Event = None,
+) -> None:
+    """
+    Keep state current with the modified tree and call on_change after each change, until stop is set.
+
+    Events are collected until none arrive for debounce seconds (but at most
+    MAX_DEBOUNCE_WAIT), then applied at once, so an editor's save or a
+    checkout of many files rewrites the report once. Without inotify (or
+    when it runs out of watches), the tree's stat data is rescanned every
+    poll_interval seconds instead.
+
+    Args:
+        state (WatchState): State built from the initial comparison.
+        on_change (Callable[[], None]): Called after changes were applied, e.g. to rewrite the report.
+        debounce (float): Quiet time in seconds before changes are applied.
+        poll_interval (float): Seconds between rescans when polling.
+        use_inotify (bool): Use inotify where available rather than polling.
+        stop (threading.Event): Set to return.
+    """
+    stop = stop or threading.Event()
+    inotify = None
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            inotify = Inotify(state.modified_dir)
+            inotify.add(["", *state.modified_scan.dirs])
+        except OSError as e:
+            logger.warning(f"Watching by polling every {poll_interval}s: {e}")
+            if inotify is not None:
+                inotify.close()
+            inotify = None
+
+    try:
+        while not stop.is_set():
+            if inotify is None:
+                if stop.wait(poll_interval):
+                    break
+                changed = state.update(rescan=True)
+            else:
+                events = inotify.read(min(poll_interval, 0.5))
+                if events == []:
+                    continue
+                paths: Set[str] = set()
+                rescan = False
+                deadline = time.monotonic() + MAX_DEBOUNCE_WAIT
+                while True:
+                    if events is None:
+                        rescan = True
+                    else:
+                        for file_path, mask in events:
+                            if state.needs_rescan(file_path, bool(mask & IN_ISDIR)):
+                                rescan = True
+                            paths.add(file_path)
+                    if time.monotonic() >= deadline:
+                        break
+                    events = inotify.read(debounce)
+                    if events == []:
+                        break
+                changed = state.update(paths, rescan)
+                if rescan:
+                    try:
+                        inotify.add(state.modified_scan.dirs)
+                    except OSError as e:
+                        logger.warning(f"Watching by polling every {poll_interval}s: {e}")
+                        inotify.close()
+                        inotify = None
+            if changed:
+                on_change()
+    finally:
+        if inotify is not None:
+            inotify.close()
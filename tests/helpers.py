@@ -0,0 +1,24 @@
+import os
+import shutil
+import tempfile
+import unittest
+from typing import Union
+
+
+def write_file(root: str, rel_path: str, content: Union[str, bytes]) -> str:
+    """Write content (text as UTF-8, or bytes) to rel_path under root, creating its directories. Returns the path."""
+    path = os.path.join(root, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content.encode('utf-8') if isinstance(content, str) else content)
+    return path
+
+
+class TempDirTestCase(unittest.TestCase):
+    """A test case with a fresh temporary directory, self.test_dir, removed after each test."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
@@ -0,0 +1,112 @@
+import unittest
+from unittest.mock import patch
+import io
+import os
+import sys
+import json
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+import api
+from api import CompareOptions, Comparison, compare, write_jsonl, parse_hunks, MODIFIED, NEW, DELETED, RENAMED, UNCHANGED
+from utils import BINARY, TEXT
+from helpers import TempDirTestCase, write_file
+
+class TestApi(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original_dir = os.path.join(self.test_dir, "original")
+        self.modified_dir = os.path.join(self.test_dir, "modified")
+        os.makedirs(self.original_dir)
+        os.makedirs(self.modified_dir)
+
+        write_file(self.original_dir, "same.py", "unchanged\n")
+        write_file(self.modified_dir, "same.py", "unchanged\n")
+        write_file(self.original_dir, "app.py", "".join(f"line {i}\n" for i in range(20)))
+        write_file(self.modified_dir, "app.py", "".join(f"line {i}\n" for i in range(20)).replace("line 10\n", "changed\n"))
+        write_file(self.original_dir, "gone.py", "deleted\n")
+        write_file(self.modified_dir, "fresh.py", "new\n")
+        with open(os.path.join(self.modified_dir, "logo.png"), 'wb') as f:
+            f.write(b"\x89PNG\0\0")
+
+    def test_compare_yields_changes_in_order(self):
+        changes = list(compare(self.original_dir, self.modified_dir))
+
+        self.assertEqual(
+            [(change.path, change.status) for change in changes],
+            [("app.py", MODIFIED), ("fresh.py", NEW), ("gone.py", DELETED), ("logo.png", NEW)],
+        )
+        app = changes[0]
+        self.assertEqual(app.kind, TEXT)
+        self.assertEqual(len(app.hunks), 1)
+        hunk = app.hunks[0]
+        self.assertEqual(hunk.header, "@@ -8,7 +8,7 @@")
+        self.assertEqual(hunk.lines[3:5], ["-line 10", "+changed"])
+        self.assertEqual(changes[3].kind, BINARY)
+        self.assertFalse(hasattr(app, "__dict__"))
+
+    def test_compare_is_lazy(self):
+        with patch("api.scan_trees", wraps=api.scan_trees) as mock_scan:
+            changes = compare(self.original_dir, self.modified_dir)
+            self.assertFalse(mock_scan.called)
+            self.assertEqual(next(changes).path, "app.py")
+            changes.close()
+        self.assertEqual(mock_scan.call_count, 1)
+
+    def test_unchanged_and_hashes(self):
+        options = CompareOptions(list_unchanged=True, hashes=True, diffs=False)
+        changes = {change.path: change for change in compare(self.original_dir, self.modified_dir, options)}
+
+        self.assertEqual(changes["same.py"].status, UNCHANGED)
+        self.assertEqual(changes["same.py"].original_digest, changes["same.py"].modified_digest)
+        self.assertNotEqual(changes["app.py"].original_digest, changes["app.py"].modified_digest)
+        self.assertIsNone(changes["app.py"].diff)
+        self.assertIsNone(changes["fresh.py"].original_digest)
+
+    def test_renames(self):
+        os.rename(os.path.join(self.modified_dir, "app.py"), os.path.join(self.modified_dir, "main.py"))
+        changes = list(compare(self.original_dir, self.modified_dir))
+
+        renamed = next(change for change in changes if change.status == RENAMED)
+        self.assertEqual((renamed.path, renamed.source), ("main.py", "app.py"))
+        self.assertEqual(renamed.original_size, os.path.getsize(os.path.join(self.original_dir, "app.py")))
+        self.assertNotIn("app.py", [change.path for change in changes])
+
+    def test_read_errors_are_recorded(self):
+        with patch("api.sniff_file", side_effect=PermissionError("denied")):
+            changes = {change.path: change for change in compare(self.original_dir, self.modified_dir)}
+        self.assertIsInstance(changes["fresh.py"].error, PermissionError)
+        self.assertIsNone(changes["app.py"].error)
+
+    def test_comparison_counts_pending_paths(self):
+        with Comparison(self.original_dir, self.modified_dir) as comparison:
+            self.assertEqual(comparison.paths, ["app.py", "fresh.py", "gone.py", "logo.png", "same.py"])
+            # same.py may still differ without a cache or byte compare
+            self.assertEqual(comparison.pending_after("app.py"), 4)
+            self.assertEqual(comparison.pending_after("logo.png"), 1)
+
+    def test_write_jsonl(self):
+        out = io.StringIO()
+        count = write_jsonl(compare(self.original_dir, self.modified_dir, CompareOptions(hashes=True)), out)
+
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(count, 4)
+        self.assertEqual(records[0]["path"], "app.py")
+        self.assertEqual(records[0]["hunks"][0]["original_start"], 8)
+        self.assertEqual(len(records[0]["modified_digest"]), 32)
+        self.assertEqual(records[2], {
+            "path": "gone.py", "status": "deleted", "kind": "TEXT", "original_size": 8,
+            "original_digest": records[2]["original_digest"],
+        })
+        self.assertEqual(records[3]["kind"], "BINARY")
+
+    def test_parse_hunks(self):
+        hunks = parse_hunks(["--- original", "+++ modified", "@@ -0,0 +1 @@", "+only\n"])
+        self.assertEqual(len(hunks), 1)
+        self.assertEqual((hunks[0].original_start, hunks[0].original_count, hunks[0].modified_count), (0, 0, 1))
+        self.assertEqual(hunks[0].header, "@@ -0,0 +1 @@")
+        self.assertEqual(hunks[0].lines, ["+only"])
+
+if __name__ == '__main__':
+    unittest.main()
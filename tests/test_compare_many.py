@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+from api import CompareOptions
+from compare_many import BaselineIndex, compare_many, report_names
+from utils import scan_tree
+from repo_diff_unified import generate_comparison_report
+from helpers import TempDirTestCase, write_file
+
+def render_unified(candidate_dir, output_file, known):
+    generate_comparison_report(known.original_scan.root, candidate_dir, output_file, known=known)
+
+class TestCompareMany(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.baseline = os.path.join(self.test_dir, "baseline")
+        self.candidates = [os.path.join(self.test_dir, "attempts", name) for name in ("one", "two", "three")]
+        for root in [self.baseline, *self.candidates]:
+            for i in range(5):
+                write_file(root, f"src/mod{i}.py", f"value = {i}\n")
+        write_file(self.candidates[0], "src/mod1.py", "value = 10\n")
+        write_file(self.candidates[1], "src/extra.py", "extra\n")
+        os.remove(os.path.join(self.candidates[2], "src/mod4.py"))
+        # Same size as the baseline file, so only the digests tell them apart
+        write_file(self.candidates[2], "src/mod2.py", "value = 7\n")
+
+    def test_statuses_against_baseline_index(self):
+        index = BaselineIndex.build(self.baseline, CompareOptions())
+        self.assertEqual(sorted(index.digests), [f"src/mod{i}.py" for i in range(5)])
+        statuses = [index.statuses(scan_tree(candidate)) for candidate in self.candidates]
+        self.assertEqual(statuses, [
+            {"src/mod1.py": "M"},
+            {"src/extra.py": "A"},
+            {"src/mod2.py": "M", "src/mod4.py": "D"},
+        ])
+
+    def test_line_ending_changes_are_not_counted(self):
+        crlf = os.path.join(self.test_dir, "attempts", "crlf")
+        for i in range(5):
+            write_file(crlf, f"src/mod{i}.py", f"value = {i}\r\n")
+        output_dir = os.path.join(self.test_dir, "reports")
+
+        matrix = compare_many(self.baseline, [crlf], output_dir, render_unified)
+
+        # As in the reports, which read lines with universal newlines
+        self.assertEqual(matrix, {"crlf": {}})
+        self.assertEqual(os.path.getsize(os.path.join(output_dir, "crlf.txt")), 0)
+        with open(os.path.join(output_dir, "summary.tsv"), encoding='utf-8') as f:
+            self.assertEqual(f.read(), "path\tcrlf\n(changed files)\t0\n")
+
+    def test_report_names_are_distinct(self):
+        self.assertEqual(report_names(["a/repo", "b/repo/", "repo-2", "c/repo"]), ["repo", "repo-2", "repo-2-2", "repo-3"])
+
+    def check_reports(self, workers):
+        output_dir = os.path.join(self.test_dir, f"reports{workers}")
+        matrix = compare_many(self.baseline, self.candidates, output_dir, render_unified, workers=workers)
+        self.assertEqual(list(matrix), ["one", "two", "three"])
+
+        for candidate, name in zip(self.candidates, matrix):
+            expected_file = os.path.join(self.test_dir, "expected.txt")
+            generate_comparison_report(self.baseline, candidate, expected_file)
+            with open(expected_file, encoding='utf-8') as f, open(os.path.join(output_dir, f"{name}.txt"), encoding='utf-8') as g:
+                self.assertEqual(g.read(), f.read())
+
+        with open(os.path.join(output_dir, "summary.tsv"), encoding='utf-8') as f:
+            self.assertEqual(f.read(), (
+                "path\tone\ttwo\tthree\n"
+                "(changed files)\t1\t1\t2\n"
+                "src/extra.py\t\tA\t\n"
+                "src/mod1.py\tM\t\t\n"
+                "src/mod2.py\t\t\tM\n"
+                "src/mod4.py\t\t\tD\n"
+            ))
+
+    def test_reports_match_single_comparisons(self):
+        self.check_reports(workers=1)
+
+    def test_reports_on_worker_processes(self):
+        self.check_reports(workers=2)
+
+if __name__ == '__main__':
+    unittest.main()
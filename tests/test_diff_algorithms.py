@@ -0,0 +1,67 @@
+import unittest
+import difflib
+import os
+import random
+import sys
+
+sys.path.append(os.path.abspath('./src'))
+
+from diff_algorithms import get_opcodes, matching_blocks, unified_diff
+
+def apply_opcodes(a, b, opcodes):
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2]
+            result.extend(a[i1:i2])
+        else:
+            result.extend(b[j1:j2])
+    return result
+
+def lcs_length(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+class TestDiffAlgorithms(unittest.TestCase):
+    def test_opcodes_reconstruct_modified(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            a = [rng.choice("abcd") for _ in range(rng.randint(0, 20))]
+            b = [rng.choice("abcd") for _ in range(rng.randint(0, 20))]
+            for algorithm in ("myers", "patience"):
+                self.assertEqual(apply_opcodes(a, b, get_opcodes(a, b, algorithm)), b)
+
+    def test_myers_is_minimal(self):
+        rng = random.Random(11)
+        for _ in range(300):
+            a = [rng.choice("abc") for _ in range(rng.randint(0, 15))]
+            b = [rng.choice("abc") for _ in range(rng.randint(0, 15))]
+            matched = sum(size for _, _, size in matching_blocks(a, b, "myers"))
+            self.assertEqual(matched, lcs_length(a, b))
+
+    def test_output_format_matches_difflib(self):
+        a = [f"line {i}\n" for i in range(100)]
+        b = list(a)
+        b[50] = "changed\n"
+        del b[10]
+        b.insert(80, "inserted\n")
+        expected = list(difflib.unified_diff(a, b, fromfile="original", tofile="modified", lineterm=""))
+        for algorithm in ("difflib", "myers", "patience"):
+            actual = list(unified_diff(a, b, fromfile="original", tofile="modified", lineterm="", algorithm=algorithm))
+            self.assertEqual(actual, expected)
+
+    def test_identical_inputs_produce_no_diff(self):
+        lines = ["same\n"] * 10
+        self.assertEqual(list(unified_diff(lines, lines, algorithm="myers")), [])
+
+    def test_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            list(unified_diff(["a"], ["b"], algorithm="quantum"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.append(os.path.abspath('./src'))
+
+from file_tree import build_tree, render_tree
+from budget import ReportBudget
+from report_writer import ReportWriter
+from repo_diff_general import generate_comparison_report
+
+class TestFileTree(unittest.TestCase):
+    def test_files_nest_under_their_directories(self):
+        tree = build_tree(
+            ["src", "src/components", "src/utils", "dist"],
+            {"src/components/Button.js": "MODIFIED", "src/utils/helpers.js": "", "package.json": "NEW"},
+            ["dist"],
+        )
+        self.assertEqual("".join(render_tree(tree)), (
+            "/repository-root\n"
+            "├── dist/ [CONTENTS IGNORED]\n"
+            "├── src/\n"
+            "│   ├── components/\n"
+            "│   │   └── Button.js [MODIFIED]\n"
+            "│   └── utils/\n"
+            "│       └── helpers.js\n"
+            "└── package.json [NEW]\n"
+        ))
+
+    def test_parent_directories_are_implied(self):
+        tree = build_tree([], {"a/b/c.txt": "", "a/d.txt": "DELETED"})
+        self.assertEqual("".join(render_tree(tree)), (
+            "/repository-root\n"
+            "└── a/\n"
+            "    ├── b/\n"
+            "    │   └── c.txt\n"
+            "    └── d.txt [DELETED]\n"
+        ))
+
+    def test_render_in_chunks_of_whole_lines(self):
+        tree = build_tree([], {f"dir{i % 7}/file{i}.py": "" for i in range(100)})
+        with patch("file_tree.RENDER_CHUNK_LINES", 10):
+            chunks = list(render_tree(tree))
+        self.assertGreater(len(chunks), 5)
+        self.assertTrue(all(chunk.endswith("\n") for chunk in chunks))
+        self.assertEqual(sum(chunk.count("\n") for chunk in chunks), 1 + 7 + 100)
+
+    def test_budget_cuts_tree_at_a_line(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            output_file = os.path.join(test_dir, "report.txt")
+            with ReportWriter(output_file, ReportBudget(max_bytes=200)) as f:
+                self.assertFalse(f.write_chunks(render_tree(build_tree([], {f"f{i}.py": "" for i in range(100)}))))
+                self.assertTrue(f.exhausted)
+            with open(output_file, encoding='utf-8') as f:
+                tree_text = f.read().split("\n[")[0]
+            self.assertTrue(tree_text.endswith("\n"))
+            self.assertLessEqual(len(tree_text.encode('utf-8')), 200)
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_general_report_tree(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            for side, content in (("original", "old\n"), ("modified", "new\n")):
+                for rel_path in ("pkg/mod.py", "pkg/sub/deep.py", "top.py"):
+                    path = os.path.join(test_dir, side, rel_path)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write(content if rel_path == "pkg/mod.py" else "same\n")
+            os.makedirs(os.path.join(test_dir, "modified", "vendor", "lib"))
+            output_file = os.path.join(test_dir, "report.txt")
+
+            generate_comparison_report(
+                os.path.join(test_dir, "original"), os.path.join(test_dir, "modified"), output_file,
+                shallow_ignore={"vendor"},
+            )
+            with open(output_file, encoding='utf-8') as f:
+                content = f.read()
+            self.assertTrue(content.startswith(
+                "/repository-root\n"
+                "├── pkg/\n"
+                "│   ├── sub/\n"
+                "│   │   └── deep.py\n"
+                "│   └── mod.py [MODIFIED]\n"
+                "├── vendor/ [CONTENTS IGNORED]\n"
+                "└── top.py\n"
+            ))
+        finally:
+            shutil.rmtree(test_dir)
+
+if __name__ == '__main__':
+    unittest.main()
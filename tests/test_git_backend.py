@@ -0,0 +1,122 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import shutil
+import subprocess
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+from git_backend import GitError, GitRepository, scan_git_trees
+from utils import scan_tree
+from repo_diff_unified import generate_comparison_report
+from helpers import TempDirTestCase, write_file
+
+@unittest.skipUnless(shutil.which("git"), "git is not installed")
+class TestGitBackend(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo_dir = os.path.join(self.test_dir, "repo")
+        os.makedirs(self.repo_dir)
+        self.git("init", "-q")
+
+        write_file(self.repo_dir, "keep/same.py", "unchanged\n")
+        write_file(self.repo_dir, "src/app.py", "".join(f"line {i}\n" for i in range(200)))
+        write_file(self.repo_dir, "src/old.py", "deleted later\n")
+        self.commit("first")
+        self.git("tag", "-a", "v1", "-m", "release")
+
+        write_file(self.repo_dir, "src/app.py", "".join(f"line {i}\n" for i in range(200)).replace("line 100\n", "changed\n"))
+        os.remove(os.path.join(self.repo_dir, "src/old.py"))
+        write_file(self.repo_dir, "src/new.py", "brand new\n")
+        self.commit("second")
+
+    def git(self, *args):
+        return subprocess.run(
+            ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+            cwd=self.repo_dir, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+
+    def commit(self, message):
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", message)
+
+    def assert_scans(self):
+        original, modified = scan_git_trees(self.repo_dir, "v1", "HEAD")
+        self.assertEqual(sorted(original.files), ["keep/same.py", "src/app.py", "src/old.py"])
+        self.assertEqual(sorted(modified.files), ["keep/same.py", "src/app.py", "src/new.py"])
+        self.assertEqual(original.dirs, ["keep", "src"])
+
+        # Identical blobs are never materialized
+        self.assertFalse(os.path.exists(os.path.join(modified.root, "keep/same.py")))
+        with open(os.path.join(modified.root, "src/app.py"), encoding='utf-8') as f:
+            self.assertIn("changed\n", f.read())
+
+    def test_resolves_revisions(self):
+        repo = GitRepository(self.repo_dir)
+        head = self.git("rev-parse", "HEAD")
+        self.assertEqual(repo.resolve("HEAD"), head)
+        self.assertEqual(repo.resolve(head[:8]), head)
+        self.assertEqual(repo.resolve("v1"), self.git("rev-parse", "v1^{commit}"))
+        self.assertEqual(repo.resolve("HEAD~1"), repo.resolve("v1"))
+        with self.assertRaises(GitError):
+            repo.resolve("no-such-branch")
+
+    def test_loose_objects(self):
+        self.assert_scans()
+
+    def test_packed_objects(self):
+        self.git("gc", "-q", "--aggressive")
+        self.assertFalse(os.path.isdir(os.path.join(self.repo_dir, ".git", "objects", "src")))
+        self.assert_scans()
+
+    def test_unchanged_subtrees_are_not_read(self):
+        with patch.object(GitRepository, "read_tree", autospec=True, side_effect=GitRepository.read_tree) as mock_read:
+            scan_git_trees(self.repo_dir, "v1", "HEAD", list_unchanged=False)
+        read = {call.args[1] for call in mock_read.call_args_list}
+        self.assertNotIn(self.git("rev-parse", "HEAD:keep"), read)
+
+    def test_report_from_revisions(self):
+        output_file = os.path.join(self.test_dir, "report.txt")
+        generate_comparison_report("v1", "HEAD", output_file, git_repo=self.repo_dir, diff_algorithm="myers")
+        with open(output_file, encoding='utf-8') as f:
+            content = f.read()
+
+        self.assertIn("------- src/app.py (CHANGES) -------", content)
+        self.assertIn("-line 100", content)
+        self.assertIn("+changed", content)
+        self.assertIn("------- src/new.py (NEW) -------\nbrand new\n", content)
+        self.assertIn("------- src/old.py (DELETED) -------\ndeleted later\n", content)
+        self.assertNotIn("keep/same.py", content)
+
+    def test_symlinks_match_a_checkout(self):
+        links = {
+            "links/to_file": "../keep/same.py",
+            "links/to_changed": "../src/app.py",
+            "links/chain": "to_file",
+            "links/to_dir": "../src",
+            "links/dangling": "../x",
+            "links/outside": "../../outside.txt",
+        }
+        os.makedirs(os.path.join(self.repo_dir, "links"))
+        for name, target in links.items():
+            os.symlink(target, os.path.join(self.repo_dir, name))
+        self.commit("links")
+        write_file(self.repo_dir, "src/app.py", "rewritten\n")
+        self.commit("edit")
+
+        original, modified = scan_git_trees(self.repo_dir, "HEAD~1", "HEAD")
+        # Links to files are read as the file; links to directories, dangling links and links out of the tree are skipped
+        checkout = scan_tree(self.repo_dir, ignore_patterns={".git"})
+        self.assertEqual(sorted(modified.files), sorted(checkout.files))
+        self.assertEqual(
+            sorted(path for path in modified.files if path.startswith("links/")),
+            ["links/chain", "links/to_changed", "links/to_file"],
+        )
+        with open(os.path.join(modified.root, "links/to_changed"), encoding='utf-8') as f:
+            self.assertEqual(f.read(), "rewritten\n")
+        self.assertFalse(os.path.exists(os.path.join(modified.root, "links/to_file")))
+
+if __name__ == "__main__":
+    unittest.main()
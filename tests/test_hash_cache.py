@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+from hash_cache import HashCache, hash_file, open_hash_cache
+from utils import files_differ
+from helpers import TempDirTestCase, write_file
+
+class TestHashCache(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.test_dir, "cache")
+
+    def write_aged_file(self, name, content, age_seconds=60):
+        path = write_file(self.test_dir, name, content)
+        # Age the file so it falls outside the racy-mtime window
+        past = os.stat(path).st_mtime - age_seconds
+        os.utime(path, (past, past))
+        return path
+
+    def test_warm_run_does_not_rehash(self):
+        path = self.write_aged_file("a.txt", b"hello")
+
+        with HashCache(self.cache_dir) as cache:
+            first = cache.digest(path)
+        self.assertEqual(first, hash_file(path))
+
+        with patch("hash_cache.hash_file", wraps=hash_file) as mock_hash:
+            with HashCache(self.cache_dir) as cache:
+                self.assertEqual(cache.digest(path), first)
+                self.assertEqual(cache.hits, 1)
+            mock_hash.assert_not_called()
+
+    def test_changed_stat_rehashes(self):
+        path = self.write_aged_file("a.txt", b"hello")
+        with HashCache(self.cache_dir) as cache:
+            before = cache.digest(path)
+
+        path = self.write_aged_file("a.txt", b"world!", age_seconds=30)
+        with HashCache(self.cache_dir) as cache:
+            after = cache.digest(path)
+            self.assertEqual(cache.misses, 1)
+        self.assertNotEqual(before, after)
+
+    def test_recently_modified_files_are_not_persisted(self):
+        path = self.write_aged_file("fresh.txt", b"fresh", age_seconds=0)
+        with HashCache(self.cache_dir) as cache:
+            cache.digest(path)
+        with HashCache(self.cache_dir) as cache:
+            cache.digest(path)
+            self.assertEqual(cache.hits, 0)
+
+    def test_eviction_keeps_most_recently_used(self):
+        paths = [self.write_aged_file(f"f{i}.txt", bytes([i])) for i in range(3)]
+        with HashCache(self.cache_dir) as cache:
+            for path in paths:
+                cache.digest(path)
+
+        with HashCache(self.cache_dir, max_entries=1) as cache:
+            cache.digest(paths[2])
+
+        with HashCache(self.cache_dir) as cache:
+            cache.digest(paths[0])
+            cache.digest(paths[2])
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_files_differ_with_cache(self):
+        first = self.write_aged_file("a.txt", b"same")
+        second = self.write_aged_file("b.txt", b"same")
+        third = self.write_aged_file("c.txt", b"diff")
+
+        with open_hash_cache(self.cache_dir) as cache:
+            self.assertFalse(files_differ(first, second, cache=cache))
+            self.assertTrue(files_differ(first, third, cache=cache))
+
+        with open_hash_cache(None) as cache:
+            self.assertIsNone(cache)
+
+if __name__ == "__main__":
+    unittest.main()
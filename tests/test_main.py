@@ -1,16 +1,67 @@
 from main import main
 from unittest.mock import patch
 import pytest
+import json
 import os
 import sys
 
 sys.path.append(os.path.abspath('./src'))
 sys.path.append(os.path.abspath('./tests'))
 
+@patch("main.validate_paths")
 @patch("src.repo_diff_general.run_general")
-def test_main_dispatch_general(mock_run_general):
+def test_main_dispatch_general(mock_run_general, mock_validate_paths):
     with patch("sys.argv", ["main.py", "--method", "general", "orig_dir", "mod_dir", "output.txt"]):
         main()
-    mock_run_general.assert_called_once_with(
-        "orig_dir", "mod_dir", "output.txt", set(), set(), None
+    mock_run_general.assert_called_once()
+    expected = dict(
+        original_dir="orig_dir",
+        modified_dir="mod_dir",
+        output_file="output.txt",
+        ignore_patterns=set(),
+        shallow_ignore=set(),
+        max_depth=None,
+        cache_dir=None,
     )
+    actual = mock_run_general.call_args.kwargs
+    assert {key: actual[key] for key in expected} == expected
+
+@patch("main.validate_paths")
+@patch("src.repo_diff_unified.run_unified")
+def test_main_passes_cache_dir(mock_run_unified, mock_validate_paths):
+    with patch("sys.argv", ["main.py", "--method", "unified", "orig_dir", "mod_dir", "output.txt",
+                            "--cache-dir", ".repo-diff-cache"]):
+        main()
+    assert mock_run_unified.call_args.kwargs["cache_dir"] == ".repo-diff-cache"
+
+@patch("main.validate_paths")
+@patch("src.repo_diff_includes.run_includes")
+def test_main_passes_output_budget(mock_run_includes, mock_validate_paths):
+    with patch("sys.argv", ["main.py", "--method", "includes", "orig_dir", "mod_dir", "output.txt",
+                            "--max-tokens", "8000"]):
+        main()
+    assert mock_run_includes.call_args.kwargs["max_tokens"] == 8000
+    assert mock_run_includes.call_args.kwargs["max_bytes"] is None
+
+def test_main_writes_stats(tmp_path):
+    original_dir = tmp_path / "original"
+    modified_dir = tmp_path / "modified"
+    for directory, content in ((original_dir, "a\n"), (modified_dir, "b\n")):
+        (directory / "pkg").mkdir(parents=True)
+        (directory / "pkg" / "mod.py").write_text(content)
+    (modified_dir / "new.py").write_text("new\n")
+    stats_file = tmp_path / "stats.json"
+
+    with patch("sys.argv", ["main.py", "--method", "unified", str(original_dir), str(modified_dir),
+                            str(tmp_path / "report.txt"), "--stats", str(stats_file),
+                            "--profile", "tracemalloc"]):
+        main()
+
+    stats = json.loads(stats_file.read_text())
+    assert stats["method"] == "unified"
+    assert {"walk", "diff", "write"} <= set(stats["phases"])
+    assert stats["counters"]["files_scanned"] == 3
+    assert stats["counters"]["files_diffed"] == 1
+    assert stats["counters"]["bytes_written"] == (tmp_path / "report.txt").stat().st_size
+    assert {entry["path"] for entry in stats["slowest_files"]} == {"pkg/mod.py", "new.py"}
+    assert stats["tracemalloc_peak_bytes"] > 0
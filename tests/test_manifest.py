@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+from manifest import Manifest, hash_file, scan_manifest_trees, write_manifest
+from repo_diff_unified import generate_comparison_report
+from helpers import TempDirTestCase, write_file
+
+class TestManifest(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tree_dir = os.path.join(self.test_dir, "tree")
+        self.manifest_path = os.path.join(self.test_dir, "base.manifest")
+
+        write_file(self.tree_dir, "keep/same.py", "unchanged\n")
+        write_file(self.tree_dir, "keep/copy.py", "unchanged\n")
+        write_file(self.tree_dir, "src/app.py", "".join(f"line {i}\n" for i in range(200)))
+        write_file(self.tree_dir, "src/old.py", "deleted later\n")
+        write_file(self.tree_dir, "build/out.o", "object\n")
+
+    def modify_tree(self):
+        write_file(self.tree_dir, "src/app.py", "".join(f"line {i}\n" for i in range(200)).replace("line 100\n", "changed\n"))
+        os.remove(os.path.join(self.tree_dir, "src/old.py"))
+        write_file(self.tree_dir, "src/new.py", "brand new\n")
+
+    def test_round_trip(self):
+        self.assertEqual(write_manifest(self.tree_dir, self.manifest_path, ignore_patterns={"build"}), 4)
+        manifest = Manifest(self.manifest_path)
+
+        self.assertEqual(manifest.root, os.path.abspath(self.tree_dir))
+        self.assertEqual(sorted(manifest.files), ["keep/copy.py", "keep/same.py", "src/app.py", "src/old.py"])
+        self.assertEqual(manifest.dirs, ["keep", "src"])
+        entry = manifest.files["src/old.py"]
+        self.assertEqual(entry.size, len("deleted later\n"))
+        self.assertEqual(manifest.read_blob(entry), b"deleted later\n")
+        # Identical contents are stored once
+        self.assertEqual(manifest.files["keep/same.py"].offset, manifest.files["keep/copy.py"].offset)
+
+    def test_rejects_other_files(self):
+        with open(self.manifest_path, 'wb') as f:
+            f.write(b"not a manifest" * 4)
+        with self.assertRaises(ValueError):
+            Manifest(self.manifest_path)
+
+    def test_scan_against_manifest(self):
+        write_manifest(self.tree_dir, self.manifest_path)
+        self.modify_tree()
+
+        original_scan, modified_scan = scan_manifest_trees(self.manifest_path, self.tree_dir, list_unchanged=False)
+
+        # Unchanged files are dropped; only changed and deleted files are restored
+        self.assertEqual(sorted(original_scan.files), ["src/app.py", "src/old.py"])
+        self.assertEqual(sorted(modified_scan.files), ["src/app.py", "src/new.py"])
+        self.assertEqual(sorted(os.listdir(os.path.join(original_scan.root, "src"))), ["app.py", "old.py"])
+        with open(os.path.join(original_scan.root, "src/old.py"), encoding='utf-8') as f:
+            self.assertEqual(f.read(), "deleted later\n")
+        self.assertEqual(modified_scan.root, self.tree_dir)
+
+    def test_filters_apply_to_manifest(self):
+        write_manifest(self.tree_dir, self.manifest_path)
+        original_scan, _ = scan_manifest_trees(self.manifest_path, self.tree_dir, ignore_patterns={"build"},
+                                               include_only={"src"})
+        self.assertEqual(sorted(original_scan.files), ["src/app.py", "src/old.py"])
+        self.assertEqual(original_scan.dirs, ["src"])
+
+    def test_same_size_change_is_detected(self):
+        write_manifest(self.tree_dir, self.manifest_path)
+        with patch("manifest.hash_file", wraps=hash_file) as mock_hash:
+            write_file(self.tree_dir, "keep/same.py", "UNCHANGED\n")
+            original_scan, _ = scan_manifest_trees(self.manifest_path, self.tree_dir, list_unchanged=False)
+        self.assertIn("keep/same.py", original_scan.files)
+        self.assertTrue(mock_hash.called)
+
+    def test_report_against_manifest(self):
+        write_manifest(self.tree_dir, self.manifest_path)
+        self.modify_tree()
+        output_file = os.path.join(self.test_dir, "report.txt")
+
+        generate_comparison_report(self.manifest_path, self.tree_dir, output_file, against_manifest=True)
+
+        with open(output_file, encoding='utf-8') as f:
+            content = f.read()
+        self.assertIn("src/old.py (DELETED)", content)
+        self.assertIn("src/new.py (NEW)", content)
+        self.assertIn("src/app.py (CHANGES)", content)
+        self.assertIn("-line 100", content)
+        self.assertIn("+changed", content)
+        self.assertNotIn("keep/same.py", content)
+
+if __name__ == '__main__':
+    unittest.main()
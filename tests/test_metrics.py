@@ -0,0 +1,38 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+sys.path.append(os.path.abspath('./src'))
+
+import metrics
+from metrics import RunStats, collect
+
+class TestRunStats(unittest.TestCase):
+    def test_phases_are_exclusive(self):
+        clock = iter([0.0, 1.0, 3.0, 4.0, 10.0])
+        with patch("metrics.time.perf_counter", side_effect=lambda: next(clock)):
+            stats = RunStats()
+            with stats.phase("write"):
+                with stats.phase("diff"):
+                    pass
+        self.assertEqual(stats.phases, {"write": 2.0 + 6.0, "diff": 1.0})
+
+    def test_slowest_files(self):
+        stats = RunStats(slowest=2)
+        for file_path, seconds in (("a", 1.0), ("b", 3.0), ("c", 2.0)):
+            with patch("metrics.time.perf_counter", side_effect=[0.0, seconds]):
+                with stats.time_file(file_path):
+                    pass
+        self.assertEqual([entry["path"] for entry in stats.to_dict()["slowest_files"]], ["b", "c"])
+
+    def test_collect_sets_current(self):
+        self.assertIs(metrics.current(), metrics.NULL_STATS)
+        stats = RunStats()
+        with collect(stats):
+            metrics.current().count("files_compared", 2)
+        self.assertIs(metrics.current(), metrics.NULL_STATS)
+        self.assertEqual(stats.counters, {"files_compared": 2})
+
+if __name__ == "__main__":
+    unittest.main()
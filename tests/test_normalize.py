@@ -0,0 +1,101 @@
+import unittest
+import os
+import sys
+from unittest import mock
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+import normalize
+from normalize import AUTO, Normalization, normalized_digest, read_lines
+from utils import BINARY, TEXT, diff_files, files_differ, sniff_file
+from repo_diff_unified import generate_comparison_report
+from helpers import TempDirTestCase, write_file
+
+class TestNormalize(TempDirTestCase):
+    def test_line_endings(self):
+        lf = write_file(self.test_dir, "lf.txt", b"one\ntwo\nthree")
+        crlf = write_file(self.test_dir, "crlf.txt", b"one\r\ntwo\r\nthree")
+        cr = write_file(self.test_dir, "cr.txt", b"one\rtwo\rthree")
+        self.assertTrue(files_differ(lf, crlf))
+        self.assertTrue(files_differ(lf, crlf, normalization=Normalization()))
+        for other in (crlf, cr):
+            self.assertFalse(files_differ(lf, other, normalization=Normalization(ignore_eol=True)))
+        self.assertEqual(diff_files(lf, crlf, normalization=Normalization(ignore_eol=True)), (None, None))
+
+    def test_whitespace(self):
+        a = write_file(self.test_dir, "a.py", b"def f(x):\n    return x + 1\nprint(f(1))\n")
+        b = write_file(self.test_dir, "b.py", b"def f(x):  \r\n\treturn x  +  1\nprint(f(2))\n")
+        c = write_file(self.test_dir, "c.py", b"def f(x):\n    return x+1\nprint(f(1))\n")
+        ignore_whitespace = Normalization(ignore_whitespace=True)
+        # Only the amount of whitespace is ignored, not whether there is any
+        self.assertTrue(files_differ(a, c, normalization=ignore_whitespace))
+
+        kind, diff = diff_files(a, b, context_lines=0, normalization=ignore_whitespace)
+        self.assertEqual(kind, TEXT)
+        # Lines that only changed whitespace are matched, and the changed line is shown as it is
+        self.assertEqual([line for line in diff if line[0] in "+-" and line[:3] not in ("---", "+++")], [
+            "-print(f(1))\n", "+print(f(2))\n",
+        ])
+
+        kind, diff = diff_files(a, b, context_lines=0, normalization=Normalization(ignore_eol=True))
+        # Line endings alone are not enough to match the whitespace-only changes
+        self.assertEqual(sum(line.startswith("-") and not line.startswith("---") for line in diff), 3)
+
+    def test_streaming_digest_across_reads(self):
+        lines = [b"line %d \t  with   spaces  \r\n" % i for i in range(200)]
+        crlf = write_file(self.test_dir, "crlf.txt", b"".join(lines) + b"last  ")
+        lf = write_file(self.test_dir, "lf.txt", b"".join(line.replace(b"\r\n", b"\n") for line in lines) + b"last")
+        ignore_whitespace = Normalization(ignore_whitespace=True)
+        expected = normalized_digest(crlf, ignore_whitespace)
+        # Line endings and whitespace runs split across reads normalize the same
+        for read_size in (1, 2, 3, 7, 64):
+            with mock.patch.object(normalize, "READ_SIZE", read_size):
+                self.assertEqual(normalized_digest(crlf, ignore_whitespace), expected)
+                self.assertEqual(normalized_digest(lf, ignore_whitespace), expected)
+
+    def test_encodings(self):
+        text = "café\nnaïve\n"
+        utf8 = write_file(self.test_dir, "utf8.txt", text.encode("utf-8"))
+        latin1 = write_file(self.test_dir, "latin1.txt", text.encode("latin-1"))
+        utf8_bom = write_file(self.test_dir, "bom.txt", text.encode("utf-8-sig"))
+        utf16 = write_file(self.test_dir, "utf16.txt", text.encode("utf-16"))
+        auto = Normalization(encoding=AUTO)
+
+        self.assertTrue(files_differ(utf8, latin1, normalization=Normalization()))
+        for other in (latin1, utf8_bom, utf16):
+            self.assertFalse(files_differ(utf8, other, normalization=auto))
+            self.assertEqual(read_lines(other, AUTO), ["café\n", "naïve\n"])
+
+        # Without auto detection, Latin-1 text is summarized as binary and UTF-16 has NUL bytes
+        self.assertEqual(sniff_file(latin1), BINARY)
+        self.assertEqual(sniff_file(utf16), BINARY)
+        self.assertEqual(sniff_file(latin1, encoding=AUTO), TEXT)
+        self.assertEqual(sniff_file(utf16, encoding=AUTO), TEXT)
+
+        changed = write_file(self.test_dir, "changed.txt", "café\nnaïf\n".encode("latin-1"))
+        kind, diff = diff_files(utf8, changed, normalization=auto)
+        self.assertEqual(kind, TEXT)
+        self.assertIn("+naïf\n", diff)
+
+    def test_report_leaves_out_line_ending_conversions(self):
+        for i in range(3):
+            content = f"value = {i}\nother = {i}\n"
+            write_file(self.test_dir, f"original/mod{i}.py", content.encode())
+            write_file(self.test_dir, f"modified/mod{i}.py", content.replace("\n", "\r\n").encode())
+        write_file(self.test_dir, "modified/mod1.py", b"value = 10\r\nother = 1\r\n")
+        output_file = os.path.join(self.test_dir, "report.txt")
+
+        generate_comparison_report(
+            os.path.join(self.test_dir, "original"), os.path.join(self.test_dir, "modified"), output_file,
+            context="hunks", ignore_eol=True,
+        )
+        with open(output_file, encoding='utf-8') as f:
+            content = f.read()
+        self.assertIn("mod1.py", content)
+        self.assertIn("+value = 10\n", content)
+        self.assertNotIn("mod0.py", content)
+        self.assertNotIn("mod2.py", content)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath('./src'))
+
+from patterns import PathMatcher, RuleSet, translate_glob
+from utils import scan_tree, should_ignore_name, should_ignore_path
+
+class TestPatterns(unittest.TestCase):
+    def test_names_are_not_substrings(self):
+        self.assertTrue(should_ignore_name("build", {"build"}))
+        self.assertFalse(should_ignore_name("rebuild.py", {"build"}))
+        self.assertTrue(should_ignore_name("module.pyc", {"*.pyc"}))
+
+    def test_gitignore_semantics(self):
+        rules = RuleSet.from_gitignore("# comment\n*.log\n!keep.log\n/dist\ndocs/*.tmp\ncache/\n")
+        self.assertTrue(rules.match("logs/app.log", "app.log", False))
+        self.assertFalse(rules.match("keep.log", "keep.log", False))
+        self.assertTrue(rules.match("dist", "dist", True))
+        self.assertIsNone(rules.match("src/dist", "dist", True))
+        self.assertTrue(rules.match("docs/a.tmp", "a.tmp", False))
+        self.assertIsNone(rules.match("docs/sub/a.tmp", "a.tmp", False))
+        self.assertTrue(rules.match("src/cache", "cache", True))
+        self.assertIsNone(rules.match("src/cache", "cache", False))
+
+    def test_double_star(self):
+        self.assertRegex("a/b/c.py", f"^{translate_glob('**/*.py')}$")
+        self.assertRegex("c.py", f"^{translate_glob('**/*.py')}$")
+        self.assertNotRegex("a/c.pyc", f"^{translate_glob('a/**/*.py')}$")
+
+    def test_include_prunes_directories(self):
+        matcher = PathMatcher(include_only={"src/pkg", "tests/**/*.py"})
+        self.assertTrue(matcher.may_include("src"))
+        self.assertTrue(matcher.may_include("src/pkg/deep"))
+        self.assertFalse(matcher.may_include("srcfoo"))
+        self.assertFalse(matcher.may_include("docs"))
+        self.assertTrue(matcher.included("src/pkg/mod.py"))
+        self.assertFalse(matcher.included("src/other.py"))
+        self.assertTrue(matcher.included("tests/unit/test_a.py"))
+        self.assertFalse(matcher.included("tests/data.json"))
+
+    def test_should_ignore_path(self):
+        self.assertEqual(should_ignore_path("dist/app.js", {"node_modules"}, {"dist"}), (False, True))
+        self.assertEqual(should_ignore_path("src/node_modules/x.js", {"node_modules"}, set()), (True, False))
+        self.assertEqual(should_ignore_path("src/x.js", {"node_modules"}, set()), (False, False))
+
+    def test_scan_tree_with_gitignore(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, "src", "generated"))
+            files = {
+                ".gitignore": "*.log\ngenerated/\n",
+                "src/.gitignore": "!important.log\n",
+                "src/app.py": "",
+                "src/debug.log": "",
+                "src/important.log": "",
+                "src/generated/out.py": "",
+                "trace.log": "",
+            }
+            for name, content in files.items():
+                with open(os.path.join(temp_dir, name), 'w') as f:
+                    f.write(content)
+
+            scan = scan_tree(temp_dir, use_gitignore=True)
+            self.assertEqual(
+                sorted(scan.files),
+                [".gitignore", "src/.gitignore", "src/app.py", "src/important.log"],
+            )
+            self.assertEqual(scan.dirs, ["src"])
+
+            self.assertIn("trace.log", scan_tree(temp_dir).files)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import os
+import sys
+import time
+import random
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+from renames import Rename, detect_renames, estimate_similarity, _sketch
+from utils import scan_trees
+from repo_diff_unified import generate_comparison_report
+from repo_diff_includes import generate_comparison_report as generate_includes_report
+from helpers import TempDirTestCase, write_file
+
+def module_source(seed, lines=60):
+    rng = random.Random(seed)
+    return "".join(f"value_{seed}_{i} = compute({rng.randrange(10 ** 6)})\n" for i in range(lines))
+
+class TestRenames(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original_dir = os.path.join(self.test_dir, "original")
+        self.modified_dir = os.path.join(self.test_dir, "modified")
+        self.output_file = os.path.join(self.test_dir, "report.txt")
+
+    def detect(self, **kwargs):
+        original_scan, modified_scan = scan_trees(self.original_dir, self.modified_dir)
+        return detect_renames(original_scan.files, modified_scan.files, self.original_dir, self.modified_dir, **kwargs)
+
+    def test_exact_and_near_renames(self):
+        edited = module_source(2).replace("value_2_30 =", "renamed_value =")
+        write_file(self.original_dir, "old/a.py", module_source(1))
+        write_file(self.original_dir, "old/b.py", module_source(2))
+        write_file(self.original_dir, "gone.py", module_source(3))
+        write_file(self.modified_dir, "new/a.py", module_source(1))
+        write_file(self.modified_dir, "new/b.py", edited)
+        write_file(self.modified_dir, "fresh.py", module_source(4))
+
+        renames = self.detect()
+
+        self.assertEqual(set(renames), {"new/a.py", "new/b.py"})
+        self.assertEqual(renames["new/a.py"], Rename("old/a.py", 1.0))
+        self.assertEqual(renames["new/b.py"].source, "old/b.py")
+        self.assertGreater(renames["new/b.py"].similarity, 0.95)
+        self.assertLess(renames["new/b.py"].similarity, 1.0)
+
+    def test_exact_rename_prefers_same_name(self):
+        for name in ("x.txt", "y.txt"):
+            write_file(self.original_dir, f"old/{name}", "same\n")
+        write_file(self.modified_dir, "new/y.txt", "same\n")
+
+        self.assertEqual(self.detect(), {"new/y.txt": Rename("old/y.txt", 1.0)})
+
+    def test_empty_files_are_not_renames(self):
+        write_file(self.original_dir, "old/empty1", "")
+        write_file(self.modified_dir, "new/__init__.py", "")
+
+        self.assertEqual(self.detect(), {})
+        generate_comparison_report(self.original_dir, self.modified_dir, self.output_file)
+        with open(self.output_file, encoding='utf-8') as f:
+            content = f.read()
+        self.assertNotIn("RENAMED", content)
+        self.assertIn("old/empty1 (DELETED)", content)
+        self.assertIn("new/__init__.py (NEW)", content)
+
+    def test_threshold(self):
+        write_file(self.original_dir, "a.py", module_source(1, 10))
+        half = module_source(1, 10).splitlines(keepends=True)[:5] + module_source(9, 5).splitlines(keepends=True)
+        write_file(self.modified_dir, "b.py", "".join(half))
+
+        self.assertEqual(self.detect(threshold=0.9), {})
+        self.assertEqual(self.detect(threshold=0.3)["b.py"].source, "a.py")
+
+    def test_sketch_estimate(self):
+        write_file(self.original_dir, "a.py", module_source(1, 400))
+        write_file(self.modified_dir, "b.py", module_source(1, 300) + module_source(2, 100))
+        estimate = estimate_similarity(
+            _sketch(os.path.join(self.original_dir, "a.py")),
+            _sketch(os.path.join(self.modified_dir, "b.py")),
+        )
+        # Exact Jaccard similarity is 300 / 500
+        self.assertAlmostEqual(estimate, 0.6, delta=0.15)
+
+    def test_many_files_are_not_paired_quadratically(self):
+        for i in range(1500):
+            source = module_source(i, 20)
+            write_file(self.original_dir, f"old/m{i}.py", source)
+            write_file(self.modified_dir, f"new/m{i}.py", source + f"extra_{i} = 1\n")
+        write_file(self.original_dir, "unrelated.py", module_source(-1))
+
+        start = time.perf_counter()
+        renames = self.detect()
+        self.assertLess(time.perf_counter() - start, 30)
+        self.assertEqual(len(renames), 1500)
+        self.assertTrue(all(rename.source == "old/" + path[len("new/"):] for path, rename in renames.items()))
+
+    def test_unified_report_shows_renames(self):
+        write_file(self.original_dir, "old/a.py", module_source(1))
+        write_file(self.original_dir, "old/b.py", module_source(2))
+        write_file(self.modified_dir, "new/a.py", module_source(1))
+        write_file(self.modified_dir, "new/b.py", module_source(2).replace("value_2_30 =", "renamed_value ="))
+
+        generate_comparison_report(self.original_dir, self.modified_dir, self.output_file)
+        with open(self.output_file, encoding='utf-8') as f:
+            content = f.read()
+
+        self.assertIn("\n------- RENAMED old/a.py -> new/a.py (100%) -------\n", content)
+        self.assertRegex(content, r"------- RENAMED old/b\.py -> new/b\.py \(9\d%\) -------")
+        self.assertIn("+renamed_value =", content)
+        self.assertNotIn("(NEW)", content)
+        self.assertNotIn("(DELETED)", content)
+        self.assertNotIn("value_1_0 =", content)
+
+        generate_comparison_report(self.original_dir, self.modified_dir, self.output_file, rename_threshold=None)
+        with open(self.output_file, encoding='utf-8') as f:
+            content = f.read()
+        self.assertIn("old/a.py (DELETED)", content)
+        self.assertIn("new/a.py (NEW)", content)
+
+    def test_includes_report_shows_renames(self):
+        write_file(self.original_dir, "src/old.py", module_source(1))
+        write_file(self.modified_dir, "src/new.py", module_source(1).replace("value_1_3 =", "changed ="))
+
+        generate_includes_report(self.original_dir, self.modified_dir, self.output_file, include_only={"src"})
+        with open(self.output_file, encoding='utf-8') as f:
+            content = f.read()
+
+        self.assertRegex(content, r"------- RENAMED src/old\.py -> src/new\.py \(9\d%\) -------")
+        self.assertIn("+changed =", content)
+
+if __name__ == '__main__':
+    unittest.main()
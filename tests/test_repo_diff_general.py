@@ -2,11 +2,15 @@ import unittest
 import os
 import sys
 import tempfile  # Add this import for the temporary directory
+import threading
+import time
+from unittest.mock import patch
 
 sys.path.append(os.path.abspath('./src'))
 sys.path.append(os.path.abspath('./tests'))
 
-from utils import get_files_with_rglob, get_directories_with_depth
+from utils import get_files_with_rglob, get_directories_with_depth, scan_tree, scan_trees, files_differ, sniff_file, map_ordered, COMPARE_CHUNK_SIZE
+from repo_diff_general import generate_comparison_report
 
 class TestRepoDiff(unittest.TestCase):
     def test_include_filter(self):
@@ -62,5 +66,193 @@ class TestRepoDiff(unittest.TestCase):
             self.assertFalse("dist" in result)
             self.assertTrue("tests" in result)
 
+    def test_scan_tree_single_pass(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, "src", "pkg"))
+            os.makedirs(os.path.join(temp_dir, "dist", "bundle"))
+            os.makedirs(os.path.join(temp_dir, "node_modules", "lib"))
+            with open(os.path.join(temp_dir, "src", "pkg", "mod.py"), 'w') as f:
+                f.write("x = 1\n")
+            with open(os.path.join(temp_dir, "dist", "bundle", "app.js"), 'w') as f:
+                f.write("// bundle")
+            with open(os.path.join(temp_dir, "node_modules", "lib", "index.js"), 'w') as f:
+                f.write("// lib")
+
+            scan = scan_tree(
+                temp_dir,
+                ignore_patterns={"node_modules"},
+                shallow_ignore={"dist"}
+            )
+
+            self.assertEqual(list(scan.files), [os.path.join("src", "pkg", "mod.py")])
+            self.assertEqual(scan.files[os.path.join("src", "pkg", "mod.py")].st_size, 6)
+            self.assertEqual(scan.dirs, ["src", os.path.join("src", "pkg")])
+            self.assertEqual(scan.shallow_dirs, ["dist"])
+
+    def test_scan_tree_max_depth_prunes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, "a", "b", "c"))
+            for rel in ("top.txt", "a/one.txt", "a/b/two.txt", "a/b/c/three.txt"):
+                with open(os.path.join(temp_dir, rel), 'w') as f:
+                    f.write(rel)
+
+            scan = scan_tree(temp_dir, max_depth=2)
+
+            self.assertEqual(sorted(scan.files), ["a/one.txt", "top.txt"])
+            self.assertEqual(scan.dirs, ["a", "a/b"])
+
+    def test_scan_trees_walks_both(self):
+        with tempfile.TemporaryDirectory() as original, tempfile.TemporaryDirectory() as modified:
+            with open(os.path.join(original, "old.py"), 'w') as f:
+                f.write("old")
+            with open(os.path.join(modified, "new.py"), 'w') as f:
+                f.write("new")
+
+            original_scan, modified_scan = scan_trees(original, modified)
+
+            self.assertEqual(list(original_scan.files), ["old.py"])
+            self.assertEqual(list(modified_scan.files), ["new.py"])
+
+    def test_files_differ(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = {}
+            for name, content in (("a", b"same"), ("b", b"same"), ("c", b"diff"), ("d", b"longer")):
+                paths[name] = os.path.join(temp_dir, name)
+                with open(paths[name], 'wb') as f:
+                    f.write(content)
+
+            self.assertFalse(files_differ(paths["a"], paths["b"]))
+            self.assertTrue(files_differ(paths["a"], paths["c"]))
+            self.assertTrue(files_differ(paths["a"], paths["d"]))
+            self.assertFalse(files_differ(paths["a"], paths["a"]))
+
+    def test_files_differ_across_chunks(self):
+        chunk = b"x" * COMPARE_CHUNK_SIZE
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = {}
+            for name, content in (("a", chunk * 2), ("b", chunk * 2), ("c", chunk + chunk[:-1] + b"y"),
+                                  ("d", chunk + b"tail"), ("e", chunk + b"tall")):
+                paths[name] = os.path.join(temp_dir, name)
+                with open(paths[name], 'wb') as f:
+                    f.write(content)
+
+            self.assertFalse(files_differ(paths["a"], paths["b"]))
+            self.assertTrue(files_differ(paths["a"], paths["c"]))
+            self.assertTrue(files_differ(paths["d"], paths["e"]))
+
+    def test_files_differ_uses_size_before_reading(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            small = os.path.join(temp_dir, "small")
+            large = os.path.join(temp_dir, "large")
+            with open(small, 'wb') as f:
+                f.write(b"x")
+            with open(large, 'wb') as f:
+                f.write(b"xx")
+
+            with patch("builtins.open") as mock_open:
+                self.assertTrue(files_differ(small, large))
+            mock_open.assert_not_called()
+
+    def test_map_ordered_threads_keep_order_and_window(self):
+        lock = threading.Lock()
+        started = []
+
+        def task(i):
+            with lock:
+                started.append(i)
+            time.sleep(0.001 * (i % 3))
+            return i * i
+
+        results = []
+        for future in map_ordered(task, ((i,) for i in range(40)), threads=4, window=6):
+            # Never more than the window submitted ahead of the result being consumed
+            self.assertLessEqual(len(started) - len(results), 6)
+            results.append(future.result())
+        self.assertEqual(results, [i * i for i in range(40)])
+
+    def test_map_ordered_runs_expensive_tasks_first(self):
+        lock = threading.Lock()
+        started = []
+        sizes = [1] * 30 + [50] + [1] * 9
+
+        def task(i, size):
+            with lock:
+                started.append(i)
+            time.sleep(0.001 * size)
+            return i
+
+        results = []
+        tasks = ((i, size) for i, size in enumerate(sizes))
+        for future in map_ordered(task, tasks, threads=2, window=8, cost=lambda task: task[1]):
+            # Results that finished early wait in the window, which stays bounded
+            self.assertLessEqual(len(started) - len(results), 8)
+            results.append(future.result())
+        self.assertEqual(results, list(range(40)))
+        # The expensive task starts right away instead of after the 30 before it
+        self.assertLess(started.index(30), 2)
+
+    def test_sniff_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            samples = {
+                "text.py": "print('héllo')\n".encode('utf-8'),
+                "nul.bin": b"abc\0def",
+                "latin1.txt": "caf\xe9".encode('latin-1'),
+                "cut.txt": b"a" * 8191 + "é".encode('utf-8'),
+            }
+            kinds = {}
+            for name, content in samples.items():
+                path = os.path.join(temp_dir, name)
+                with open(path, 'wb') as f:
+                    f.write(content)
+                kinds[name] = sniff_file(path)
+            self.assertEqual(kinds, {"text.py": "TEXT", "nul.bin": "BINARY", "latin1.txt": "BINARY", "cut.txt": "TEXT"})
+            self.assertEqual(sniff_file(os.path.join(temp_dir, "text.py"), max_file_size=4), "OVERSIZED")
+
+    def test_general_report_with_binary_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            original_dir = os.path.join(temp_dir, "original")
+            modified_dir = os.path.join(temp_dir, "modified")
+            for root, payload in ((original_dir, b"\0\1\2"), (modified_dir, b"\0\1\3")):
+                os.makedirs(root)
+                with open(os.path.join(root, "model.bin"), 'wb') as f:
+                    f.write(payload)
+            with open(os.path.join(modified_dir, "image.png"), 'wb') as f:
+                f.write(b"\x89PNG\r\n\x1a\n\0")
+            output_file = os.path.join(temp_dir, "report.txt")
+
+            generate_comparison_report(original_dir, modified_dir, output_file)
+
+            with open(output_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+        self.assertIn("------- model.bin (DIFF) -------\n[BINARY, 3 bytes, changed]\n", content)
+        self.assertIn("------- image.png (NEW) -------\n[BINARY, 9 bytes, new]\n", content)
+
+    def test_line_ending_changes_agree_across_methods(self):
+        import repo_diff_includes
+        import repo_diff_unified
+        with tempfile.TemporaryDirectory() as temp_dir:
+            original_dir = os.path.join(temp_dir, "original")
+            modified_dir = os.path.join(temp_dir, "modified")
+            for root, eol in ((original_dir, b"\n"), (modified_dir, b"\r\n")):
+                os.makedirs(root)
+                with open(os.path.join(root, "crlf.txt"), 'wb') as f:
+                    f.write(eol.join([b"one", b"two", b""]))
+                with open(os.path.join(root, "edit.txt"), 'wb') as f:
+                    f.write(b"before\n" if root == original_dir else b"after\n")
+            output_file = os.path.join(temp_dir, "report.txt")
+
+            for generate in (
+                generate_comparison_report,
+                repo_diff_unified.generate_comparison_report,
+                repo_diff_includes.generate_comparison_report,
+            ):
+                generate(original_dir, modified_dir, output_file)
+                with open(output_file, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                # A change of line endings alone is not a change, as when files are read as text
+                self.assertNotIn("crlf.txt (", content)
+                self.assertNotIn("crlf.txt [MODIFIED]", content)
+                self.assertIn("edit.txt (", content)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
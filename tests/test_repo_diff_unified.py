@@ -1,104 +1,154 @@
 import unittest
-from unittest.mock import patch, mock_open, call
+from unittest.mock import patch
 import os
 import sys
 
 sys.path.append(os.path.abspath('./src'))
 sys.path.append(os.path.abspath('./tests'))
 
+import api
 from repo_diff_unified import generate_comparison_report
+from helpers import TempDirTestCase, write_file
 
-class TestRepoDiffUnified(unittest.TestCase):
-
-    @patch('builtins.open', new_callable=mock_open)
-    @patch('repo_diff_unified.get_files_with_oswalk')
-    def test_generate_comparison_report(self, mock_get_files, mock_open_file):
-        # Mock different return values for original and modified directories
-        mock_get_files.side_effect = [
-            ['file1.py', 'file2.py'],  # original directory
-            ['file2.py', 'file3.py']   # modified directory
-        ]
-
-        # Set up mock file contents
-        mock_handle = mock_open_file.return_value
-        mock_handle.readlines.side_effect = [
-            ['original content 1\n'],  # file1.py original
-            ['original content 2\n'],  # file2.py original
-            ['modified content 2\n'],  # file2.py modified
-            ['new content 3\n']        # file3.py new
-        ]
-
-        # Call the function under test
-        generate_comparison_report(
-            original_dir='original_dir',
-            modified_dir='modified_dir',
-            output_file='output_report.txt',
-            ignore_patterns={'*.txt'},
-            shallow_ignore={'dir_to_ignore'},
-            max_depth=2
+class TestRepoDiffUnified(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.original_dir = os.path.join(self.test_dir, "original_dir")
+        self.modified_dir = os.path.join(self.test_dir, "modified_dir")
+        self.output_file = os.path.join(self.test_dir, "output_report.txt")
+        os.makedirs(self.original_dir)
+        os.makedirs(self.modified_dir)
+
+    def test_generate_comparison_report(self):
+        write_file(self.original_dir, 'file1.py', 'original content 1\n')
+        write_file(self.original_dir, 'file2.py', 'original content 2\n')
+        write_file(self.modified_dir, 'file2.py', 'modified content 2\n')
+        write_file(self.modified_dir, 'file3.py', 'new content 3\n')
+
+        with patch('api.scan_trees', wraps=api.scan_trees) as mock_scan:
+            generate_comparison_report(
+                original_dir=self.original_dir,
+                modified_dir=self.modified_dir,
+                output_file=self.output_file,
+                ignore_patterns={'*.txt'},
+                shallow_ignore={'dir_to_ignore'},
+                max_depth=2
+            )
+
+        # Both trees are walked in a single call
+        mock_scan.assert_called_once_with(
+            self.original_dir, self.modified_dir, 2, {'*.txt'}, {'dir_to_ignore'},
+            include_only=None, git_repo=None, list_unchanged=False, use_gitignore=False,
+            against_manifest=False, shard=None,
         )
 
-        # Verify the calls to get_files_with_oswalk
-        mock_get_files.assert_has_calls([
-            call('original_dir', 2, {'*.txt'}, {'dir_to_ignore'}),
-            call('modified_dir', 2, {'*.txt'}, {'dir_to_ignore'})
-        ])
-
-        # Instead of checking exact call sequence, verify specific write operations
-        write_calls = mock_handle.write.call_args_list
-        expected_writes = [
-            call('\n------- file1.py (DELETED) -------\n'),
-            call('\n------- file2.py (ORIGINAL) -------\n'),
-            call('\n------- file2.py (CHANGES) -------\n'),
-            call('\n------- file3.py (NEW) -------\n')
-        ]
-        
-        # Check that all expected writes occurred
-        for expected_call in expected_writes:
-            self.assertIn(expected_call, write_calls)
-
-        # Verify file opens occurred with correct paths
-        open_calls = [
-            call('output_report.txt', 'w', encoding='utf-8'),
-            call('original_dir/file1.py', 'r', encoding='utf-8'),
-            call('original_dir/file2.py', 'r', encoding='utf-8'),
-            call('modified_dir/file2.py', 'r', encoding='utf-8'),
-            call('modified_dir/file3.py', 'r', encoding='utf-8')
-        ]
-        
-        # Verify that each expected open call exists in the actual calls
-        for expected_call in open_calls:
-            self.assertIn(expected_call, mock_open_file.call_args_list)
-
-    @patch('builtins.open', new_callable=mock_open)
-    @patch('repo_diff_unified.get_files_with_oswalk')
-    def test_generate_comparison_report_with_changes(self, mock_get_files, mock_open_file):
-        # Mock return values for both directories
-        mock_get_files.side_effect = [
-            ['file1.py'],  # original directory
-            ['file1.py']   # modified directory
-        ]
-
-        # Mock different content for original and modified files
-        mock_handle = mock_open_file.return_value
-        mock_handle.readlines.side_effect = [
-            ['print("Hello World")\n'],  # original content
-            ['print("Goodbye World")\n']  # modified content
-        ]
-
-        # Run the comparison
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        for expected in [
+            '\n------- file1.py (DELETED) -------\n',
+            '\n------- file2.py (ORIGINAL) -------\n',
+            '\n------- file2.py (CHANGES) -------\n',
+            '\n------- file3.py (NEW) -------\n'
+        ]:
+            self.assertIn(expected, content)
+
+        self.assertIn('original content 1', content)
+        self.assertIn('-original content 2', content)
+        self.assertIn('+modified content 2', content)
+        self.assertIn('new content 3', content)
+
+    def test_generate_comparison_report_with_changes(self):
+        write_file(self.original_dir, 'file1.py', 'print("Hello World")\n')
+        write_file(self.modified_dir, 'file1.py', 'print("Goodbye World")\n')
+
         generate_comparison_report(
-            original_dir='original_dir',
-            modified_dir='modified_dir',
-            output_file='output_report.txt'
+            original_dir=self.original_dir,
+            modified_dir=self.modified_dir,
+            output_file=self.output_file
         )
 
-        # Verify specific write operations occurred
-        write_calls = mock_handle.write.call_args_list
-        
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+
         # Check for headers
-        self.assertTrue(any('file1.py (ORIGINAL)' in str(call) for call in write_calls))
-        self.assertTrue(any('file1.py (CHANGES)' in str(call) for call in write_calls))
+        self.assertIn('file1.py (ORIGINAL)', content)
+        self.assertIn('file1.py (CHANGES)', content)
+
+    def test_unchanged_files_are_skipped(self):
+        write_file(self.original_dir, 'same/file.py', 'unchanged\n')
+        write_file(self.modified_dir, 'same/file.py', 'unchanged\n')
+
+        generate_comparison_report(
+            original_dir=self.original_dir,
+            modified_dir=self.modified_dir,
+            output_file=self.output_file
+        )
+
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), '')
+
+    def test_parallel_jobs_match_serial_output(self):
+        for i in range(12):
+            write_file(self.original_dir, f'pkg/mod{i:02d}.py', f'value = {i}\n')
+            write_file(self.modified_dir, f'pkg/mod{i:02d}.py', f'value = {i * (i % 3)}\n')
+        write_file(self.modified_dir, 'pkg/new.py', 'fresh\n')
+        write_file(self.original_dir, 'old.py', 'gone\n')
+
+        outputs = []
+        for jobs in (1, 3):
+            output_file = os.path.join(self.test_dir, f'report_{jobs}.txt')
+            generate_comparison_report(
+                original_dir=self.original_dir,
+                modified_dir=self.modified_dir,
+                output_file=output_file,
+                jobs=jobs
+            )
+            with open(output_file, 'r', encoding='utf-8') as f:
+                outputs.append(f.read())
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn('pkg/mod02.py (CHANGES)', outputs[0])
+        self.assertNotIn('pkg/mod01.py', outputs[0])
+
+    def test_io_threads_match_serial_output(self):
+        for i in range(30):
+            write_file(self.original_dir, f'pkg/mod{i:02d}.py', f'value = {i}\n')
+            write_file(self.modified_dir, f'pkg/mod{i:02d}.py', f'value = {i * (i % 3)}\n')
+        write_file(self.modified_dir, 'pkg/new.py', 'fresh\n')
+
+        outputs = []
+        for options in ({}, {'io_threads': 4}, {'io_threads': 4, 'cache_dir': os.path.join(self.test_dir, 'cache')}):
+            output_file = os.path.join(self.test_dir, 'report.txt')
+            generate_comparison_report(self.original_dir, self.modified_dir, output_file, **options)
+            with open(output_file, 'r', encoding='utf-8') as f:
+                outputs.append(f.read())
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+        self.assertIn('pkg/mod29.py (CHANGES)', outputs[0])
+
+    def test_binary_and_oversized_files_are_summarized(self):
+        for root, payload in ((self.original_dir, b"\x89PNG\0\0old"), (self.modified_dir, b"\x89PNG\0\0new!")):
+            with open(os.path.join(root, "logo.png"), 'wb') as f:
+                f.write(payload)
+        with open(os.path.join(self.modified_dir, "blob.bin"), 'wb') as f:
+            f.write(b"\xff\xfe" * 10)
+        write_file(self.original_dir, 'big.txt', 'a' * 100 + '\n')
+        write_file(self.modified_dir, 'big.txt', 'b' * 100 + '\n')
+
+        with patch('utils.open', create=True, side_effect=open) as mock_open:
+            generate_comparison_report(self.original_dir, self.modified_dir, self.output_file, max_file_size=50)
+
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        self.assertIn('\n------- logo.png (CHANGES) -------\n[BINARY, 10 bytes, changed]\n', content)
+        self.assertIn('\n------- blob.bin (NEW) -------\n[BINARY, 20 bytes, new]\n', content)
+        self.assertIn('\n------- big.txt (CHANGES) -------\n[OVERSIZED, 101 bytes, changed]\n', content)
+        self.assertNotIn('(ORIGINAL)', content)
+        # Only binary reads: sniffing and byte comparison, never text decoding
+        self.assertTrue(all('b' in call.args[1] for call in mock_open.call_args_list))
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
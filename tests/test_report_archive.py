@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import gzip
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+from report_archive import ReportIndex, index_path, zstandard
+from report_writer import ReportWriter
+from repo_diff_unified import generate_comparison_report
+from helpers import TempDirTestCase
+
+class TestReportArchive(TempDirTestCase):
+    def write_report(self, output_file, output_format):
+        source = os.path.join(self.test_dir, "big.txt")
+        with open(source, 'w', encoding='utf-8') as f:
+            f.writelines(f"line {i} ünïcode\n" for i in range(20000))
+        with ReportWriter(output_file, output_format=output_format) as writer:
+            writer.write("preamble\n")
+            for i in range(20):
+                writer.section(f"file{i}.py", "MODIFIED")
+                writer.write_lines([f"-old {i}", f"+new {i}"])
+            writer.section("big.txt", "NEW")
+            writer.copy_file(source)
+            writer.heading("RENAMED a.py -> b.py (90%)", "b.py", "RENAMED")
+            writer.write_lines(["-a", "+b"])
+
+    def check_random_access(self, output_format, decompress):
+        output_file = os.path.join(self.test_dir, "report.txt.z")
+        plain_file = os.path.join(self.test_dir, "report.txt")
+        with patch("report_archive.DEFAULT_CHUNK_SIZE", 100):
+            self.write_report(output_file, output_format)
+        self.write_report(plain_file, "plain")
+        with open(output_file, 'rb') as f, open(plain_file, 'rb') as g:
+            # The chunks decompress as one stream to the plain report
+            self.assertEqual(decompress(f.read()), g.read())
+
+        index = ReportIndex(output_file)
+        self.assertGreater(len(index.chunks), 5)
+        self.assertEqual([section.path for section in index.sections][-2:], ["big.txt", "b.py"])
+        self.assertEqual(index.read_path("file7.py"), "\n------- file7.py (MODIFIED) -------\n-old 7\n+new 7\n")
+        self.assertEqual(index.read_path("b.py"), "\n------- RENAMED a.py -> b.py (90%) -------\n-a\n+b\n")
+        self.assertTrue(index.read_path("big.txt").endswith("line 19999 ünïcode\n"))
+        self.assertIsNone(index.read_path("missing.py"))
+
+    def test_gzip_random_access(self):
+        self.check_random_access("gzip", gzip.decompress)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_random_access(self):
+        def decompress(data):
+            return zstandard.ZstdDecompressor().stream_reader(data, read_across_frames=True).read()
+        self.check_random_access("zstd", decompress)
+
+    def test_compressed_unified_report(self):
+        for side, content in (("original", "old\n"), ("modified", "new\n")):
+            os.makedirs(os.path.join(self.test_dir, side))
+            with open(os.path.join(self.test_dir, side, "a.py"), 'w', encoding='utf-8') as f:
+                f.write(content)
+        output_file = os.path.join(self.test_dir, "report.txt.gz")
+
+        generate_comparison_report(
+            os.path.join(self.test_dir, "original"), os.path.join(self.test_dir, "modified"), output_file,
+            output_format="gzip",
+        )
+        self.assertTrue(os.path.exists(index_path(output_file)))
+        index = ReportIndex(output_file)
+        self.assertEqual([(section.path, section.label) for section in index.sections], [("a.py", "ORIGINAL"), ("a.py", "CHANGES")])
+        with gzip.open(output_file, 'rt', encoding='utf-8') as f:
+            self.assertEqual(index.read_path("a.py"), f.read())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+from report_writer import ReportWriter
+from budget import ReportBudget, is_low_relevance
+from repo_diff_unified import generate_comparison_report
+import repo_diff_includes
+from utils import format_output, iter_format_output, write_to_file
+from helpers import TempDirTestCase
+
+class TestReportWriter(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.output_file = os.path.join(self.test_dir, "report.txt")
+
+    def test_sections_and_copied_contents(self):
+        source = os.path.join(self.test_dir, "big.txt")
+        with open(source, 'w', encoding='utf-8') as f:
+            for i in range(50000):
+                f.write(f"line {i} ünïcode\n")
+
+        with ReportWriter(self.output_file) as writer:
+            writer.section("big.txt", "NEW")
+            writer.copy_file(source)
+            writer.section("a.py", "MODIFIED")
+            writer.write_lines(["--- original", "+++ modified"])
+
+        with open(source, 'r', encoding='utf-8') as f:
+            expected = "\n------- big.txt (NEW) -------\n" + f.read()
+        expected += "\n------- a.py (MODIFIED) -------\n--- original\n+++ modified\n"
+
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), expected)
+
+    def test_copy_without_kernel_copy(self):
+        source = os.path.join(self.test_dir, "big.bin")
+        content = bytes(range(256)) * 1024
+        with open(source, 'wb') as f:
+            f.write(content)
+
+        with patch("report_writer._kernel_copy", side_effect=OSError("not supported")):
+            with ReportWriter(self.output_file) as writer:
+                writer.write("head\n")
+                writer.copy_file(source)
+                writer.write("tail\n")
+
+        with open(self.output_file, 'rb') as f:
+            self.assertEqual(f.read(), b"head\n" + content + b"tail\n")
+
+    def test_write_to_file_streams_formatted_output(self):
+        diff_results = {"a.py": ["-old", "+new"], "b.py": []}
+
+        write_to_file(self.output_file, iter_format_output(diff_results))
+
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), format_output(diff_results))
+
+    def test_budget_truncates_and_counts_omitted_sections(self):
+        source = os.path.join(self.test_dir, "big.txt")
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write("".join(f"line {i}\n" for i in range(10000)))
+
+        budget = ReportBudget(max_bytes=1000)
+        with ReportWriter(self.output_file, budget) as writer:
+            writer.section("big.txt", "NEW")
+            writer.copy_file(source)
+            self.assertTrue(writer.exhausted)
+            self.assertFalse(writer.section("next.txt", "NEW"))
+
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        self.assertLessEqual(len(content.encode('utf-8')), 1000)
+        self.assertIn("bytes elided to fit the output budget", content)
+        self.assertIn("[1 more sections omitted to fit the output budget]", content)
+        self.assertNotIn("next.txt", content)
+
+    def test_budget_reduces_diff_to_hunk_headers(self):
+        diff = ["--- original", "+++ modified", "@@ -1,200 +1,200 @@"] + [f"-old {i}" for i in range(200)]
+        with ReportWriter(self.output_file, ReportBudget(max_bytes=400)) as writer:
+            writer.section("a.py", "MODIFIED")
+            writer.write_lines(diff)
+
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        self.assertIn("@@ -1,200 +1,200 @@", content)
+        self.assertNotIn("-old 0", content)
+        self.assertIn("[202 diff lines elided to fit the output budget]", content)
+
+    def test_budget_never_leaves_a_header_without_a_body(self):
+        diff = ["--- original", "+++ modified", "@@ -1 +1 @@", "-old", "+new"]
+        # Room for the first section and the next header, but not the next header and an elision note
+        with ReportWriter(self.output_file, ReportBudget(max_bytes=128 + 130)) as writer:
+            self.assertTrue(writer.section("a.py", "CHANGES"))
+            writer.write_lines(diff)
+            self.assertFalse(writer.section("b.py", "CHANGES"))
+            self.assertTrue(writer.exhausted)
+
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        self.assertNotIn("b.py", content)
+        self.assertTrue(content.endswith("[1 more sections omitted to fit the output budget]\n"))
+
+    def test_plan_prefers_small_relevant_changes(self):
+        budget = ReportBudget(max_tokens=1000)
+        full = budget.plan({"src/app.py": 2500, "package-lock.json": 2500, "src/huge.py": 50000})
+        self.assertEqual(full, {"src/app.py"})
+        self.assertTrue(is_low_relevance("vendor/lib/x.py"))
+
+    def test_report_respects_max_bytes(self):
+        original_dir = os.path.join(self.test_dir, "original")
+        modified_dir = os.path.join(self.test_dir, "modified")
+        os.makedirs(original_dir)
+        os.makedirs(modified_dir)
+        for i in range(20):
+            with open(os.path.join(modified_dir, f"new{i:02d}.txt"), 'w', encoding='utf-8') as f:
+                f.write("content\n" * 200)
+
+        generate_comparison_report(original_dir, modified_dir, self.output_file, max_bytes=2000)
+
+        with open(self.output_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        self.assertLessEqual(len(content.encode('utf-8')), 2000)
+        self.assertIn("new00.txt (NEW)", content)
+        self.assertIn("more sections omitted", content)
+
+    def test_budget_ignores_unchanged_files(self):
+        original_dir = os.path.join(self.test_dir, "original")
+        modified_dir = os.path.join(self.test_dir, "modified")
+        for root in (original_dir, modified_dir):
+            os.makedirs(root)
+            for i in range(300):
+                with open(os.path.join(root, f"same{i:03d}.txt"), 'w', encoding='utf-8') as f:
+                    f.write(f"{i:03d}".ljust(99, "x") + "\n")
+            with open(os.path.join(root, "changed.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"{root}\n")
+        with open(os.path.join(original_dir, "gone.txt"), 'w', encoding='utf-8') as f:
+            f.write("gone\n" * 118)
+        with open(os.path.join(modified_dir, "new.txt"), 'w', encoding='utf-8') as f:
+            f.write("content\n" * 250)
+
+        reports = {}
+        for name, generate, max_bytes in (
+            ("unified", lambda *args, **kwargs: generate_comparison_report(*args, context="file", **kwargs), 20000),
+            ("includes", repo_diff_includes.generate_comparison_report, 4000),
+        ):
+            for cache_dir in (None, os.path.join(self.test_dir, "cache")):
+                generate(original_dir, modified_dir, self.output_file, max_bytes=max_bytes, cache_dir=cache_dir)
+                with open(self.output_file, 'r', encoding='utf-8') as f:
+                    reports[name, cache_dir is not None] = f.read()
+            # Unchanged files take no share of the budget, with or without a cache
+            self.assertEqual(reports[name, False], reports[name, True])
+            self.assertNotIn("elided", reports[name, False])
+        self.assertIn("content\n" * 250, reports["unified", False])
+        self.assertIn("gone\n" * 118, reports["includes", False])
+
+if __name__ == "__main__":
+    unittest.main()
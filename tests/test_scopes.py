@@ -0,0 +1,109 @@
+import unittest
+import os
+import random
+import sys
+import shutil
+import tempfile
+
+sys.path.append(os.path.abspath('./src'))
+
+from scopes import ScopeIndex, scope_index
+from diff_algorithms import unified_diff
+from repo_diff_unified import generate_comparison_report
+
+PYTHON_SOURCE = [
+    "import os\n",
+    "\n",
+    "class Greeter:\n",
+    "    @staticmethod\n",
+    "    def hello(name):\n",
+    "        message = 'hello'\n",
+    "        return f'{message} {name}'\n",
+    "\n",
+    "    def bye(self):\n",
+    "        return 'bye'\n",
+    "\n",
+    "def main():\n",
+    "    print(Greeter.hello('x'))\n",
+]
+
+class TestScopes(unittest.TestCase):
+    def test_python_scopes_from_ast(self):
+        scopes = scope_index(PYTHON_SOURCE, "greeter.py")
+        # A change in a method shows the method with its decorator, not the whole class
+        self.assertEqual(scopes.enclosing(5, 6), (3, 7))
+        # A change spanning two methods shows both
+        self.assertEqual(scopes.enclosing(5, 10), (3, 10))
+        # Lines between methods belong to the class
+        self.assertEqual(scopes.enclosing(7, 8), (2, 10))
+        # An insertion belongs to the scope of the line above it
+        self.assertEqual(scopes.enclosing(10, 10), (8, 10))
+        # Lines outside any definition are shown alone
+        self.assertEqual(scopes.enclosing(0, 1), (0, 1))
+        self.assertEqual(scopes.enclosing(1, 1), (1, 1))
+
+    def test_header_scopes_for_other_files(self):
+        lines = [
+            "int add(int a, int b)\n",
+            "{\n",
+            "    return a + b;\n",
+            "}\n",
+            "\n",
+            "int main(void)\n",
+            "{\n",
+            "    return add(1, 2);\n",
+            "}\n",
+        ]
+        scopes = scope_index(lines, "math.c")
+        self.assertEqual(scopes.enclosing(2, 3), (0, 4))
+        self.assertEqual(scopes.enclosing(7, 8), (5, 9))
+        # Python that does not parse falls back to the same rule
+        broken = ["def f(:\n", "    pass\n", "def g():\n", "    pass\n"]
+        self.assertEqual(scope_index(broken, "broken.py").enclosing(1, 2), (0, 2))
+
+    def test_function_context_shows_whole_function(self):
+        a = ["def first():\n"] + [f"    x{i} = {i}\n" for i in range(20)] + ["\n", "def second():\n", "    pass\n"]
+        b = list(a)
+        b[15] = "    x14 = 'changed'\n"
+        diff = list(unified_diff(a, b, lineterm="", scopes=ScopeIndex(a, python=True)))
+        self.assertEqual(diff[2], "@@ -1,21 +1,21 @@")
+        self.assertIn(" def first():\n", diff)
+        self.assertNotIn(" def second():\n", diff)
+
+    def test_without_enclosing_scopes_hunks_are_unchanged(self):
+        rng = random.Random(3)
+        for _ in range(200):
+            a = [f"    {rng.choice('abcdef')}\n" for _ in range(rng.randint(0, 40))]
+            b = [f"    {rng.choice('abcdef')}\n" for _ in range(rng.randint(0, 40))]
+            for n in (0, 1, 3):
+                for algorithm in ("difflib", "myers"):
+                    expected = list(unified_diff(a, b, n=n, lineterm="", algorithm=algorithm))
+                    actual = list(unified_diff(a, b, n=n, lineterm="", algorithm=algorithm, scopes=ScopeIndex(a)))
+                    self.assertEqual(actual, expected)
+
+    def test_report_size_follows_the_change(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            original = [f"line {i}\n" for i in range(5000)]
+            modified = list(original)
+            modified[2500] = "changed\n"
+            for side, lines in (("original", original), ("modified", modified)):
+                os.makedirs(os.path.join(test_dir, side))
+                with open(os.path.join(test_dir, side, "big.txt"), 'w', encoding='utf-8') as f:
+                    f.writelines(lines)
+            output_file = os.path.join(test_dir, "report.txt")
+
+            generate_comparison_report(
+                os.path.join(test_dir, "original"), os.path.join(test_dir, "modified"), output_file,
+                context="hunks", context_lines=1,
+            )
+            with open(output_file, encoding='utf-8') as f:
+                content = f.read()
+            self.assertNotIn("(ORIGINAL)", content)
+            self.assertIn("@@ -2500,3 +2500,3 @@", content)
+            self.assertLess(len(content), 500)
+        finally:
+            shutil.rmtree(test_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+from shards import Shard, ShardIndex, check_sharding, merge_shards, parse_shard, shard_index_path
+from utils import scan_tree
+from repo_diff_unified import generate_comparison_report
+from helpers import TempDirTestCase, write_file
+
+# Names that sort around each other's subtrees ("a-b/x" < "a.txt" < "a/x" < "a0/x")
+TOP_LEVEL = ["a", "a-b", "a.txt", "a0", "docs", "lib", "src", "tests", "tools", "README.md"]
+
+class TestShards(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original = os.path.join(self.test_dir, "original")
+        self.modified = os.path.join(self.test_dir, "modified")
+        for number, name in enumerate(TOP_LEVEL):
+            paths = [name] if "." in name else [f"{name}/m{i}.py" for i in range(4)] + [f"{name}/sub/deep.py"]
+            for rel_path in paths:
+                write_file(self.original, rel_path, f"{rel_path}\nvalue = {number}\n")
+                write_file(self.modified, rel_path, f"{rel_path}\nvalue = {number}\n")
+            write_file(self.modified, paths[0], f"{paths[0]}\nvalue = changed\n")
+            if len(paths) > 1:
+                os.remove(os.path.join(self.modified, paths[1]))
+                write_file(self.modified, f"{name}/new.py", "new\n")
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/5"), Shard(2, 5))
+        self.assertEqual(str(Shard(2, 5)), "2/5")
+        for text in ("5/5", "-1/3", "1/0", "1", "a/b", "1/2/3"):
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+
+    def test_shards_walk_only_what_they_own(self):
+        full = scan_tree(self.modified)
+        count = 3
+        scans = [scan_tree(self.modified, shard=Shard(index, count)) for index in range(count)]
+        for index, scan in enumerate(scans):
+            # Subtrees of other shards are never entered
+            self.assertTrue(all(Shard(index, count).owns(rel_dir) for rel_dir in scan.dirs))
+        merged = {}
+        for scan in scans:
+            self.assertFalse(merged.keys() & scan.files.keys())
+            merged.update(scan.files)
+        self.assertEqual(sorted(merged), sorted(full.files))
+        # A whole top-level entry goes to one shard
+        self.assertEqual(len({Shard(0, count).owns(rel_path) for rel_path in full.files if rel_path.startswith("src/")}), 1)
+
+    def test_merged_shards_match_single_run(self):
+        expected_file = os.path.join(self.test_dir, "single.txt")
+        generate_comparison_report(self.original, self.modified, expected_file, rename_threshold=None)
+        with open(expected_file, 'rb') as f:
+            expected = f.read()
+
+        for count in (1, 2, 3, 7):
+            reports = []
+            for index in range(count):
+                report_file = os.path.join(self.test_dir, f"shard{index}of{count}.txt")
+                generate_comparison_report(
+                    self.original, self.modified, report_file, rename_threshold=None, shard=Shard(index, count),
+                )
+                self.assertTrue(os.path.exists(shard_index_path(report_file)))
+                reports.append(report_file)
+            merged_file = os.path.join(self.test_dir, f"merged{count}.txt")
+            # Shards can be given in any order
+            paths = merge_shards(list(reversed(reports)), merged_file)
+            with open(merged_file, 'rb') as f:
+                self.assertEqual(f.read(), expected)
+            self.assertEqual(paths, sum(len(ShardIndex.read(report_file).paths) for report_file in reports))
+
+        with self.assertRaises(ValueError):
+            merge_shards(reports[:-1], merged_file)
+        with self.assertRaises(ValueError):
+            merge_shards(reports + reports[:1], merged_file)
+
+    def test_options_that_span_shards_are_rejected(self):
+        check_sharding(rename_threshold=None)
+        with self.assertRaises(ValueError):
+            check_sharding(rename_threshold=0.5)
+        with self.assertRaises(ValueError):
+            check_sharding(max_bytes=1000)
+        with self.assertRaises(ValueError):
+            check_sharding(output_format="gzip")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+import sys
+import time
+import threading
+
+sys.path.append(os.path.abspath('./src'))
+sys.path.append(os.path.abspath('./tests'))
+
+from api import CompareOptions
+from watch import WatchState, watch, write_atomically
+from repo_diff_unified import generate_comparison_report
+from helpers import TempDirTestCase, write_file
+
+class TestWatch(TempDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.original_dir = os.path.join(self.test_dir, "original")
+        self.modified_dir = os.path.join(self.test_dir, "modified")
+        self.output_file = os.path.join(self.test_dir, "report.txt")
+        for root in (self.original_dir, self.modified_dir):
+            write_file(root, "pkg/a.py", "a = 1\n")
+            write_file(root, "pkg/b.py", "b = 1\n")
+
+    def render(self, state):
+        write_atomically(
+            self.output_file,
+            lambda path: generate_comparison_report(self.original_dir, self.modified_dir, path, known=state.known()),
+        )
+        with open(self.output_file, encoding='utf-8') as f:
+            return f.read()
+
+    def test_update_tracks_changed_files(self):
+        with WatchState(self.original_dir, self.modified_dir, CompareOptions(ignore_patterns={"*.log"})) as state:
+            self.assertEqual(state.changed, set())
+            self.assertFalse(state.update(["pkg/a.py"]))
+
+            write_file(self.modified_dir, "pkg/a.py", "a = 2\n")
+            write_file(self.modified_dir, "pkg/new.py", "new\n")
+            write_file(self.modified_dir, "pkg/debug.log", "ignored\n")
+            os.remove(os.path.join(self.modified_dir, "pkg/b.py"))
+            self.assertTrue(state.update(["pkg/a.py", "pkg/new.py", "pkg/debug.log", "pkg/b.py"]))
+
+            self.assertEqual(state.changed, {"pkg/a.py"})
+            self.assertEqual(sorted(state.modified_scan.files), ["pkg/a.py", "pkg/new.py"])
+            content = self.render(state)
+            self.assertIn("pkg/a.py (CHANGES)", content)
+            self.assertIn("pkg/new.py (NEW)", content)
+            self.assertIn("pkg/b.py (DELETED)", content)
+
+            # Reverting a file drops it from the report again
+            write_file(self.modified_dir, "pkg/a.py", "a = 1\n")
+            self.assertTrue(state.update(["pkg/a.py"]))
+            self.assertEqual(state.changed, set())
+            self.assertNotIn("pkg/a.py", self.render(state))
+
+    def test_rescan_finds_new_directories(self):
+        with WatchState(self.original_dir, self.modified_dir) as state:
+            write_file(self.modified_dir, "lib/deep/c.py", "c\n")
+            self.assertTrue(state.update(rescan=True))
+            self.assertIn("lib/deep/c.py", state.modified_scan.files)
+            self.assertIn("lib/deep", state.modified_scan.dirs)
+
+    def check_watch(self, **kwargs):
+        with WatchState(self.original_dir, self.modified_dir) as state:
+            stop = threading.Event()
+            updated = threading.Event()
+            thread = threading.Thread(
+                target=watch, args=(state, updated.set), kwargs=dict(debounce=0.05, stop=stop, **kwargs),
+            )
+            thread.start()
+            try:
+                # Give the watcher time to set up before editing
+                time.sleep(0.3)
+                write_file(self.modified_dir, "pkg/a.py", "a = 3\n")
+                self.assertTrue(updated.wait(5))
+                self.assertEqual(state.changed, {"pkg/a.py"})
+            finally:
+                stop.set()
+                thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux-only")
+    def test_watch_with_inotify(self):
+        self.check_watch()
+
+    def test_watch_by_polling(self):
+        self.check_watch(use_inotify=False, poll_interval=0.1)
+
+    def test_write_atomically_keeps_old_report_on_error(self):
+        write_file(self.test_dir, "report.txt", "old report\n")
+
+        def render(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("partial")
+            raise RuntimeError("render failed")
+
+        with self.assertRaises(RuntimeError):
+            write_atomically(self.output_file, render)
+        with open(self.output_file, encoding='utf-8') as f:
+            self.assertEqual(f.read(), "old report\n")
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["modified", "original", "report.txt"])
+
+if __name__ == '__main__':
+    unittest.main()